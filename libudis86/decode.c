@@ -56,7 +56,6 @@
 #define MODRM_MOD(b)    ( ( ( b ) >> 6 ) & 3 )
 #define MODRM_RM(b)     ( ( b ) & 7 )
 
-static int decode_ext(struct ud *u, uint16_t ptr);
 static int decode_opcode(struct ud *u);
 
 enum reg_class { /* register classes */
@@ -78,22 +77,117 @@ inp_start(struct ud *u)
   u->inp_ctr = 0;
 }
 
+static size_t inp_stream_fill(struct ud *u);
+
+/*
+ * inp_fill
+ *    Called when the input window is exhausted. Moves the bytes of the
+ *    instruction being decoded to the start of the window, and refills
+ *    the rest of it. Returns the number of bytes added, 0 at the end of
+ *    input, or for buffer input.
+ */
+static size_t
+inp_fill(struct ud *u)
+{
+  size_t start, n;
+  if (u->inp_refill == NULL) {
+    return u->inp_stream ? inp_stream_fill(u) : 0;
+  }
+  start = u->inp_buf_index - u->inp_ctr;
+  if (start > 0) {
+    for (n = 0; n < u->inp_ctr; ++n) {
+      u->inp_win[n] = u->inp_win[start + n];
+    }
+    u->inp_buf_index = u->inp_buf_size = u->inp_ctr;
+  }
+  n = u->inp_refill(u, u->inp_win + u->inp_buf_size,
+                    u->inp_win_size - u->inp_buf_size);
+  u->inp_buf_size += n;
+  return n;
+}
+
+/*
+ * inp_stream_fill
+ *    inp_fill() for stream input. The bytes held from the previous chunk
+ *    are decoded from inp_sess, followed by a copy of the start of the
+ *    chunk, enough to complete the instruction split between the two.
+ *    Past it, decoding moves on to the chunk itself, without copying.
+ *    At the end of the chunk, the decoder waits for the next one.
+ */
+static size_t
+inp_stream_fill(struct ud *u)
+{
+  if (u->inp_buf == u->inp_sess &&
+      u->inp_buf_index - u->inp_ctr >= u->inp_chunk_base &&
+      u->inp_buf_index - u->inp_chunk_base < u->inp_chunk_size) {
+    u->inp_buf = u->inp_chunk;
+    u->inp_buf_index -= u->inp_chunk_base;
+    u->inp_buf_size = u->inp_chunk_size;
+    return u->inp_buf_size - u->inp_buf_index;
+  }
+  u->inp_need = 1;
+  return 0;
+}
+
+/*
+ * inp_stream_hold
+ *    Holds the bytes of an instruction cut short by the end of a chunk
+ *    in inp_sess, to decode it again once the next chunk is fed. The pc
+ *    is left at its start.
+ */
+static void
+inp_stream_hold(struct ud *u)
+{
+  const uint8_t *start = u->inp_buf + u->inp_buf_index - u->inp_ctr;
+  size_t size = u->inp_buf_size - (u->inp_buf_index - u->inp_ctr), n;
+  for (n = 0; n < size; ++n) {
+    u->inp_sess[n] = start[n];
+  }
+  u->inp_buf = u->inp_sess;
+  u->inp_buf_size = size;
+  u->inp_buf_index = 0;
+  u->inp_chunk = NULL;
+  u->inp_chunk_size = 0;
+  u->inp_chunk_base = 0;
+  u->inp_ctr = 0;
+  u->inp_end = 1;
+}
+
+/*
+ * ud_inp_more
+ *    Returns non-zero if there is input left to decode, between two
+ *    instructions. Unlike decoding, it leaves the instruction last
+ *    decoded, and its bytes, in place; a refill keeps them at the
+ *    start of the window. Otherwise, sets the end of input.
+ */
+int
+ud_inp_more(struct ud *u)
+{
+  if (u->inp_end) {
+    return 0;
+  }
+  if (u->inp_buf_index < u->inp_buf_size) {
+    return 1;
+  }
+  if (u->inp_stream) {
+    if (u->inp_buf == u->inp_sess &&
+        u->inp_buf_index - u->inp_chunk_base < u->inp_chunk_size) {
+      return 1; /* the rest of the chunk, past its copy in inp_sess */
+    }
+    u->inp_need = 1;
+  } else if (inp_fill(u) > 0) {
+    return 1;
+  }
+  u->inp_end = 1;
+  return 0;
+}
+
 static uint8_t
 inp_peek(struct ud *u)
 {
   if (u->inp_end == 0) {
-    if (u->inp_buf != NULL) {
-      if (u->inp_buf_index < u->inp_buf_size) {
-        return u->inp_buf[u->inp_buf_index];
-      }
-    } else if (u->inp_peek != UD_EOI) {
-      return u->inp_peek;
-    } else {
-      int c;
-      if ((c = u->inp_hook(u)) != UD_EOI) {
-        u->inp_peek = c;
-        return u->inp_peek;
-      }
+    if (u->inp_buf_index < u->inp_buf_size || inp_fill(u) > 0) {
+      return u->inp_buf[u->inp_buf_index];
     }
   }
   u->inp_end = 1;
@@ -105,19 +199,9 @@ static uint8_t
 inp_next(struct ud *u)
 {
   if (u->inp_end == 0) {
-    if (u->inp_buf != NULL) {
-      if (u->inp_buf_index < u->inp_buf_size) {
-        u->inp_ctr++;
-        return (u->inp_curr = u->inp_buf[u->inp_buf_index++]);
-      }
-    } else {
-      int c = u->inp_peek;
-      if (c != UD_EOI || (c = u->inp_hook(u)) != UD_EOI) {
-        u->inp_peek = UD_EOI;
-        u->inp_curr = c;
-        u->inp_sess[u->inp_ctr++] = u->inp_curr;
-        return u->inp_curr;
-      }
+    if (u->inp_buf_index < u->inp_buf_size || inp_fill(u) > 0) {
+      u->inp_ctr++;
+      return (u->inp_curr = u->inp_buf[u->inp_buf_index++]);
     }
   }
   u->inp_end = 1;
@@ -228,61 +312,43 @@ eff_adr_mode(int dis_mode, int pfx_adr)
 static int 
 decode_prefixes(struct ud *u)
 {
-  int done = 0;
-  uint8_t curr = 0, last = 0;
+  const uint8_t *cls = ud_byte_class[u->dis_mode / 32];
+  uint8_t curr, last = 0, pfx;
   UD_RETURN_ON_ERROR(u);
 
-  do {
-    last = curr;
+  for (;;) {
     curr = inp_next(u); 
     UD_RETURN_ON_ERROR(u);
     if (u->inp_ctr == MAX_INSN_LENGTH) {
       UD_RETURN_WITH_ERROR(u, "max instruction length");
     }
-   
-    switch (curr)  
-    {
-    case 0x2E: 
-      u->pfx_seg = UD_R_CS; 
-      break;
-    case 0x36:     
-      u->pfx_seg = UD_R_SS; 
-      break;
-    case 0x3E: 
-      u->pfx_seg = UD_R_DS; 
-      break;
-    case 0x26: 
-      u->pfx_seg = UD_R_ES; 
+    pfx = BC_PFX(cls[curr]);
+    if (pfx == BC_none) {
       break;
-    case 0x64: 
-      u->pfx_seg = UD_R_FS; 
-      break;
-    case 0x65: 
-      u->pfx_seg = UD_R_GS; 
+    }
+    switch (pfx) {
+    case BC_opr:
+      u->pfx_opr = 0x66;
       break;
-    case 0x67: /* adress-size override prefix */ 
+    case BC_adr:
       u->pfx_adr = 0x67;
       break;
-    case 0xF0: 
+    case BC_lock:
       u->pfx_lock = 0xF0;
       break;
-    case 0x66: 
-      u->pfx_opr = 0x66;
-      break;
-    case 0xF2:
-      u->pfx_str = 0xf2;
+    case BC_str:
+      u->pfx_str = curr;
       break;
-    case 0xF3:
-      u->pfx_str = 0xf3;
+    case BC_rex:
       break;
     default:
-      /* consume if rex */
-      done = (u->dis_mode == 64 && (curr & 0xF0) == 0x40) ? 0 : 1;
+      u->pfx_seg = UD_R_ES + BC_SEG(pfx);
       break;
     }
-  } while (!done);
+    last = curr;
+  }
   /* rex prefixes in 64bit mode, must be the last prefix */
-  if (u->dis_mode == 64 && (last & 0xF0) == 0x40) {
+  if (BC_PFX(cls[last]) == BC_rex) {
     u->pfx_rex = last;  
   }
   return 0;
@@ -345,7 +411,7 @@ static int resolve_mnemonic( struct ud* u )
 {
   /* resolve 3dnow weirdness. */
   if ( u->mnemonic == UD_I3dnow ) {
-    u->mnemonic = ud_itab[ u->le->table[ inp_curr( u )  ] ].mnemonic;
+    u->mnemonic = ud_itab[ ud_table_lookup( u->le, inp_curr( u ) ) ].mnemonic;
   }
   /* SWAPGS is only valid in 64bits mode */
   if ( u->mnemonic == UD_Iswapgs && u->dis_mode != 64 ) {
@@ -724,7 +790,7 @@ decode_vex_immreg(struct ud *u, struct ud_operand *opr, unsigned size)
  *      Decodes a single operand.
  *      Returns the type of the operand (UD_NONE if none)
  */
-static int
+static UD_FORCE_INLINE int
 decode_operand(struct ud           *u, 
                struct ud_operand   *operand,
                enum ud_operand_code type,
@@ -887,35 +953,41 @@ decode_operand(struct ud           *u,
 
 
 /* 
- * decode_operands
+ * decode_operands_generic
  *
- *    Disassemble upto 3 operands of the current instruction being
- *    disassembled. By the end of the function, the operand fields
- *    of the ud structure will have been filled.
+ *    Disassemble upto 4 operands of the current instruction being
+ *    disassembled, from the operand types and sizes of its itab entry.
  */
 static int
-decode_operands(struct ud* u)
+decode_operands_generic(struct ud* u)
 {
-  decode_operand(u, &u->operand[0],
-                    u->itab_entry->operand1.type,
-                    u->itab_entry->operand1.size);
-  if (u->operand[0].type != UD_NONE) {
-      decode_operand(u, &u->operand[1],
-                        u->itab_entry->operand2.type,
-                        u->itab_entry->operand2.size);
-  }
-  if (u->operand[1].type != UD_NONE) {
-      decode_operand(u, &u->operand[2],
-                        u->itab_entry->operand3.type,
-                        u->itab_entry->operand3.size);
-  }
-  if (u->operand[2].type != UD_NONE) {
-      decode_operand(u, &u->operand[3],
-                        u->itab_entry->operand4.type,
-                        u->itab_entry->operand4.size);
+  const struct ud_itab_entry_operand *opr[4];
+  unsigned int i;
+
+  opr[0] = &u->itab_entry->operand1;
+  opr[1] = &u->itab_entry->operand2;
+  opr[2] = &u->itab_entry->operand3;
+  opr[3] = &u->itab_entry->operand4;
+  for (i = 0; i < 4; ++i) {
+    if (decode_operand(u, &u->operand[i], opr[i]->type, opr[i]->size) == UD_NONE) {
+      break;
+    }
   }
   return 0;
 }
+
+/* 
+ * decode_operands
+ *
+ *    Disassemble upto 4 operands of the current instruction being
+ *    disassembled. By the end of the function, the operand fields
+ *    of the ud structure will have been filled. Generated with a
+ *    case for each of the most frequent lists of operands, so that
+ *    operand types, and sizes which depend only on the modes, are
+ *    constants; other instructions are decoded by
+ *    decode_operands_generic() (see scripts/ud_itab.py).
+ */
+#include "itab-operands.h"
     
 /* -----------------------------------------------------------------------------
  * clear_insn() - clear instruction structure
@@ -1057,20 +1129,26 @@ decode_3dnow(struct ud* u)
 {
   uint16_t ptr;
   UD_ASSERT(u->le->type == UD_TAB__OPC_3DNOW);
-  UD_ASSERT(u->le->table[0xc] != 0);
-  decode_insn(u, u->le->table[0xc]);
+  UD_ASSERT(ud_table_lookup(u->le, 0xc) != 0);
+  decode_insn(u, ud_table_lookup(u->le, 0xc));
   inp_next(u); 
   if (u->error) {
     return -1;
   }
-  ptr = u->le->table[inp_curr(u)]; 
+  ptr = ud_table_lookup(u->le, inp_curr(u)); 
   UD_ASSERT((ptr & 0x8000) == 0);
   u->mnemonic = ud_itab[ptr].mnemonic;
   return 0;
 }
 
 
-static int
+/*
+ * decode_ssepfx()
+ *
+ *    Returns the index into an sse table, consuming the prefix used
+ *    to select the entry.
+ */
+static UD_INLINE uint8_t
 decode_ssepfx(struct ud *u)
 {
   uint8_t idx;
@@ -1085,10 +1163,10 @@ decode_ssepfx(struct ud *u)
     pfx = u->pfx_opr;
   }
   idx = ((pfx & 0xf) + 1) / 2;
-  if (u->le->table[idx] == 0) {
+  if (ud_table_lookup(u->le, idx) == 0) {
     idx = 0;
   }
-  if (idx && u->le->table[idx] != 0) {
+  if (idx && ud_table_lookup(u->le, idx) != 0) {
     /*
      * "Consume" the prefix as a part of the opcode, so it is no
      * longer exported as an instruction prefix.
@@ -1103,16 +1181,53 @@ decode_ssepfx(struct ud *u)
         u->pfx_opr = 0;
     }
   }
-  return decode_ext(u, u->le->table[idx]);
+  return idx;
+}
+
+
+/*
+ * decode_ssepfx_mask()
+ *
+ *    Same as decode_ssepfx(), for an sse table whose valid entries
+ *    are known in advance, as a mask of entry indices. Used by the
+ *    generated decoder (see itab-decode.h).
+ */
+static UD_INLINE uint8_t
+decode_ssepfx_mask(struct ud *u, unsigned int mask)
+{
+  uint8_t idx;
+  uint8_t pfx;
+
+  pfx = u->pfx_str;
+  if (pfx == 0) {
+    pfx = u->pfx_opr;
+  }
+  idx = ((pfx & 0xf) + 1) / 2;
+  if ((mask & (1 << idx)) == 0) {
+    return 0;
+  }
+  if (idx) {
+    u->pfx_str = 0;
+    if (pfx == 0x66) {
+      u->pfx_opr = 0;
+    }
+  }
+  return idx;
 }
 
 
+/*
+ * decode_vex()
+ *
+ *    Decodes the vex prefix bytes (if any), and returns the index
+ *    into a vex table.
+ */
 static int
-decode_vex(struct ud *u)
+decode_vex(struct ud *u, uint8_t *index)
 {
-  uint8_t index;
-  if (u->dis_mode != 64 && MODRM_MOD(inp_peek(u)) != 0x3) {
-    index = 0;
+  if ((ud_byte_class[u->dis_mode / 32][inp_curr(u)] & BC_vex_mod3) &&
+      MODRM_MOD(inp_peek(u)) != 0x3) {
+    *index = 0;
   } else {
     u->vex_op = inp_curr(u);
     u->vex_b1 = inp_next(u);
@@ -1126,100 +1241,152 @@ decode_vex(struct ud *u)
         UD_RETURN_WITH_ERROR(u, "reserved vex.m-mmmm value");
       }
       pp = u->vex_b2 & 0x3;
-      index = (pp << 2) | m;
+      *index = (pp << 2) | m;
     } else {
       /* 2-byte vex */
       UD_ASSERT(u->vex_op == 0xc5);
-      index = 0x1 | ((u->vex_b1 & 0x3) << 2);
+      *index = 0x1 | ((u->vex_b1 & 0x3) << 2);
     }
   }
-  return decode_ext(u, u->le->table[index]); 
+  return 0;
 }
 
 
+/*
+ * The opcode tables may also be generated as C code, in place of
+ * decode_ext() (see scripts/ud_itab.py --decoder=code), in which case
+ * itab-decode.h defines UD_ITAB_DECODE_CODE and decode_code().
+ */
+#include "itab-decode.h"
+
+/*
+ * lookup_ext()
+ *
+ *    Decode opcode extensions (if any), walking down the opcode
+ *    tables until an instruction entry is reached. Returns the
+ *    entry, or -1 on error. 3dnow instructions end in a 3dnow
+ *    table (u->le), for which the entry used to decode the
+ *    operands is returned (see decode_3dnow).
+ */
+static UD_FORCE_INLINE int
+lookup_ext(struct ud *u, uint16_t ptr)
+{
+  while (ptr & 0x8000) {
+    uint8_t idx = 0;
+    u->le = &ud_lookup_table_list[(~0x8000 & ptr)];
+
+    switch (u->le->type) {
+      case UD_TAB__OPC_MOD:
+        /* !11 = 0, 11 = 1 */
+        idx = (MODRM_MOD(modrm(u)) + 1) / 4;
+        break;
+        /* disassembly mode/operand size/address size based tables.
+         * 16 = 0,, 32 = 1, 64 = 2
+         */
+      case UD_TAB__OPC_MODE:
+        idx = u->dis_mode != 64 ? 0 : 1;
+        break;
+      case UD_TAB__OPC_OSIZE:
+        idx = eff_opr_mode(u->dis_mode, REX_W(u->pfx_rex), u->pfx_opr) / 32;
+        break;
+      case UD_TAB__OPC_ASIZE:
+        idx = eff_adr_mode(u->dis_mode, u->pfx_adr) / 32;
+        break;
+      case UD_TAB__OPC_X87:
+        idx = modrm(u) - 0xC0;
+        break;
+      case UD_TAB__OPC_VENDOR:
+        if (u->vendor == UD_VENDOR_ANY) {
+          /* choose a valid entry */
+          idx = (ud_table_lookup(u->le, idx) != 0) ? 0 : 1;
+        } else if (u->vendor == UD_VENDOR_AMD) {
+          idx = 0;
+        } else {
+          idx = 1;
+        }
+        break;
+      case UD_TAB__OPC_RM:
+        idx = MODRM_RM(modrm(u));
+        break;
+      case UD_TAB__OPC_REG:
+        idx = MODRM_REG(modrm(u));
+        break;
+      case UD_TAB__OPC_MODREG:
+        /* (!11, 11) x reg */
+        idx = (((MODRM_MOD(modrm(u)) + 1) / 4) << 3) | MODRM_REG(modrm(u));
+        break;
+      case UD_TAB__OPC_REGRM:
+        idx = modrm(u) & 0x3f;
+        break;
+      case UD_TAB__OPC_SSE:
+        idx = decode_ssepfx(u);
+        break;
+      case UD_TAB__OPC_VEX:
+        if (decode_vex(u, &idx) != 0) {
+          return -1;
+        }
+        break;
+      case UD_TAB__OPC_VEX_W:
+        idx = vex_w(u);
+        break;
+      case UD_TAB__OPC_VEX_L:
+        idx = vex_l(u);
+        break;
+      case UD_TAB__OPC_VEX_WL:
+        idx = (vex_w(u) << 1) | vex_l(u);
+        break;
+      case UD_TAB__OPC_3DNOW:
+        return ud_table_lookup(u->le, 0xc);
+      case UD_TAB__OPC_TABLE:
+        idx = inp_next(u);
+        if (u->error) {
+          return -1;
+        }
+        break;
+      default:
+        UD_ASSERT(!"not reached");
+        break;
+    }
+    ptr = ud_table_lookup(u->le, idx);
+  }
+  return ptr;
+}
+
+#ifndef UD_ITAB_DECODE_CODE
+
 /*
  * decode_ext()
  *
- *    Decode opcode extensions (if any)
+ *    Decode opcode extensions (if any), and the instruction.
  */
 static int
 decode_ext(struct ud *u, uint16_t ptr)
 {
-  uint8_t idx = 0;
-  if ((ptr & 0x8000) == 0) {
-    return decode_insn(u, ptr); 
+  int idx = lookup_ext(u, ptr);
+  if (idx < 0) {
+    return -1;
   }
-  u->le = &ud_lookup_table_list[(~0x8000 & ptr)];
   if (u->le->type == UD_TAB__OPC_3DNOW) {
     return decode_3dnow(u);
   }
-
-  switch (u->le->type) {
-    case UD_TAB__OPC_MOD:
-      /* !11 = 0, 11 = 1 */
-      idx = (MODRM_MOD(modrm(u)) + 1) / 4;
-      break;
-      /* disassembly mode/operand size/address size based tables.
-       * 16 = 0,, 32 = 1, 64 = 2
-       */
-    case UD_TAB__OPC_MODE:
-      idx = u->dis_mode != 64 ? 0 : 1;
-      break;
-    case UD_TAB__OPC_OSIZE:
-      idx = eff_opr_mode(u->dis_mode, REX_W(u->pfx_rex), u->pfx_opr) / 32;
-      break;
-    case UD_TAB__OPC_ASIZE:
-      idx = eff_adr_mode(u->dis_mode, u->pfx_adr) / 32;
-      break;
-    case UD_TAB__OPC_X87:
-      idx = modrm(u) - 0xC0;
-      break;
-    case UD_TAB__OPC_VENDOR:
-      if (u->vendor == UD_VENDOR_ANY) {
-        /* choose a valid entry */
-        idx = (u->le->table[idx] != 0) ? 0 : 1;
-      } else if (u->vendor == UD_VENDOR_AMD) {
-        idx = 0;
-      } else {
-        idx = 1;
-      }
-      break;
-    case UD_TAB__OPC_RM:
-      idx = MODRM_RM(modrm(u));
-      break;
-    case UD_TAB__OPC_REG:
-      idx = MODRM_REG(modrm(u));
-      break;
-    case UD_TAB__OPC_SSE:
-      return decode_ssepfx(u);
-    case UD_TAB__OPC_VEX:
-      return decode_vex(u);
-    case UD_TAB__OPC_VEX_W:
-      idx = vex_w(u);
-      break;
-    case UD_TAB__OPC_VEX_L:
-      idx = vex_l(u);
-      break;
-    case UD_TAB__OPC_TABLE:
-      inp_next(u);
-      return decode_opcode(u);
-    default:
-      UD_ASSERT(!"not reached");
-      break;
-  }
-
-  return decode_ext(u, u->le->table[idx]);
+  return decode_insn(u, idx);
 }
 
+#endif /* !UD_ITAB_DECODE_CODE */
+
 
 static int
 decode_opcode(struct ud *u)
 {
+#ifdef UD_ITAB_DECODE_CODE
+  return decode_code(u);
+#else
   uint16_t ptr;
   UD_ASSERT(u->le->type == UD_TAB__OPC_TABLE);
   UD_RETURN_ON_ERROR(u);
-  ptr = u->le->table[inp_curr(u)];
+  ptr = ud_table_lookup(u->le, inp_curr(u));
   return decode_ext(u, ptr);
+#endif
 }
 
  
@@ -1232,7 +1399,7 @@ ud_decode(struct ud *u)
 {
   inp_start(u);
   clear_insn(u);
-  u->le = &ud_lookup_table_list[0];
+  u->le = u->le_root;
   u->error = decode_prefixes(u) == -1 || 
              decode_opcode(u)   == -1 ||
              u->error;
@@ -1243,6 +1410,9 @@ ud_decode(struct ud *u)
     /* mark the sequence of bytes as invalid. */
     u->itab_entry = &ud_itab[0]; /* entry 0 is invalid */
     u->mnemonic = u->itab_entry->mnemonic;
+    if (u->inp_need) {
+      inp_stream_hold(u);
+    }
   } 
 
     /* maybe this stray segment override byte
@@ -1254,13 +1424,252 @@ ud_decode(struct ud *u)
         u->pfx_seg = 0;
 
   u->insn_offset = u->pc; /* set offset of instruction */
+  u->asm_buf[0] = '\0';
   u->asm_buf_fill = 0;   /* set translation buffer index to 0 */
+  u->asm_pending = 0;
   u->pc += u->inp_ctr;    /* move program counter by bytes decoded */
 
   /* return number of bytes disassembled. */
   return u->inp_ctr;
 }
 
+
+/*
+ * inp_skip
+ *    Consume n bytes of input.
+ */
+static UD_INLINE void
+inp_skip(struct ud *u, unsigned int n)
+{
+  if (n > 0 && u->inp_end == 0 && u->inp_buf_index + n <= u->inp_buf_size) {
+    u->inp_buf_index += n;
+    u->inp_ctr += n;
+    u->inp_curr = u->inp_buf[u->inp_buf_index - 1];
+    return;
+  }
+  while (n--) {
+    inp_next(u);
+  }
+}
+
+
+/*
+ * skip_modrm_rm
+ *
+ *    Consume the sib byte and displacement of a memory operand in
+ *    the rm field of the mod/rm byte, as decode_modrm_rm() would.
+ */
+static void
+skip_modrm_rm(struct ud *u)
+{
+  unsigned int disp = 0;
+  unsigned char mod, rm;
+
+  mod = MODRM_MOD(modrm(u));
+  rm  = (REX_B(u->_rex) << 3) | MODRM_RM(modrm(u));
+  if (mod == 3) {
+    return;
+  }
+  if (u->adr_mode == 16) {
+    if (mod == 1) {
+      disp = 1;
+    } else if (mod == 2 || (mod == 0 && rm == 6)) {
+      disp = 2;
+    }
+  } else {
+    if (mod == 1) {
+      disp = 1;
+    } else if (mod == 2) {
+      disp = 4;
+    } else if (mod == 0 && (u->adr_mode == 64 ? (rm & 7) : rm) == 5) {
+      disp = 4;
+    }
+    if ((rm & 7) == 4) {
+      /* sib base 5 takes a displacement, though not with rex.b
+       * in 32bit addressing (see decode_modrm_rm) */
+      uint8_t sib = inp_next(u);
+      if (SIB_B(sib) == 5 &&
+          (u->adr_mode == 64 || REX_B(u->pfx_rex) == 0)) {
+        disp = (mod == 1) ? 1 : 4;
+      }
+    }
+  }
+  inp_skip(u, disp);
+}
+
+
+/*
+ * imm_len
+ *
+ *    Returns the size in bytes of an immediate of a size class.
+ */
+static UD_INLINE unsigned int
+imm_len(const struct ud *u, unsigned int c)
+{
+  switch (c) {
+  case L_B: return 1;
+  case L_W: return 2;
+  case L_Z: return u->opr_mode == 16 ? 2 : 4;
+  case L_V: return u->opr_mode / 8;
+  case L_A: return u->opr_mode == 16 ? 4 : 6;
+  case L_O: return u->adr_mode / 8;
+  default:  return 0;
+  }
+}
+
+
+/*
+ * skip_operands
+ *
+ *    Consume the operand bytes of the current instruction, as
+ *    decode_operands() would.
+ */
+static void
+skip_operands(struct ud *u, uint8_t len)
+{
+  switch (L_MODRM(len)) {
+  case L_modrm_sreg:
+    if (MODRM_REG(modrm(u)) > 5) {
+      /* invalid segment register, ends the operands */
+      return;
+    }
+    /* intended fall through */
+  case L_modrm_rm:
+    skip_modrm_rm(u);
+    break;
+  case L_modrm_reg:
+    modrm(u);
+    break;
+  default:
+    break;
+  }
+  inp_skip(u, imm_len(u, L_IMM1(len)) + imm_len(u, L_IMM2(len)));
+}
+
+
+/*
+ * decode_length
+ *
+ *    Decodes the length of the next instruction, as ud_decode_length().
+ *    Returns the index of its itab entry, or -1 on an error.
+ */
+static int
+decode_length(struct ud *u)
+{
+  int idx = -1;
+
+  inp_start(u);
+  clear_insn(u);
+  u->le = u->le_root;
+  if (decode_prefixes(u) == 0) {
+    idx = lookup_ext(u, ud_table_lookup(u->le, inp_curr(u)));
+    if (idx >= 0) {
+      u->itab_entry = &ud_itab[idx];
+      if (resolve_mode(u) == 0) {
+        skip_operands(u, ud_itab_len[idx]);
+      }
+      if (u->le->type == UD_TAB__OPC_3DNOW) {
+        inp_next(u); /* 3dnow opcode suffix */
+      }
+    }
+  }
+  u->error = u->error != 0;
+  if (u->error && u->inp_need) {
+    inp_stream_hold(u);
+  }
+  u->itab_entry = &ud_itab[0];
+  u->insn_offset = u->pc;
+  u->asm_buf[0] = '\0';
+  u->asm_buf_fill = 0;
+  u->asm_pending = 0;
+  u->pc += u->inp_ctr;
+  return u->error ? -1 : idx;
+}
+
+
+/* =============================================================================
+ * ud_decode_length() - Decodes the length of the next instruction, without
+ * decoding its operands or mnemonic. Returns the number of bytes decoded,
+ * which is what ud_decode() would return.
+ * =============================================================================
+ */
+unsigned int
+ud_decode_length(struct ud *u)
+{
+  decode_length(u);
+  return u->inp_ctr;
+}
+
+
+/*
+ * rel_target
+ *
+ *    Destination of the relative branch just decoded, whose
+ *    displacement is the last size bytes of the instruction, as
+ *    ud_syn_rel_target() computes it.
+ */
+static uint64_t
+rel_target(const struct ud *u, unsigned int size)
+{
+  const uint8_t *p = u->inp_buf + u->inp_buf_index - size;
+  int64_t rel;
+
+  switch (size) {
+  case 1:
+    rel = (int8_t) p[0];
+    break;
+  case 2:
+    rel = (int16_t) (p[0] | p[1] << 8);
+    break;
+  default:
+    rel = (int32_t) (p[0] | p[1] << 8 | p[2] << 16 | (uint32_t) p[3] << 24);
+    break;
+  }
+  return (u->pc + rel) & (0xffffffffffffffffull >> (64 - u->opr_mode));
+}
+
+
+/* =============================================================================
+ * ud_scan_branches() - Scans the input for control transfer instructions,
+ * decoding only their length, branch class, and the displacement of
+ * relative branches. Fills in up to n records, and returns the number
+ * filled, fewer than n only at the end of input. Other instructions,
+ * and those which fail to decode, are skipped.
+ * =============================================================================
+ */
+unsigned int
+ud_scan_branches(struct ud *u, struct ud_branch *br, unsigned int n)
+{
+  unsigned int count = 0;
+
+  while (count < n && !u->inp_end) {
+    int idx = decode_length(u);
+    uint8_t type;
+    if (u->inp_ctr == 0) {
+      break;
+    }
+    if (idx < 0 || (type = ud_itab_branch[idx]) == UD_BRANCH_NONE) {
+      continue;
+    }
+    if (type == UD_BRANCH_FAR && L_MODRM(ud_itab_len[idx]) == L_modrm_rm &&
+        MODRM_MOD(u->modrm) == 3) {
+      continue; /* a far pointer in memory, with a register operand */
+    }
+    br->offset   = u->insn_offset;
+    br->target   = 0;
+    br->mnemonic = (uint16_t) ud_itab[idx].mnemonic;
+    br->len      = (uint8_t) u->inp_ctr;
+    br->type     = type;
+    if (type == UD_BRANCH_JCC || type == UD_BRANCH_JMP ||
+        type == UD_BRANCH_CALL) {
+      br->target = rel_target(u, imm_len(u, L_IMM1(ud_itab_len[idx])));
+    }
+    ++br;
+    ++count;
+  }
+  return count;
+}
+
 /*
 vim: set ts=2 sw=2 expandtab
 */
@@ -67,6 +67,45 @@
 #define P_strz          ( 1 << 12 )
 #define P_STR_ZF(n)     ( ( n >> 12 ) & 1 )
 
+/* itab entry operand bytes (ud_itab_len), for ud_decode_length(): 
+ * how the operands use the modrm byte, and the size classes of up
+ * to two immediates.
+ */
+#define L_none          ( 0 )
+#define L_modrm_reg     ( 1 )   /* modrm byte */
+#define L_modrm_rm      ( 2 )   /* modrm, sib and displacement */
+#define L_modrm_sreg    ( 3 )   /* as L_modrm_rm, unless modrm.reg is
+                                   not a segment register */
+#define L_MODRM(n)      ( n & 3 )
+#define L_imm1(c)       ( (c) << 2 )
+#define L_IMM1(n)       ( ( n >> 2 ) & 7 )
+#define L_imm2(c)       ( (c) << 5 )
+#define L_IMM2(n)       ( ( n >> 5 ) & 7 )
+
+/* immediate size classes */
+#define L_B             ( 1 )   /* byte */
+#define L_W             ( 2 )   /* word */
+#define L_Z             ( 3 )   /* word, or dword by operand size */
+#define L_V             ( 4 )   /* operand size */
+#define L_A             ( 5 )   /* far pointer, by operand size */
+#define L_O             ( 6 )   /* memory offset, by address size */
+
+/* byte classes (ud_byte_class), by disassembly mode: the kind of
+ * prefix a byte is, if any, and whether it is a vex escape.
+ */
+#define BC_none         ( 0 )
+#define BC_opr          ( 1 )   /* operand-size override */
+#define BC_adr          ( 2 )   /* address-size override */
+#define BC_lock         ( 3 )
+#define BC_str          ( 4 )   /* rep, repne */
+#define BC_rex          ( 5 )   /* 64-bit mode only */
+#define BC_seg(r)       ( 8 | (r) )  /* r = segment register - UD_R_ES */
+#define BC_PFX(n)       ( n & 0xf )
+#define BC_SEG(n)       ( n & 7 )
+#define BC_vex          ( 1 << 4 )
+#define BC_vex_mod3     ( 1 << 5 )   /* vex escape, only if modrm.mod
+                                        of the next byte is 3 */
+
 /* operand type constants -- order is important! */
 
 enum ud_operand_code {
@@ -177,17 +216,78 @@ struct ud_itab_entry
   struct ud_itab_entry_operand  operand3;
   struct ud_itab_entry_operand  operand4;
   uint32_t                      prefix;
+  uint16_t                      operand_decoder; /* see itab-operands.h */
+};
+
+/* Opcode table encodings (see scripts/ud_itab.py)
+ *
+ *  UD_TAB_ENC_DENSE    one slot for each index of the table.
+ *  UD_TAB_ENC_SPARSE   only the valid slots are stored. The table
+ *                      starts with a (bitmap, offset) pair of slots for
+ *                      every 16 indices; the bitmap marks valid indices,
+ *                      and the offset locates the first valid slot of
+ *                      the group in the table. Missing slots are INVALID.
+ */
+enum ud_table_encoding {
+  UD_TAB_ENC_DENSE,
+  UD_TAB_ENC_SPARSE
 };
 
 struct ud_lookup_table_list_entry {
     const uint16_t *table;
     enum ud_table_type type;
+    enum ud_table_encoding encoding;
     const char *meta;
 };
      
 extern struct ud_itab_entry ud_itab[];
+extern const uint8_t ud_itab_len[];
+extern const uint8_t ud_itab_branch[];
+extern const uint8_t ud_byte_class[3][256];
 extern struct ud_lookup_table_list_entry ud_lookup_table_list[];
 
+/* Index of the root table in ud_lookup_table_list, by disassembly
+ * mode (16, 32, 64) and vendor (UD_VENDOR_*). The tables below each
+ * root are specialized for the mode and vendor (see scripts/ud_opcode.py).
+ */
+extern const uint16_t ud_lookup_table_roots[3][3];
+
+/* Non-zero if there is input left to decode (see decode.c) */
+extern int ud_inp_more(struct ud *u);
+
+
+static UD_INLINE unsigned int
+ud_popcount16(uint16_t v)
+{
+#ifdef __GNUC__
+  return __builtin_popcount(v);
+#else
+  v = v - ((v >> 1) & 0x5555);
+  v = (v & 0x3333) + ((v >> 2) & 0x3333);
+  v = (v + (v >> 4)) & 0x0f0f;
+  return (v + (v >> 8)) & 0x1f;
+#endif
+}
+
+
+/* ud_table_lookup
+ *    Returns the slot at a given index of an opcode table, in any
+ *    encoding. Slot 0 is the invalid instruction.
+ */
+static UD_INLINE uint16_t
+ud_table_lookup(const struct ud_lookup_table_list_entry *le, unsigned int idx)
+{
+  if (le->encoding == UD_TAB_ENC_SPARSE) {
+    const uint16_t *group = &le->table[(idx >> 4) << 1];
+    uint16_t bit = 1 << (idx & 0xf);
+    if ((group[0] & bit) == 0) {
+      return 0;
+    }
+    return le->table[group[1] + ud_popcount16(group[0] & (bit - 1))];
+  }
+  return le->table[idx];
+}
+
 #endif /* UD_DECODE_H */
 
 /* vim:cindent
@@ -54,22 +54,44 @@ extern LIBUDIS86_DLLEXTERN void ud_set_input_hook(struct ud*, int (*)(struct ud*
 
 extern LIBUDIS86_DLLEXTERN void ud_set_input_buffer(struct ud*, const uint8_t*, size_t);
 
+extern LIBUDIS86_DLLEXTERN void ud_set_input_refill(struct ud*, 
+                                                    size_t (*)(struct ud*, uint8_t*, size_t),
+                                                    uint8_t*, size_t);
+
 #ifndef __UD_STANDALONE__
 extern LIBUDIS86_DLLEXTERN void ud_set_input_file(struct ud*, FILE*);
 #endif /* __UD_STANDALONE__ */
 
+extern LIBUDIS86_DLLEXTERN void ud_set_input_stream(struct ud*);
+
+extern LIBUDIS86_DLLEXTERN int ud_input_feed(struct ud*, const uint8_t*, size_t);
+
 extern LIBUDIS86_DLLEXTERN void ud_set_vendor(struct ud*, unsigned);
 
 extern LIBUDIS86_DLLEXTERN void ud_set_syntax(struct ud*, void (*)(struct ud*));
 
+extern LIBUDIS86_DLLEXTERN void ud_set_lazy_translation(struct ud*, int);
+
 extern LIBUDIS86_DLLEXTERN void ud_input_skip(struct ud*, size_t);
 
 extern LIBUDIS86_DLLEXTERN int ud_input_end(const struct ud*);
 
+extern LIBUDIS86_DLLEXTERN int ud_input_need_more(const struct ud*);
+
 extern LIBUDIS86_DLLEXTERN unsigned int ud_decode(struct ud*);
 
+extern LIBUDIS86_DLLEXTERN unsigned int ud_decode_length(struct ud*);
+
 extern LIBUDIS86_DLLEXTERN unsigned int ud_disassemble(struct ud*);
 
+extern LIBUDIS86_DLLEXTERN unsigned int ud_decode_batch(struct ud*,
+                                                        struct ud_insn_record*,
+                                                        unsigned int);
+
+extern LIBUDIS86_DLLEXTERN unsigned int ud_scan_branches(struct ud*,
+                                                         struct ud_branch*,
+                                                         unsigned int);
+
 extern LIBUDIS86_DLLEXTERN void ud_translate_intel(struct ud*);
 
 extern LIBUDIS86_DLLEXTERN void ud_translate_att(struct ud*);
@@ -99,12 +121,33 @@ extern LIBUDIS86_DLLEXTERN void ud_set_user_opaque_data(struct ud*, void*);
 extern LIBUDIS86_DLLEXTERN void* ud_get_user_opaque_data(const struct ud*);
 
 extern LIBUDIS86_DLLEXTERN void ud_set_asm_buffer(struct ud *u, char *buf, size_t size);
-
 extern LIBUDIS86_DLLEXTERN void ud_set_sym_resolver(struct ud *u, 
                                 const char* (*resolver)(struct ud*, 
                                                         uint64_t addr,
                                                         int64_t *offset));
 
+extern LIBUDIS86_DLLEXTERN void ud_symtab_init(struct ud_symtab*, struct ud_symbol*,
+                                               size_t, int);
+
+extern LIBUDIS86_DLLEXTERN const struct ud_symbol* ud_symtab_lookup(struct ud_symtab*,
+                                                                    uint64_t);
+
+extern LIBUDIS86_DLLEXTERN void ud_set_sym_table(struct ud*, struct ud_symtab*);
+
+#ifndef __UD_STANDALONE__
+extern LIBUDIS86_DLLEXTERN int ud_sweep_parallel(struct ud*, const uint8_t*, size_t,
+                                                 unsigned int,
+                                                 void (*)(struct ud*, unsigned int, void*),
+                                                 void (*)(unsigned int, void*),
+                                                 void*);
+
+extern LIBUDIS86_DLLEXTERN int ud_decode_regions(struct ud*, const struct ud_region*, size_t,
+                                                 unsigned int,
+                                                 void (*)(struct ud*, size_t, void*),
+                                                 void (*)(size_t, void*),
+                                                 void*);
+#endif /* __UD_STANDALONE__ */
+
 /* ========================================================================== */
 
 #ifdef __cplusplus
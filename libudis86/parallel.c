@@ -0,0 +1,600 @@
+/* udis86 - libudis86/parallel.c
+ *
+ * Copyright (c) 2013 Vivek Thampi
+ * All rights reserved.
+ * 
+ * Redistribution and use in source and binary forms, with or without modification, 
+ * are permitted provided that the following conditions are met:
+ * 
+ *     * Redistributions of source code must retain the above copyright notice, 
+ *       this list of conditions and the following disclaimer.
+ *     * Redistributions in binary form must reproduce the above copyright notice, 
+ *       this list of conditions and the following disclaimer in the documentation 
+ *       and/or other materials provided with the distribution.
+ * 
+ * THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND 
+ * ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED 
+ * WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE 
+ * DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR 
+ * ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES 
+ * (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; 
+ * LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON 
+ * ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT 
+ * (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS 
+ * SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+ */
+#include "udint.h"
+#include "extern.h"
+
+#ifndef __UD_STANDALONE__
+
+#include <stdlib.h>
+#include <string.h>
+
+/*
+ * Parallel decoding, over a pool of worker threads, each with its own
+ * copy of a ud object. The decoder tables are read-only, and all other
+ * decoder state is held in the ud object, so workers share nothing else.
+ */
+
+#if defined(_WIN32)
+# include <windows.h>
+# define POOL_WIN32
+#elif defined(HAVE_PTHREAD) && defined(HAVE_PTHREAD_H)
+# include <pthread.h>
+# include <unistd.h>
+# define POOL_PTHREAD
+#endif
+
+#define POOL_MAX_WORKERS  UD_MAX_THREADS
+
+#if defined(POOL_PTHREAD)
+# define POOL_LOCK(p)         pthread_mutex_lock(&(p)->lock)
+# define POOL_UNLOCK(p)       pthread_mutex_unlock(&(p)->lock)
+# define POOL_WAIT(p, cv)     pthread_cond_wait(&(p)->cv, &(p)->lock)
+# define POOL_WAKE(p, cv)     pthread_cond_signal(&(p)->cv)
+# define POOL_WAKE_ALL(p, cv) pthread_cond_broadcast(&(p)->cv)
+#elif defined(POOL_WIN32)
+# define POOL_LOCK(p)         EnterCriticalSection(&(p)->lock)
+# define POOL_UNLOCK(p)       LeaveCriticalSection(&(p)->lock)
+# define POOL_WAIT(p, cv)     SleepConditionVariableCS(&(p)->cv, &(p)->lock, INFINITE)
+# define POOL_WAKE(p, cv)     WakeConditionVariable(&(p)->cv)
+# define POOL_WAKE_ALL(p, cv) WakeAllConditionVariable(&(p)->cv)
+#endif
+
+struct pool;
+
+struct pool_worker {
+  struct pool     *pool;
+  unsigned int    index;
+#if defined(POOL_PTHREAD)
+  pthread_t       thread;
+#elif defined(POOL_WIN32)
+  HANDLE          thread;
+#endif
+};
+
+struct pool {
+  unsigned int    workers;      /* including the calling thread */
+  void            (*job)(void *arg, unsigned int worker);
+  void            *arg;
+  unsigned int    round;        /* number of jobs started */
+  unsigned int    busy;         /* workers running the current job */
+  int             quit;
+#if defined(POOL_PTHREAD)
+  pthread_mutex_t lock;
+  pthread_cond_t  start;
+  pthread_cond_t  done;
+#elif defined(POOL_WIN32)
+  CRITICAL_SECTION lock;
+  CONDITION_VARIABLE start;
+  CONDITION_VARIABLE done;
+#endif
+  struct pool_worker worker[POOL_MAX_WORKERS];
+};
+
+
+/*
+ * pool_cpus
+ *    Number of processors online.
+ */
+static unsigned int
+pool_cpus(void)
+{
+#if defined(POOL_WIN32)
+  SYSTEM_INFO info;
+  GetSystemInfo(&info);
+  return info.dwNumberOfProcessors;
+#elif defined(POOL_PTHREAD) && defined(_SC_NPROCESSORS_ONLN)
+  long n = sysconf(_SC_NPROCESSORS_ONLN);
+  return n > 0 ? (unsigned int) n : 1;
+#else
+  return 1;
+#endif
+}
+
+
+#if defined(POOL_PTHREAD) || defined(POOL_WIN32)
+/*
+ * pool_loop
+ *    Runs each job started on the pool, until the pool is freed.
+ */
+static void
+pool_loop(struct pool_worker *w)
+{
+  struct pool *pool = w->pool;
+  unsigned int round = 0;
+
+  POOL_LOCK(pool);
+  for (;;) {
+    while (pool->round == round && !pool->quit) {
+      POOL_WAIT(pool, start);
+    }
+    if (pool->quit) {
+      break;
+    }
+    round = pool->round;
+    POOL_UNLOCK(pool);
+    pool->job(pool->arg, w->index);
+    POOL_LOCK(pool);
+    if (--pool->busy == 0) {
+      POOL_WAKE(pool, done);
+    }
+  }
+  POOL_UNLOCK(pool);
+}
+
+#if defined(POOL_PTHREAD)
+static void*
+pool_thread(void *w)
+{
+  pool_loop((struct pool_worker *) w);
+  return NULL;
+}
+#else
+static DWORD WINAPI
+pool_thread(LPVOID w)
+{
+  pool_loop((struct pool_worker *) w);
+  return 0;
+}
+#endif
+#endif /* POOL_PTHREAD || POOL_WIN32 */
+
+
+/*
+ * pool_init
+ *    Starts a pool of up to n workers, 0 for one per processor. The
+ *    calling thread is worker 0. Returns the number of workers, which
+ *    is 1 if threads are not supported.
+ */
+static unsigned int
+pool_init(struct pool *pool, unsigned int n)
+{
+  unsigned int i;
+
+  if (n == 0) {
+    n = pool_cpus();
+  }
+  if (n > POOL_MAX_WORKERS) {
+    n = POOL_MAX_WORKERS;
+  }
+  pool->round = 0;
+  pool->busy  = 0;
+  pool->quit  = 0;
+#if defined(POOL_PTHREAD)
+  pthread_mutex_init(&pool->lock, NULL);
+  pthread_cond_init(&pool->start, NULL);
+  pthread_cond_init(&pool->done, NULL);
+#elif defined(POOL_WIN32)
+  InitializeCriticalSection(&pool->lock);
+  InitializeConditionVariable(&pool->start);
+  InitializeConditionVariable(&pool->done);
+#else
+  n = 1;
+#endif
+  for (i = 1; i < n; ++i) {
+    struct pool_worker *w = &pool->worker[i];
+    w->pool  = pool;
+    w->index = i;
+#if defined(POOL_PTHREAD)
+    if (pthread_create(&w->thread, NULL, pool_thread, w) != 0) {
+      break;
+    }
+#elif defined(POOL_WIN32)
+    if ((w->thread = CreateThread(NULL, 0, pool_thread, w, 0, NULL)) == NULL) {
+      break;
+    }
+#endif
+  }
+  pool->workers = i;
+  return pool->workers;
+}
+
+
+/*
+ * pool_run
+ *    Runs job(arg, worker) on every worker of the pool, and returns
+ *    once all are done.
+ */
+static void
+pool_run(struct pool *pool, void (*job)(void*, unsigned int), void *arg)
+{
+#if defined(POOL_PTHREAD) || defined(POOL_WIN32)
+  if (pool->workers > 1) {
+    POOL_LOCK(pool);
+    pool->job  = job;
+    pool->arg  = arg;
+    pool->busy = pool->workers - 1;
+    pool->round++;
+    POOL_WAKE_ALL(pool, start);
+    POOL_UNLOCK(pool);
+    job(arg, 0);
+    POOL_LOCK(pool);
+    while (pool->busy > 0) {
+      POOL_WAIT(pool, done);
+    }
+    POOL_UNLOCK(pool);
+    return;
+  }
+#endif
+  job(arg, 0);
+}
+
+
+/*
+ * pool_free
+ *    Stops the workers of a pool.
+ */
+static void
+pool_free(struct pool *pool)
+{
+#if defined(POOL_PTHREAD) || defined(POOL_WIN32)
+  unsigned int i;
+  POOL_LOCK(pool);
+  pool->quit = 1;
+  POOL_WAKE_ALL(pool, start);
+  POOL_UNLOCK(pool);
+  for (i = 1; i < pool->workers; ++i) {
+#if defined(POOL_PTHREAD)
+    pthread_join(pool->worker[i].thread, NULL);
+#else
+    WaitForSingleObject(pool->worker[i].thread, INFINITE);
+    CloseHandle(pool->worker[i].thread);
+#endif
+  }
+#endif
+#if defined(POOL_PTHREAD)
+  pthread_cond_destroy(&pool->done);
+  pthread_cond_destroy(&pool->start);
+  pthread_mutex_destroy(&pool->lock);
+#elif defined(POOL_WIN32)
+  DeleteCriticalSection(&pool->lock);
+#endif
+}
+
+
+/*
+ * worker_ud
+ *    A ud object for a worker: a copy of u, with buffers and symbol
+ *    table cache of its own. Returns 0 if out of memory.
+ */
+struct worker_ud {
+  struct ud       ud;
+  struct ud_symtab symtab;
+  char            *asm_buf;
+};
+
+static int
+worker_ud_init(struct worker_ud *w, const struct ud *u)
+{
+  w->ud = *u;
+  w->asm_buf = NULL;
+  if (u->asm_buf == u->asm_buf_int) {
+    w->ud.asm_buf = w->ud.asm_buf_int;
+  } else {
+    if ((w->asm_buf = (char *) malloc(u->asm_buf_size)) == NULL) {
+      return 0;
+    }
+    w->ud.asm_buf = w->asm_buf;
+  }
+  if (u->sym_table != NULL) {
+    w->symtab = *u->sym_table;
+    w->ud.sym_table = &w->symtab;
+  }
+  return 1;
+}
+
+
+/*
+ * workers
+ *    A pool, and a ud object for each of its workers.
+ */
+struct workers {
+  struct pool     pool;
+  unsigned int    count;        /* workers in the pool */
+  unsigned int    ready;        /* ud objects initialized */
+  struct worker_ud ud[POOL_MAX_WORKERS];
+};
+
+static void
+workers_free(struct workers *w)
+{
+  unsigned int i;
+  for (i = 0; i < w->ready; ++i) {
+    free(w->ud[i].asm_buf);
+  }
+  pool_free(&w->pool);
+  free(w);
+}
+
+/*
+ * workers_new
+ *    Starts up to n workers, 0 for one per processor, with copies of u.
+ *    Returns NULL if out of memory.
+ */
+static struct workers*
+workers_new(const struct ud *u, unsigned int n)
+{
+  struct workers *w = (struct workers *) malloc(sizeof(*w));
+  if (w == NULL) {
+    return NULL;
+  }
+  w->ready = 0;
+  w->count = pool_init(&w->pool, n);
+  for (; w->ready < w->count; w->ready++) {
+    if (!worker_ud_init(&w->ud[w->ready], u)) {
+      workers_free(w);
+      return NULL;
+    }
+  }
+  return w;
+}
+
+
+/* =============================================================================
+ * ud_sweep_parallel
+ *    Linear sweep of a buffer, in parallel, with the output of a serial
+ *    sweep. The buffer is split into chunks, which are decoded in rounds
+ *    of one chunk per worker, in three passes:
+ *
+ *    1. In parallel, each worker decodes the lengths of the instructions
+ *       of its chunk, from the start of the chunk, and marks where they
+ *       start. This may be out of step with a serial sweep, which would
+ *       enter the chunk at an instruction overlapping its start.
+ *    2. Serially, the start of each chunk is resynchronized: decoding
+ *       continues from the end of the previous chunk, until it reaches
+ *       an instruction start marked in pass 1. Instruction boundaries
+ *       converge after a few instructions, from where pass 1 is known
+ *       to be in step, up to the end of the chunk.
+ *    3. In parallel, each worker disassembles its chunk, from its
+ *       resynchronized start, calling insn() for each instruction.
+ *
+ *    done() is then called on each chunk of the round in order, on the
+ *    calling thread. u is the template of the workers' ud objects, and
+ *    buf[0] is at its pc; u itself is not changed. Returns 0, or -1 if
+ *    out of memory.
+ * =============================================================================
+ */
+
+#define SWEEP_CHUNK_SIZE  (1 << 18)
+
+struct sweep {
+  const uint8_t   *buf;
+  size_t          size;
+  uint64_t        pc;
+  unsigned int    chunks;         /* in the current round */
+  size_t          start[POOL_MAX_WORKERS];  /* nominal start of chunks */
+  size_t          end[POOL_MAX_WORKERS];    /* end of chunks */
+  size_t          sync[POOL_MAX_WORKERS + 1]; /* resynchronized starts */
+  size_t          last[POOL_MAX_WORKERS];   /* end of insns from pass 1 */
+  uint8_t         *mark;          /* insn starts, a bitmap per chunk */
+  struct worker_ud *ud;           /* of each worker */
+  void            (*insn)(struct ud*, unsigned int, void*);
+  void            *arg;
+};
+
+#define MARK(s, i)      ((s)->mark + (i) * (SWEEP_CHUNK_SIZE / 8))
+#define BIT_SET(m, b)   ((m)[(b) >> 3] |= 1 << ((b) & 7))
+#define BIT_TEST(m, b)  ((m)[(b) >> 3] & (1 << ((b) & 7)))
+
+static void
+sweep_mark(void *arg, unsigned int i)
+{
+  struct sweep *s = (struct sweep *) arg;
+  struct ud *u = &s->ud[i].ud;
+  uint8_t *mark = MARK(s, i);
+  size_t off = i == 0 ? s->sync[0] : s->start[i];
+
+  if (i >= s->chunks) {
+    return;
+  }
+  memset(mark, 0, SWEEP_CHUNK_SIZE / 8);
+  ud_set_input_buffer(u, s->buf + off, s->size - off);
+  while (off < s->end[i]) {
+    BIT_SET(mark, off - s->start[i]);
+    off += ud_decode_length(u);
+  }
+  s->last[i] = off;
+}
+
+static void
+sweep_disasm(void *arg, unsigned int i)
+{
+  struct sweep *s = (struct sweep *) arg;
+  struct ud *u = &s->ud[i].ud;
+  size_t off = s->sync[i], stop;
+  unsigned int len;
+
+  if (i >= s->chunks) {
+    return;
+  }
+  /* the last chunk of a round ends with the last instruction starting
+   * in it, which is where the next round starts */
+  stop = i < s->chunks - 1 ? s->sync[i + 1] : s->end[i];
+  ud_set_input_buffer(u, s->buf + off, s->size - off);
+  ud_set_pc(u, s->pc + off);
+  while (off < stop && (len = ud_disassemble(u)) > 0) {
+    s->insn(u, i, s->arg);
+    off += len;
+  }
+  if (i == s->chunks - 1) {
+    s->sync[s->chunks] = off;
+  }
+}
+
+int
+ud_sweep_parallel(struct ud *u, const uint8_t *buf, size_t size,
+                  unsigned int threads,
+                  void (*insn)(struct ud*, unsigned int chunk, void *arg),
+                  void (*done)(unsigned int chunk, void *arg),
+                  void *arg)
+{
+  struct workers *w;
+  struct sweep *s;
+  size_t next = 0;
+  unsigned int i;
+  int ret = -1;
+
+  w = workers_new(u, threads);
+  s = (struct sweep *) calloc(1, sizeof(*s));
+  if (w == NULL || s == NULL ||
+      (s->mark = (uint8_t *) malloc(w->count * (SWEEP_CHUNK_SIZE / 8))) == NULL) {
+    goto out;
+  }
+  s->ud   = w->ud;
+  s->buf  = buf;
+  s->size = size;
+  s->pc   = u->pc;
+  s->insn = insn;
+  s->arg  = arg;
+
+  while (next < size) {
+    size_t off;
+    /* the chunks of this round */
+    s->sync[0] = next;
+    for (i = 0, off = next; i < w->count && off < size; ++i) {
+      s->start[i] = off;
+      s->end[i]   = size - off > SWEEP_CHUNK_SIZE ? off + SWEEP_CHUNK_SIZE : size;
+      off = s->end[i];
+    }
+    s->chunks = i;
+
+    /* resynchronize the start of each chunk after the first */
+    if (s->chunks > 1) {
+      struct ud *ud = &s->ud[0].ud;
+      pool_run(&w->pool, sweep_mark, s);
+      for (i = 1; i < s->chunks; ++i) {
+        off = s->sync[i] = s->last[i - 1];
+        ud_set_input_buffer(ud, buf + off, size - off);
+        while (off < s->end[i] && !BIT_TEST(MARK(s, i), off - s->start[i])) {
+          off += ud_decode_length(ud);
+        }
+        if (off >= s->end[i]) {
+          s->last[i] = off; /* not in step within the chunk */
+        }
+      }
+    }
+
+    pool_run(&w->pool, sweep_disasm, s);
+    for (i = 0; done != NULL && i < s->chunks; ++i) {
+      done(i, arg);
+    }
+    next = s->sync[s->chunks];
+  }
+  ret = 0;
+
+out:
+  if (s != NULL) {
+    free(s->mark);
+    free(s);
+  }
+  if (w != NULL) {
+    workers_free(w);
+  }
+  return ret;
+}
+
+
+/* =============================================================================
+ * ud_decode_regions
+ *    Disassembles many independent regions of code, in parallel. Regions
+ *    are taken in rounds of REGIONS_PER_WORKER per worker, and assigned
+ *    to the workers of a round in turn, so that each region is always
+ *    decoded by the same worker, for a given number of workers. insn()
+ *    is called on each instruction of a region, in order, on the thread
+ *    of its worker. done() is then called on each region of the round,
+ *    in order, on the calling thread. Returns 0, or -1 if out of memory.
+ * =============================================================================
+ */
+
+#define REGIONS_PER_WORKER  64
+
+struct regions {
+  const struct ud_region *region;
+  size_t          first;          /* first region of the round */
+  size_t          count;          /* regions in the round */
+  unsigned int    workers;
+  uint8_t         mode;           /* of regions with a mode of 0 */
+  struct worker_ud *ud;           /* of each worker */
+  void            (*insn)(struct ud*, size_t, void*);
+  void            *arg;
+};
+
+static void
+regions_disasm(void *arg, unsigned int i)
+{
+  struct regions *r = (struct regions *) arg;
+  struct ud *u = &r->ud[i].ud;
+  size_t n;
+
+  for (n = i; n < r->count; n += r->workers) {
+    const struct ud_region *reg = &r->region[r->first + n];
+    ud_set_mode(u, reg->mode != 0 ? reg->mode : r->mode);
+    ud_set_input_buffer(u, reg->buf, reg->size);
+    ud_set_pc(u, reg->pc);
+    while (ud_disassemble(u)) {
+      r->insn(u, r->first + n, r->arg);
+    }
+  }
+}
+
+int
+ud_decode_regions(struct ud *u, const struct ud_region *region, size_t n,
+                  unsigned int threads,
+                  void (*insn)(struct ud*, size_t region, void *arg),
+                  void (*done)(size_t region, void *arg),
+                  void *arg)
+{
+  struct workers *w;
+  struct regions r;
+  size_t i;
+
+  if ((w = workers_new(u, threads)) == NULL) {
+    return -1;
+  }
+  r.region  = region;
+  r.workers = w->count;
+  r.mode    = u->dis_mode;
+  r.ud      = w->ud;
+  r.insn    = insn;
+  r.arg     = arg;
+  for (r.first = 0; r.first < n; r.first += r.count) {
+    r.count = n - r.first;
+    if (r.count > (size_t) w->count * REGIONS_PER_WORKER) {
+      r.count = (size_t) w->count * REGIONS_PER_WORKER;
+    }
+    pool_run(&w->pool, regions_disasm, &r);
+    for (i = 0; done != NULL && i < r.count; ++i) {
+      done(r.first + i, arg);
+    }
+  }
+  workers_free(w);
+  return 0;
+}
+
+#endif /* __UD_STANDALONE__ */
+
+/*
+vim: set ts=2 sw=2 expandtab
+*/
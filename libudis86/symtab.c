@@ -0,0 +1,186 @@
+/* udis86 - libudis86/symtab.c
+ *
+ * Copyright (c) 2013 Vivek Thampi
+ * All rights reserved.
+ * 
+ * Redistribution and use in source and binary forms, with or without modification, 
+ * are permitted provided that the following conditions are met:
+ * 
+ *     * Redistributions of source code must retain the above copyright notice, 
+ *       this list of conditions and the following disclaimer.
+ *     * Redistributions in binary form must reproduce the above copyright notice, 
+ *       this list of conditions and the following disclaimer in the documentation 
+ *       and/or other materials provided with the distribution.
+ * 
+ * THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND 
+ * ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED 
+ * WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE 
+ * DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR 
+ * ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES 
+ * (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; 
+ * LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON 
+ * ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT 
+ * (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS 
+ * SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+ */
+#include "udint.h"
+#include "extern.h"
+
+/*
+ * Symbol table, and the built-in symbol resolver using it. Symbols are
+ * sorted by address once, and looked up by binary search.
+ */
+
+static UD_INLINE int
+sym_less(const struct ud_symbol *a, const struct ud_symbol *b)
+{
+  return a->addr < b->addr || (a->addr == b->addr && a->size < b->size);
+}
+
+/*
+ * sort_symbols
+ *    Heap sort, in place.
+ */
+static void
+sort_symbols(struct ud_symbol *sym, size_t n)
+{
+  struct ud_symbol tmp;
+  size_t start = n / 2, end = n, root, child;
+
+  while (end > 1) {
+    if (start > 0) {
+      --start;          /* heapify */
+    } else {
+      --end;            /* move the largest to the end */
+      tmp = sym[end];
+      sym[end] = sym[0];
+      sym[0] = tmp;
+    }
+    for (root = start; (child = 2 * root + 1) < end; root = child) {
+      if (child + 1 < end && sym_less(&sym[child], &sym[child + 1])) {
+        ++child;
+      }
+      if (!sym_less(&sym[root], &sym[child])) {
+        break;
+      }
+      tmp = sym[root];
+      sym[root] = sym[child];
+      sym[child] = tmp;
+    }
+  }
+}
+
+
+/*
+ * sym_covers
+ *    Returns non-zero if addr belongs to a symbol: it is the last symbol
+ *    at or below addr, and addr is within its size.
+ */
+static UD_INLINE int
+sym_covers(const struct ud_symtab *tab, const struct ud_symbol *sym,
+           uint64_t addr)
+{
+  return sym->addr <= addr &&
+         (sym == &tab->sym[tab->count - 1] || addr < sym[1].addr) &&
+         (sym->size == 0 || addr - sym->addr < sym->size);
+}
+
+
+/* =============================================================================
+ * ud_symtab_init
+ *    Initializes a symbol table over an array of n symbols, which it
+ *    sorts in place, and which must remain valid while the table is in
+ *    use. If cache is non-zero, the most recent hits are cached, and
+ *    lookups modify the table.
+ * =============================================================================
+ */
+void
+ud_symtab_init(struct ud_symtab *tab, struct ud_symbol *sym, size_t n,
+               int cache)
+{
+  sort_symbols(sym, n);
+  tab->sym = sym;
+  tab->count = n;
+  tab->cache = cache;
+  tab->cache_fill = 0;
+}
+
+
+/* =============================================================================
+ * ud_symtab_lookup
+ *    Returns the symbol an address belongs to, or NULL.
+ * =============================================================================
+ */
+const struct ud_symbol*
+ud_symtab_lookup(struct ud_symtab *tab, uint64_t addr)
+{
+  const struct ud_symbol *sym;
+  size_t n, half;
+  unsigned int i;
+
+  if (tab->cache) {
+    for (i = 0; i < tab->cache_fill; ++i) {
+      if (sym_covers(tab, tab->cache_sym[i], addr)) {
+        sym = tab->cache_sym[i];
+        for (; i > 0; --i) {
+          tab->cache_sym[i] = tab->cache_sym[i - 1];
+        }
+        tab->cache_sym[0] = sym;
+        return sym;
+      }
+    }
+  }
+
+  if (tab->count == 0 || addr < tab->sym[0].addr) {
+    return NULL;
+  }
+  /* the last symbol at or below addr, with no branches on the data */
+  sym = tab->sym;
+  for (n = tab->count; n > 1; n -= half) {
+    half = n / 2;
+    sym = sym[half].addr <= addr ? sym + half : sym;
+  }
+  if (sym->size != 0 && addr - sym->addr >= sym->size) {
+    return NULL;
+  }
+
+  if (tab->cache) {
+    i = tab->cache_fill < UD_SYMTAB_CACHE_SIZE ? tab->cache_fill++ :
+                                                 UD_SYMTAB_CACHE_SIZE - 1;
+    for (; i > 0; --i) {
+      tab->cache_sym[i] = tab->cache_sym[i - 1];
+    }
+    tab->cache_sym[0] = sym;
+  }
+  return sym;
+}
+
+
+static const char*
+symtab_resolver(struct ud *u, uint64_t addr, int64_t *offset)
+{
+  const struct ud_symbol *sym = ud_symtab_lookup(u->sym_table, addr);
+  if (sym == NULL) {
+    return NULL;
+  }
+  *offset = (int64_t) (addr - sym->addr);
+  return sym->name;
+}
+
+
+/* =============================================================================
+ * ud_set_sym_table
+ *    Resolves symbols from a symbol table, with the built-in resolver.
+ *    A NULL table turns off symbol resolution.
+ * =============================================================================
+ */
+void
+ud_set_sym_table(struct ud *u, struct ud_symtab *tab)
+{
+  u->sym_table = tab;
+  u->sym_resolver = tab != NULL ? symtab_resolver : NULL;
+}
+
+/*
+vim: set ts=2 sw=2 expandtab
+*/
@@ -39,7 +39,7 @@ opr_cast(struct ud* u, struct ud_operand* op)
 {
   switch(op->size) {
   case 16 : case 32 :
-    ud_asmprintf(u, "*");   break;
+    ud_asmputs(u, "*");   break;
   default: break;
   }
 }
@@ -53,11 +53,13 @@ gen_operand(struct ud* u, struct ud_operand* op)
 {
   switch(op->type) {
   case UD_OP_CONST:
-    ud_asmprintf(u, "$0x%x", op->lval.udword);
+    ud_asmputs(u, "$");
+    ud_asmhex(u, op->lval.udword);
     break;
 
   case UD_OP_REG:
-    ud_asmprintf(u, "%%%s", ud_reg_tab[op->base - UD_R_AL]);
+    ud_asmputs(u, "%");
+    ud_asmputs(u, ud_reg_tab[op->base - UD_R_AL]);
     break;
 
   case UD_OP_MEM:
@@ -65,32 +67,37 @@ gen_operand(struct ud* u, struct ud_operand* op)
         opr_cast(u, op);
     }
     if (u->pfx_seg) {
-      ud_asmprintf(u, "%%%s:", ud_reg_tab[u->pfx_seg - UD_R_AL]);
+      ud_asmputs(u, "%");
+      ud_asmputs(u, ud_reg_tab[u->pfx_seg - UD_R_AL]);
+      ud_asmputs(u, ":");
     }
     if (op->offset != 0) { 
       ud_syn_print_mem_disp(u, op, 0);
     }
     if (op->base) {
-      ud_asmprintf(u, "(%%%s", ud_reg_tab[op->base - UD_R_AL]);
+      ud_asmputs(u, "(%");
+      ud_asmputs(u, ud_reg_tab[op->base - UD_R_AL]);
     }
     if (op->index) {
       if (op->base) {
-        ud_asmprintf(u, ",");
+        ud_asmputs(u, ",");
       } else {
-        ud_asmprintf(u, "(");
+        ud_asmputs(u, "(");
       }
-      ud_asmprintf(u, "%%%s", ud_reg_tab[op->index - UD_R_AL]);
+      ud_asmputs(u, "%");
+      ud_asmputs(u, ud_reg_tab[op->index - UD_R_AL]);
     }
     if (op->scale) {
-      ud_asmprintf(u, ",%d", op->scale);
+      ud_asmputs(u, ",");
+      ud_asmdec(u, op->scale);
     }
     if (op->base || op->index) {
-      ud_asmprintf(u, ")");
+      ud_asmputs(u, ")");
     }
     break;
 
   case UD_OP_IMM:
-    ud_asmprintf(u, "$");
+    ud_asmputs(u, "$");
     ud_syn_print_imm(u, op);
     break;
 
@@ -101,12 +108,16 @@ gen_operand(struct ud* u, struct ud_operand* op)
   case UD_OP_PTR:
     switch (op->size) {
       case 32:
-        ud_asmprintf(u, "$0x%x, $0x%x", op->lval.ptr.seg, 
-          op->lval.ptr.off & 0xFFFF);
+        ud_asmputs(u, "$");
+        ud_asmhex(u, op->lval.ptr.seg);
+        ud_asmputs(u, ", $");
+        ud_asmhex(u, op->lval.ptr.off & 0xFFFF);
         break;
       case 48:
-        ud_asmprintf(u, "$0x%x, $0x%x", op->lval.ptr.seg, 
-          op->lval.ptr.off);
+        ud_asmputs(u, "$");
+        ud_asmhex(u, op->lval.ptr.seg);
+        ud_asmputs(u, ", $");
+        ud_asmhex(u, op->lval.ptr.off);
         break;
     }
     break;
@@ -129,11 +140,11 @@ ud_translate_att(struct ud *u)
   if (! P_OSO(u->itab_entry->prefix) && u->pfx_opr) {
   switch (u->dis_mode) {
     case 16: 
-      ud_asmprintf(u, "o32 ");
+      ud_asmputs(u, "o32 ");
       break;
     case 32:
     case 64:
-      ud_asmprintf(u, "o16 ");
+      ud_asmputs(u, "o16 ");
       break;
   }
   }
@@ -142,81 +153,82 @@ ud_translate_att(struct ud *u)
   if (! P_ASO(u->itab_entry->prefix) && u->pfx_adr) {
   switch (u->dis_mode) {
     case 16: 
-      ud_asmprintf(u, "a32 ");
+      ud_asmputs(u, "a32 ");
       break;
     case 32:
-      ud_asmprintf(u, "a16 ");
+      ud_asmputs(u, "a16 ");
       break;
     case 64:
-      ud_asmprintf(u, "a32 ");
+      ud_asmputs(u, "a32 ");
       break;
   }
   }
 
   if (u->pfx_lock)
-    ud_asmprintf(u,  "lock ");
+    ud_asmputs(u, "lock ");
   if (u->pfx_rep) {
-    ud_asmprintf(u, "rep ");
+    ud_asmputs(u, "rep ");
   } else if (u->pfx_repe) {
-    ud_asmprintf(u, "repe ");
+    ud_asmputs(u, "repe ");
   } else if (u->pfx_repne) {
-    ud_asmprintf(u, "repne ");
+    ud_asmputs(u, "repne ");
   }
 
   /* special instructions */
   switch (u->mnemonic) {
   case UD_Iretf: 
-    ud_asmprintf(u, "lret "); 
+    ud_asmputs(u, "lret "); 
     break;
   case UD_Idb:
-    ud_asmprintf(u, ".byte 0x%x", u->operand[0].lval.ubyte);
+    ud_asmputs(u, ".byte ");
+    ud_asmhex(u, u->operand[0].lval.ubyte);
     return;
   case UD_Ijmp:
   case UD_Icall:
-    if (u->br_far) ud_asmprintf(u,  "l");
+    if (u->br_far) ud_asmputs(u, "l");
         if (u->operand[0].type == UD_OP_REG) {
           star = 1;
         }
-    ud_asmprintf(u, "%s", ud_lookup_mnemonic(u->mnemonic));
+    ud_asmputs(u, ud_lookup_mnemonic(u->mnemonic));
     break;
   case UD_Ibound:
   case UD_Ienter:
     if (u->operand[0].type != UD_NONE)
       gen_operand(u, &u->operand[0]);
     if (u->operand[1].type != UD_NONE) {
-      ud_asmprintf(u, ",");
+      ud_asmputs(u, ",");
       gen_operand(u, &u->operand[1]);
     }
     return;
   default:
-    ud_asmprintf(u, "%s", ud_lookup_mnemonic(u->mnemonic));
+    ud_asmputs(u, ud_lookup_mnemonic(u->mnemonic));
   }
 
   if (size == 8) {
-    ud_asmprintf(u, "b");
+    ud_asmputs(u, "b");
   } else if (size == 16) {
-    ud_asmprintf(u, "w");
+    ud_asmputs(u, "w");
   } else if (size == 64) {
-    ud_asmprintf(u, "q");
+    ud_asmputs(u, "q");
   }
 
   if (star) {
-    ud_asmprintf(u, " *");
+    ud_asmputs(u, " *");
   } else {
-    ud_asmprintf(u, " ");
+    ud_asmputs(u, " ");
   }
 
   if (u->operand[3].type != UD_NONE) {
     gen_operand(u, &u->operand[3]);
-    ud_asmprintf(u, ", ");
+    ud_asmputs(u, ", ");
   }
   if (u->operand[2].type != UD_NONE) {
     gen_operand(u, &u->operand[2]);
-    ud_asmprintf(u, ", ");
+    ud_asmputs(u, ", ");
   }
   if (u->operand[1].type != UD_NONE) {
     gen_operand(u, &u->operand[1]);
-    ud_asmprintf(u, ", ");
+    ud_asmputs(u, ", ");
   }
   if (u->operand[0].type != UD_NONE) {
     gen_operand(u, &u->operand[0]);
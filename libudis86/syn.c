@@ -128,6 +128,67 @@ ud_asmprintf(struct ud *u, const char *fmt, ...)
 }
 
 
+/*
+ * ud_asmputs
+ *    Appends a string to the translated assembly output. On an 
+ *    overflow, truncates the output as ud_asmprintf would.
+ */
+void
+ud_asmputs(struct ud *u, const char *s)
+{
+  size_t i = u->asm_buf_fill;
+  if (i + 1 >= u->asm_buf_size) {
+    return; /* full */
+  }
+  while (*s != '\0') {
+    if (i == u->asm_buf_size - 2) {
+      u->asm_buf[i] = '\0';
+      u->asm_buf_fill = u->asm_buf_size - 1;
+      return;
+    }
+    u->asm_buf[i++] = *s++;
+  }
+  u->asm_buf[i] = '\0';
+  u->asm_buf_fill = i;
+}
+
+
+/*
+ * ud_asmhex, ud_asmdec
+ *    Append a number, as "0x%x", or as "%d".
+ */
+void
+ud_asmhex(struct ud *u, uint64_t v)
+{
+  static const char digits[] = "0123456789abcdef";
+  char buf[19], *p = buf + sizeof(buf) - 1;
+  *p = '\0';
+  do {
+    *--p = digits[v & 0xf];
+    v >>= 4;
+  } while (v != 0);
+  *--p = 'x';
+  *--p = '0';
+  ud_asmputs(u, p);
+}
+
+void
+ud_asmdec(struct ud *u, int64_t v)
+{
+  char buf[21], *p = buf + sizeof(buf) - 1;
+  uint64_t n = v < 0 ? 0 - (uint64_t) v : (uint64_t) v;
+  *p = '\0';
+  do {
+    *--p = '0' + (char) (n % 10);
+    n /= 10;
+  } while (n != 0);
+  if (v < 0) {
+    *--p = '-';
+  }
+  ud_asmputs(u, p);
+}
+
+
 void
 ud_syn_print_addr(struct ud *u, uint64_t addr)
 {
@@ -136,15 +197,17 @@ ud_syn_print_addr(struct ud *u, uint64_t addr)
     int64_t offset = 0;
     name = u->sym_resolver(u, addr, &offset);
     if (name) {
+      ud_asmputs(u, name);
+      if (offset > 0) {
+        ud_asmputs(u, "+");
+      }
       if (offset) {
-        ud_asmprintf(u, "%s%+" FMT64 "d", name, offset);
-      } else {
-        ud_asmprintf(u, "%s", name);
+        ud_asmdec(u, offset);
       }
       return;
     }
   }
-  ud_asmprintf(u, "0x%" FMT64 "x", addr);
+  ud_asmhex(u, addr);
 }
 
 
@@ -171,7 +234,7 @@ ud_syn_print_imm(struct ud* u, const struct ud_operand *op)
     default: UD_ASSERT(!"invalid offset"); v = 0; /* keep cc happy */
     }
   }
-  ud_asmprintf(u, "0x%" FMT64 "x", v);
+  ud_asmhex(u, v);
 }
 
 
@@ -189,7 +252,7 @@ ud_syn_print_mem_disp(struct ud* u, const struct ud_operand *op, int sign)
     case 64: v = op->lval.uqword; break;
     default: UD_ASSERT(!"invalid offset"); v = 0; /* keep cc happy */
     }
-    ud_asmprintf(u, "0x%" FMT64 "x", v);
+    ud_asmhex(u, v);
   } else {
     int64_t v;
     UD_ASSERT(op->offset != 64);
@@ -200,9 +263,13 @@ ud_syn_print_mem_disp(struct ud* u, const struct ud_operand *op, int sign)
     default: UD_ASSERT(!"invalid offset"); v = 0; /* keep cc happy */
     }
     if (v < 0) {
-      ud_asmprintf(u, "-0x%" FMT64 "x", -v);
+      ud_asmputs(u, "-");
+      ud_asmhex(u, -v);
     } else if (v > 0) {
-      ud_asmprintf(u, "%s0x%" FMT64 "x", sign? "+" : "", v);
+      if (sign) {
+        ud_asmputs(u, "+");
+      }
+      ud_asmhex(u, v);
     }
   }
 }
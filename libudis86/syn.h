@@ -42,6 +42,10 @@ int ud_asmprintf(struct ud *u, const char *fmt, ...)
 int ud_asmprintf(struct ud *u, const char *fmt, ...);
 #endif
 
+void ud_asmputs(struct ud *u, const char *s);
+void ud_asmhex(struct ud *u, uint64_t v);
+void ud_asmdec(struct ud *u, int64_t v);
+
 void ud_syn_print_addr(struct ud *u, uint64_t addr);
 void ud_syn_print_imm(struct ud* u, const struct ud_operand *op);
 void ud_syn_print_mem_disp(struct ud* u, const struct ud_operand *, int sign);
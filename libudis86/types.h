@@ -164,6 +164,81 @@ struct ud_operand {
   uint8_t         _oprcode;
 };
 
+/* -----------------------------------------------------------------------------
+ * struct ud_insn_record - Compact record of a decoded instruction, as
+ * filled in by ud_decode_batch().
+ * -----------------------------------------------------------------------------
+ */
+struct ud_insn_record {
+  uint64_t        offset;       /* ud_insn_off() */
+  uint64_t        target;       /* destination of a relative branch */
+  uint16_t        mnemonic;     /* enum ud_mnemonic_code */
+  uint8_t         len;          /* ud_insn_len() */
+  uint8_t         flags;        /* UD_RECORD_* */
+  uint8_t         opr_type[4];  /* operand types (UD_NONE, UD_OP_*) */
+  uint8_t         opr_base[4];  /* operand base registers */
+};
+
+#define UD_RECORD_TARGET      0x01  /* target is valid */
+#define UD_RECORD_ERROR       0x02  /* error decoding the instruction */
+
+/* -----------------------------------------------------------------------------
+ * enum ud_branch_class, struct ud_branch - Control transfer instructions,
+ * as found by ud_scan_branches().
+ * -----------------------------------------------------------------------------
+ */
+enum ud_branch_class {
+  UD_BRANCH_NONE,
+  UD_BRANCH_JCC,                /* relative, conditional: jcc, jcxz, loop */
+  UD_BRANCH_JMP,                /* relative */
+  UD_BRANCH_CALL,               /* relative */
+  UD_BRANCH_RET,                /* near ret */
+  UD_BRANCH_INDIRECT,           /* near jmp or call, through a register
+                                   or memory */
+  UD_BRANCH_FAR                 /* far jmp, call or ret, iret, sysexit,
+                                   sysret */
+};
+
+struct ud_branch {
+  uint64_t        offset;       /* ud_insn_off() */
+  uint64_t        target;       /* destination of a relative branch */
+  uint16_t        mnemonic;     /* enum ud_mnemonic_code */
+  uint8_t         len;          /* ud_insn_len() */
+  uint8_t         type;         /* enum ud_branch_class */
+};
+
+/* -----------------------------------------------------------------------------
+ * struct ud_region - A region of code, as decoded by ud_decode_regions().
+ * -----------------------------------------------------------------------------
+ */
+struct ud_region {
+  const uint8_t   *buf;
+  size_t          size;
+  uint64_t        pc;           /* of buf[0] */
+  uint8_t         mode;         /* 16, 32, 64, or 0 for the mode of the ud */
+};
+
+/* -----------------------------------------------------------------------------
+ * struct ud_symbol, struct ud_symtab - Symbol table, for the built-in symbol
+ * resolver (see ud_symtab_init() and ud_set_sym_table()).
+ * -----------------------------------------------------------------------------
+ */
+struct ud_symbol {
+  uint64_t        addr;
+  uint64_t        size;         /* 0 if it extends up to the next symbol */
+  const char*     name;
+};
+
+#define UD_SYMTAB_CACHE_SIZE  8
+
+struct ud_symtab {
+  struct ud_symbol* sym;        /* sorted by address */
+  size_t          count;
+  int             cache;        /* cache recent lookups */
+  unsigned int    cache_fill;
+  const struct ud_symbol* cache_sym[UD_SYMTAB_CACHE_SIZE]; /* most recent first */
+};
+
 /* -----------------------------------------------------------------------------
  * struct ud - The udis86 object.
  * -----------------------------------------------------------------------------
@@ -174,17 +249,24 @@ struct ud
    * input buffering
    */
   int       (*inp_hook) (struct ud*);
+  size_t    (*inp_refill) (struct ud*, uint8_t*, size_t);
 #ifndef __UD_STANDALONE__
   FILE*     inp_file;
 #endif
   const uint8_t* inp_buf;
   size_t    inp_buf_size;
   size_t    inp_buf_index;
+  uint8_t*  inp_win;
+  size_t    inp_win_size;
   uint8_t   inp_curr;
   size_t    inp_ctr;
   uint8_t   inp_sess[64];
   int       inp_end;
-  int       inp_peek;
+  const uint8_t* inp_chunk;     /* stream input: chunk fed */
+  size_t    inp_chunk_size;
+  size_t    inp_chunk_base;     /* offset of the chunk's copy in inp_sess */
+  uint8_t   inp_stream;
+  uint8_t   inp_need;           /* stream input: waiting for a chunk */
 
   void      (*translator)(struct ud*);
   uint64_t  insn_offset;
@@ -197,11 +279,14 @@ struct ud
   size_t    asm_buf_size;
   size_t    asm_buf_fill;
   char      asm_buf_int[128];
+  uint8_t   asm_lazy;     /* translate on first ud_insn_asm() */
+  uint8_t   asm_pending;  /* translation of current insn is due */
 
   /*
    * Symbol resolver for use in the translation phase.
    */
   const char* (*sym_resolver)(struct ud*, uint64_t addr, int64_t *offset);
+  struct ud_symtab* sym_table;
 
   uint8_t   dis_mode;
   uint64_t  pc;
@@ -233,6 +318,7 @@ struct ud
   void *    user_opaque_data;
   struct ud_itab_entry * itab_entry;
   struct ud_lookup_table_list_entry *le;
+  struct ud_lookup_table_list_entry *le_root;
 };
 
 /* -----------------------------------------------------------------------------
@@ -244,6 +330,11 @@ typedef enum ud_mnemonic_code ud_mnemonic_code_t;
 
 typedef struct ud             ud_t;
 typedef struct ud_operand     ud_operand_t;
+typedef struct ud_insn_record ud_insn_record_t;
+typedef struct ud_branch      ud_branch_t;
+typedef struct ud_region      ud_region_t;
+typedef struct ud_symbol      ud_symbol_t;
+typedef struct ud_symtab      ud_symtab_t;
 
 #define UD_SYN_INTEL          ud_translate_intel
 #define UD_SYN_ATT            ud_translate_att
@@ -252,6 +343,8 @@ typedef struct ud_operand     ud_operand_t;
 #define UD_VENDOR_AMD         0
 #define UD_VENDOR_INTEL       1
 #define UD_VENDOR_ANY         2
+#define UD_MAX_THREADS        64    /* workers of ud_sweep_parallel(),
+                                         ud_decode_regions() */
 
 #endif
 
@@ -96,4 +96,14 @@
 # define UD_INLINE inline
 #endif
 
+/* inline even where the compiler would not, for functions which
+   fold to a few instructions with constant arguments */
+#if defined(_MSC_VER)
+# define UD_FORCE_INLINE __forceinline
+#elif defined(__GNUC__)
+# define UD_FORCE_INLINE inline __attribute__((always_inline))
+#else
+# define UD_FORCE_INLINE UD_INLINE
+#endif
+
 #endif /* _UDINT_H_ */
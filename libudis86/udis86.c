@@ -27,6 +27,7 @@
 #include "udint.h"
 #include "extern.h"
 #include "decode.h"
+#include "syn.h"
 
 #if !defined(__UD_STANDALONE__)
 # if HAVE_STRING_H
@@ -35,6 +36,7 @@
 #endif /* !__UD_STANDALONE__ */
 
 static void ud_inp_init(struct ud *u);
+static void ud_set_root(struct ud *u);
 
 /* =============================================================================
  * ud_init
@@ -71,14 +73,53 @@ ud_disassemble(struct ud* u)
   }
   if ((len = ud_decode(u)) > 0) {
     if (u->translator != NULL) {
-      u->asm_buf[0] = '\0';
-      u->translator(u);
+      if (u->asm_lazy) {
+        u->asm_pending = 1;
+      } else {
+        u->translator(u);
+      }
     }
   }
   return len;
 }
 
 
+/* =============================================================================
+ * ud_decode_batch
+ *    Decodes up to n instructions from the input into an array of
+ *    records, without translating them. Returns the number of records
+ *    filled, fewer than n only at the end of input. The ud object holds
+ *    the last instruction decoded, untranslated, unless stream input
+ *    ran out partway through the next one.
+ * =============================================================================
+ */
+extern unsigned int
+ud_decode_batch(struct ud* u, struct ud_insn_record* rec, unsigned int n)
+{
+  unsigned int count = 0;
+  while (count < n && ud_inp_more(u) && ud_decode(u) > 0) {
+    unsigned int i;
+    rec->offset   = u->insn_offset;
+    rec->target   = 0;
+    rec->mnemonic = (uint16_t) u->mnemonic;
+    rec->len      = (uint8_t) u->inp_ctr;
+    rec->flags    = u->error ? UD_RECORD_ERROR : 0;
+    for (i = 0; i < 4; ++i) {
+      struct ud_operand *op = &u->operand[i];
+      rec->opr_type[i] = (uint8_t) op->type;
+      rec->opr_base[i] = (uint8_t) op->base;
+      if (op->type == UD_OP_JIMM) {
+        rec->target = ud_syn_rel_target(u, op);
+        rec->flags |= UD_RECORD_TARGET;
+      }
+    }
+    ++rec;
+    ++count;
+  }
+  return count;
+}
+
+
 /* =============================================================================
  * ud_set_mode() - Set Disassemly Mode.
  * =============================================================================
@@ -89,9 +130,10 @@ ud_set_mode(struct ud* u, uint8_t m)
   switch(m) {
   case 16:
   case 32:
-  case 64: u->dis_mode = m ; return;
-  default: u->dis_mode = 16; return;
+  case 64: u->dis_mode = m ; break;
+  default: u->dis_mode = 16; break;
   }
+  ud_set_root(u);
 }
 
 /* =============================================================================
@@ -111,6 +153,18 @@ ud_set_vendor(struct ud* u, unsigned v)
   default:
     u->vendor = UD_VENDOR_AMD;
   }
+  ud_set_root(u);
+}
+
+/* =============================================================================
+ * ud_set_root() - Select the opcode tables for the mode and vendor.
+ * =============================================================================
+ */
+static void
+ud_set_root(struct ud* u)
+{
+  u->le_root = &ud_lookup_table_list[
+                  ud_lookup_table_roots[u->dis_mode / 32][u->vendor]];
 }
 
 /* =============================================================================
@@ -133,6 +187,19 @@ ud_set_syntax(struct ud* u, void (*t)(struct ud*))
   u->translator = t;
 }
 
+/* =============================================================================
+ * ud_set_lazy_translation() - Translate only on demand.
+ *    If lazy is non-zero, ud_disassemble() does not translate, but leaves
+ *    it to the first ud_insn_asm() for the instruction, so that clients
+ *    which do not look at the assembly do not pay for it.
+ * =============================================================================
+ */
+extern void 
+ud_set_lazy_translation(struct ud* u, int lazy)
+{
+  u->asm_lazy = lazy != 0;
+}
+
 /* =============================================================================
  * ud_insn() - returns the disassembled instruction
  * =============================================================================
@@ -140,6 +207,15 @@ ud_set_syntax(struct ud* u, void (*t)(struct ud*))
 const char* 
 ud_insn_asm(const struct ud* u) 
 {
+  if (u->asm_pending) {
+    /* lazy translation; the ud object is never const for the client
+     * that disassembled the instruction. */
+    struct ud *t = (struct ud*) u;
+    t->asm_pending = 0;
+    if (t->translator != NULL) {
+      t->translator(t);
+    }
+  }
   return u->asm_buf;
 }
 
@@ -163,16 +239,19 @@ ud_insn_hex(struct ud* u)
 {
   u->insn_hexcode[0] = 0;
   if (!u->error) {
+    static const char hex[] = "0123456789abcdef";
     unsigned int i;
     const unsigned char *src_ptr = ud_insn_ptr(u);
     char* src_hex;
     src_hex = (char*) u->insn_hexcode;
     /* for each byte used to decode instruction */
-    for (i = 0; i < ud_insn_len(u) && i < sizeof(u->insn_hexcode) / 2;
+    for (i = 0; i < ud_insn_len(u) && i < sizeof(u->insn_hexcode) / 2 - 1;
          ++i, ++src_ptr) {
-      sprintf(src_hex, "%02x", *src_ptr & 0xFF);
+      src_hex[0] = hex[*src_ptr >> 4];
+      src_hex[1] = hex[*src_ptr & 0xf];
       src_hex += 2;
     }
+    *src_hex = '\0';
   }
   return u->insn_hexcode;
 }
@@ -187,8 +266,7 @@ ud_insn_hex(struct ud* u)
 extern const uint8_t* 
 ud_insn_ptr(const struct ud* u) 
 {
-  return (u->inp_buf == NULL) ? 
-            u->inp_sess : u->inp_buf + (u->inp_buf_index - u->inp_ctr);
+  return u->inp_buf + (u->inp_buf_index - u->inp_ctr);
 }
 
 
@@ -349,26 +427,78 @@ static void
 ud_inp_init(struct ud *u)
 {
   u->inp_hook      = NULL;
-  u->inp_buf       = NULL;
+  u->inp_refill    = NULL;
+  u->inp_buf       = u->inp_sess;
   u->inp_buf_size  = 0;
   u->inp_buf_index = 0;
+  u->inp_win       = NULL;
+  u->inp_win_size  = 0;
   u->inp_curr      = 0;
   u->inp_ctr       = 0;
   u->inp_end       = 0;
-  u->inp_peek      = UD_EOI;
+  u->inp_chunk     = NULL;
+  u->inp_chunk_size = 0;
+  u->inp_chunk_base = 0;
+  u->inp_stream    = 0;
+  u->inp_need      = 0;
   UD_NON_STANDALONE(u->inp_file = NULL);
 }
 
 
+/* =============================================================================
+ * ud_set_input_refill
+ *    Sets a refill callback as input. The callback copies up to size
+ *    bytes of input into buf, and returns the number copied, 0 at the
+ *    end of input. With a NULL buf, it skips size bytes instead, and
+ *    returns the number skipped. Input is held in the given window, or
+ *    in an internal one if window is NULL or too small.
+ * =============================================================================
+ */
+void 
+ud_set_input_refill(register struct ud* u, 
+                    size_t (*refill)(struct ud*, uint8_t*, size_t),
+                    uint8_t* window, size_t size)
+{
+  ud_inp_init(u);
+  if (window == NULL || size < 2 * MAX_INSN_LENGTH) {
+    window = u->inp_sess;
+    size = sizeof(u->inp_sess);
+  }
+  u->inp_refill = refill;
+  u->inp_win = window;
+  u->inp_win_size = size;
+  u->inp_buf = window;
+}
+
+
 /* =============================================================================
  * ud_inp_set_hook
- *    Sets input hook.
+ *    Sets input hook. The hook is called for one byte at a time, as
+ *    the decoder needs it.
  * =============================================================================
  */
+static size_t
+inp_hook_refill(struct ud* u, uint8_t* buf, size_t size)
+{
+  size_t n = 0;
+  int c;
+  if (buf != NULL) {
+    if ((c = u->inp_hook(u)) == UD_EOI) {
+      return 0;
+    }
+    buf[0] = (uint8_t) c;
+    return 1;
+  }
+  while (n < size && u->inp_hook(u) != UD_EOI) {
+    ++n;
+  }
+  return n;
+}
+
 void 
 ud_set_input_hook(register struct ud* u, int (*hook)(struct ud*))
 {
-  ud_inp_init(u);
+  ud_set_input_refill(u, inp_hook_refill, NULL, 0);
   u->inp_hook = hook;
 }
 
@@ -387,23 +517,108 @@ ud_set_input_buffer(register struct ud* u, const uint8_t* buf, size_t len)
 }
 
 
+/* =============================================================================
+ * ud_set_input_stream
+ *    Sets a stream of chunks as input, fed with ud_input_feed().
+ * =============================================================================
+ */
+void
+ud_set_input_stream(struct ud* u)
+{
+  ud_inp_init(u);
+  u->inp_stream = 1;
+  u->inp_need = 1;
+  u->inp_end = 1;
+}
+
+
+/* =============================================================================
+ * ud_input_feed
+ *    Feeds the next chunk of stream input, which is decoded in place, and
+ *    must remain valid until the decoder needs more input. An instruction
+ *    split between two chunks is decoded from the bytes held from the
+ *    first, and a copy of the start of the second. A NULL buf ends the
+ *    stream. Returns 0, or -1 if the decoder does not need more input.
+ * =============================================================================
+ */
+int
+ud_input_feed(struct ud* u, const uint8_t* buf, size_t len)
+{
+  /* bytes are held from the start of the window, or none are if
+     the input ran out between two instructions */
+  size_t held = u->inp_buf_size - u->inp_buf_index, n;
+  if (!u->inp_stream || !u->inp_need) {
+    return -1;
+  }
+  if (buf == NULL) {
+    /* decode the bytes held, up to the end of input */
+    u->inp_stream = 0;
+    u->inp_buf_size = held;
+  } else if (len == 0) {
+    return 0;
+  } else if (held == 0) {
+    u->inp_buf = buf;
+    u->inp_buf_size = len;
+    u->inp_chunk = NULL;
+    u->inp_chunk_size = 0;
+    u->inp_chunk_base = 0;
+  } else {
+    for (n = 0; n < len && held + n < sizeof(u->inp_sess); ++n) {
+      u->inp_sess[held + n] = buf[n];
+    }
+    u->inp_buf_size = held + n;
+    u->inp_chunk = buf;
+    u->inp_chunk_size = len;
+    u->inp_chunk_base = held;
+  }
+  u->inp_buf_index = 0;
+  u->inp_need = 0;
+  u->inp_end = 0;
+  return 0;
+}
+
+
 #ifndef __UD_STANDALONE__
 /* =============================================================================
  * ud_input_set_file
- *    Set FILE as input.
+ *    Set FILE as input. The file is read in blocks.
  * =============================================================================
  */
-static int 
-inp_file_hook(struct ud* u)
+static size_t
+inp_file_refill(struct ud* u, uint8_t* buf, size_t size)
 {
-  return fgetc(u->inp_file);
+  uint8_t skip[256];
+  size_t n = 0, r;
+  long pos, end;
+  if (buf != NULL) {
+    return fread(buf, 1, size, u->inp_file);
+  }
+  /* seek if the file is seekable, up to its end at most, and read
+     otherwise */
+  pos = ftell(u->inp_file);
+  if (pos >= 0 && fseek(u->inp_file, 0, SEEK_END) == 0 &&
+      (end = ftell(u->inp_file)) >= pos) {
+    n = (size_t) (end - pos) < size ? (size_t) (end - pos) : size;
+    if (fseek(u->inp_file, pos + (long) n, SEEK_SET) == 0) {
+      return n;
+    }
+    fseek(u->inp_file, pos, SEEK_SET);
+    n = 0;
+  }
+  while (n < size) {
+    r = size - n < sizeof(skip) ? size - n : sizeof(skip);
+    if ((r = fread(skip, 1, r, u->inp_file)) == 0) {
+      break;
+    }
+    n += r;
+  }
+  return n;
 }
 
 void 
 ud_set_input_file(register struct ud* u, FILE* f)
 {
-  ud_inp_init(u);
-  u->inp_hook = inp_file_hook;
+  ud_set_input_refill(u, inp_file_refill, NULL, 0);
   u->inp_file = f;
 }
 #endif /* __UD_STANDALONE__ */
@@ -417,27 +632,20 @@ ud_set_input_file(register struct ud* u, FILE* f)
 void 
 ud_input_skip(struct ud* u, size_t n)
 {
+  size_t avail;
   if (u->inp_end) {
     return;
   }
-  if (u->inp_buf == NULL) {
-    while (n--) {
-      int c = u->inp_hook(u);
-      if (c == UD_EOI) {
-        goto eoi;
-      }
-    }
+  avail = u->inp_buf_size - u->inp_buf_index;
+  if (n <= avail) {
+    u->inp_buf_index += n;
     return;
-  } else {
-    if (n > u->inp_buf_size ||
-        u->inp_buf_index > u->inp_buf_size - n) {
-      u->inp_buf_index = u->inp_buf_size; 
-      goto eoi;
-    }
-    u->inp_buf_index += n; 
+  }
+  u->inp_buf_index = u->inp_buf_size; 
+  n -= avail;
+  if (u->inp_refill != NULL && u->inp_refill(u, NULL, n) == n) {
     return;
   }
-eoi:
   u->inp_end = 1;
   UDERR(u, "cannot skip, eoi received\b");
   return;
@@ -455,4 +663,17 @@ ud_input_end(const struct ud *u)
   return u->inp_end;
 }
 
+
+/* =============================================================================
+ * ud_input_need_more
+ *    Returns non-zero if stream input has been decoded up to the end of
+ *    the chunks fed, and the decoder needs the next chunk to continue.
+ * =============================================================================
+ */
+int
+ud_input_need_more(const struct ud *u)
+{
+  return u->inp_need;
+}
+
 /* vim:set ts=2 sw=2 expandtab */
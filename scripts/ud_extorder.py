@@ -0,0 +1,199 @@
+# udis86 - scripts/ud_extorder.py
+#
+# Copyright (c) 2013 Vivek Thampi
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+#
+# Search for the order of opcode extensions in the opcode tables (see
+# UdOpcodeTables.ExtOrder) which gives the smallest tables, and the
+# fewest lookups per instruction.
+#
+# Only the relative order of extensions used together by some instruction
+# definition affects the tables, so a candidate is generated for every
+# distinct way of ordering those pairs that satisfies the constraints in
+# UdOpcodeTables.ExtOrderConstraints. Each candidate is scored by the
+# size of the generated tables, and the average and maximum number of
+# table lookups along the paths to valid instructions.
+#
+#   usage: ud_extorder.py [options] <optable.xml>
+#
+
+import sys
+import getopt
+
+from ud_opcode import UdOpcodeTable, UdOpcodeTables
+from ud_itab import UdItabGenerator
+
+def extOrderCandidates(combos):
+    """Generate candidate extension orders, one for each acyclic way
+       of ordering the pairs of extensions that appear together in the
+       given combinations.
+    """
+    default = UdOpcodeTables.ExtOrder
+    last    = UdOpcodeTables.ExtOrderLast
+    free    = [ ext for ext in default if ext not in last ]
+
+    fixed = {}
+    for a, b in UdOpcodeTables.ExtOrderConstraints:
+        fixed[(a, b)] = fixed[(b, a)] = (a, b)
+
+    pairs = set()
+    for combo in combos:
+        exts = [ ext for ext in combo if ext in free ]
+        for i in range(len(exts)):
+            for j in range(i + 1, len(exts)):
+                pairs.add(tuple(sorted((exts[i], exts[j]))))
+    pairs = sorted(pairs)
+
+    def reaches(edges, a, b):
+        seen, stack = set(), [ a ]
+        while stack:
+            x = stack.pop()
+            if x == b:
+                return True
+            if x not in seen:
+                seen.add(x)
+                stack.extend([ y for (w, y) in edges if w == x ])
+        return False
+
+    def linearize(edges):
+        # topological sort, breaking ties by the default order
+        edges = edges | set([ e for e in fixed.values() ])
+        order, left = [], list(free)
+        while left:
+            for ext in left:
+                if not [ a for (a, b) in edges if b == ext and a in left ]:
+                    break
+            order.append(ext)
+            left.remove(ext)
+        return tuple(order) + tuple([ ext for ext in default if ext in last ])
+
+    def orient(i, edges):
+        if i == len(pairs):
+            yield linearize(edges)
+            return
+        a, b = pairs[i]
+        choices = [ fixed[(a, b)] ] if (a, b) in fixed else [ (a, b), (b, a) ]
+        for x, y in choices:
+            if not reaches(edges, y, x):
+                for order in orient(i + 1, edges | set([ (x, y) ])):
+                    yield order
+
+    return orient(0, set(fixed.values()))
+
+
+_insnDefs = None
+
+def scoreExtOrder(order):
+    """Build the tables for a given extension order, and return a
+       (order, bytes, avg depth, max depth) tuple, or (order, None) if
+       the definitions collide in the tables.
+    """
+    try:
+        tables = UdOpcodeTables(_insnDefs, snapshot='', extOrder=order)
+    except (UdOpcodeTable.CollisionError, UdOpcodeTables.CollisionError):
+        return (order, None)
+    itab   = UdItabGenerator(tables)
+    slots  = sum([ itab.getTableSlots(t) for t in tables.getTableList() ])
+    size   = (slots * UdOpcodeTables.TableSlotBytes +
+              len(tables.getTableList()) * UdOpcodeTables.LookupEntryBytes)
+    depths = [ len(path) for path, insn in tables.iterLeafPaths() ]
+    return (order, (size, float(sum(depths)) / len(depths), max(depths)))
+
+
+# Ranking keys over (bytes, avg depth, max depth)
+RankKeys = {
+    'depth' : lambda s: (s[1], s[2], s[0]),
+    'bytes' : lambda s: (s[0], s[1], s[2]),
+}
+
+
+def usage():
+    print("usage: ud_extorder.py [options] <optable.xml>")
+    print("options:")
+    print("    -j <n>          number of worker processes (default: 1)")
+    print("    --rank=<key>    rank candidates by 'depth' (default), or 'bytes'")
+    print("    --top=<n>       number of candidates to report (default: 10)")
+
+
+def main():
+    global _insnDefs
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "j:", [ "rank=", "top=" ])
+    except getopt.GetoptError as e:
+        print("error: %s" % e)
+        usage()
+        sys.exit(1)
+    if len(args) != 1:
+        usage()
+        sys.exit(1)
+
+    jobs, rank, top = 1, 'depth', 10
+    for opt, val in opts:
+        if opt == '-j':
+            jobs = int(val)
+        elif opt == '--rank' and val in RankKeys:
+            rank = val
+        elif opt == '--top':
+            top = int(val)
+        else:
+            usage()
+            sys.exit(1)
+
+    _insnDefs  = UdOpcodeTables.parseOptableXML(args[0])
+    combos     = UdOpcodeTables(_insnDefs, snapshot='').getExtCombos()
+    candidates = list(extOrderCandidates(combos))
+    if UdOpcodeTables.ExtOrder not in candidates:
+        candidates.append(UdOpcodeTables.ExtOrder)
+
+    if jobs > 1:
+        import multiprocessing
+        pool   = multiprocessing.Pool(jobs)
+        scores = pool.map(scoreExtOrder, candidates, 16)
+        pool.close()
+    else:
+        scores = [ scoreExtOrder(order) for order in candidates ]
+
+    legal  = [ (order, s) for order, s in scores if s is not None ]
+    legal.sort(key=lambda os: (RankKeys[rank](os[1]), os[0]))
+    scores = dict(scores)
+
+    def fmt(order, s):
+        return "%8d %8.3f %6d  %s" % (s[0], s[1], s[2], ",".join(order))
+
+    print("candidates: %d (%d collide)" %
+          (len(candidates), len(candidates) - len(legal)))
+    print("ranked by:  %s" % rank)
+    print("")
+    print("%8s %8s %6s  %s" % ("bytes", "avg", "max", "order"))
+    print(fmt(UdOpcodeTables.ExtOrder, scores[UdOpcodeTables.ExtOrder]) +
+          " (default)")
+    print("")
+    for order, s in legal[:top]:
+        print(fmt(order, s))
+    print("")
+    print("best: --ext-order=%s" % ",".join(legal[0][0]))
+
+if __name__ == '__main__':
+    main()
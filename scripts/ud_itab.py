@@ -25,6 +25,7 @@
 
 import os
 import sys
+import getopt
 from ud_opcode import UdOpcodeTable, UdOpcodeTables, UdInsnDef
 
 class UdItabGenerator:
@@ -199,14 +200,43 @@ class UdItabGenerator:
     
     def __init__(self, tables):
         self.tables = tables
-        self._insnIndexMap, i = {}, 0
+        # definitions with the same signature share a single itab entry
+        self._insnIndexMap, self._insnList, sigIndexMap = {}, [], {}
         for insn in tables.getInsnList():
-            self._insnIndexMap[insn], i = i, i + 1
+            sig = insn.signature()
+            if sig not in sigIndexMap:
+                sigIndexMap[sig] = len(self._insnList)
+                self._insnList.append(insn)
+            self._insnIndexMap[insn] = sigIndexMap[sig]
 
         self._tableIndexMap, i = {}, 0
         for table in tables.getTableList():
             self._tableIndexMap[table], i = i, i + 1
 
+        # itab entries with the same hot operands share an operand decoder
+        used = set([ self.getOperands(insn) for insn in self._insnList ])
+        self._oprDecoderMap, self._oprDecoderList = {}, []
+        for names in self.HotOperands:
+            names = tuple(names.split())
+            opr = tuple([ tuple(self.OperandDict[o]) for o in names ])
+            if opr in used and opr not in self._oprDecoderMap:
+                self._oprDecoderMap[opr] = len(self._oprDecoderList)
+                self._oprDecoderList.append((opr, names))
+
+    def getOperands(self, insn):
+        """Returns the (type, size) pairs of the operands of an insn"""
+        for opr in insn.operands:
+            if opr not in self.OperandDict:
+                print("error: invalid operand declaration: %s\n" % opr)
+                sys.exit(1)
+        return tuple([ tuple(self.OperandDict[opr]) for opr in insn.operands ])
+
+    def getOperandDecoderIndex(self, insn):
+        """Index of the operand decoder of an insn, the generic decoder
+           past the hot ones, if its operands are not hot."""
+        return self._oprDecoderMap.get(self.getOperands(insn),
+                                       len(self._oprDecoderList))
+
     def getInsnIndex(self, insn):
         assert isinstance(insn, UdInsnDef)
         return self._insnIndexMap[insn]
@@ -218,6 +248,49 @@ class UdItabGenerator:
     def getTableName(self, table):
         return "ud_itab__%d" % self.getTableIndex(table)
 
+    # A table is emitted in the sparse encoding if that takes at most
+    # this fraction of the slots of the dense encoding.
+    SparseThreshold = 0.5
+
+    def getSlot(self, e):
+        """Returns the C initializer of a table slot, None if INVALID"""
+        if isinstance(e, UdOpcodeTable):
+            return "GROUP(%d)" % self.getTableIndex(e)
+        elif isinstance(e, UdInsnDef) and e is not self.tables.invalidInsn:
+            return "%d" % self.getInsnIndex(e)
+        return None
+
+    def getSparseSlots(self, table):
+        """Returns the slots of the sparse encoding of a table: a
+           (bitmap, offset) pair for every group of 16 indices, followed
+           by the valid slots, as a list of (index, initializer) tuples.
+        """
+        groups = (table.size() + 15) // 16
+        header, slots = [], []
+        for g in range(groups):
+            bitmap, offset = 0, 2 * groups + len(slots)
+            for i in range(g * 16, min(table.size(), (g + 1) * 16)):
+                slot = self.getSlot(table.entryAt(i))
+                if slot is not None:
+                    bitmap |= 1 << (i - g * 16)
+                    slots.append((i, slot))
+            header.append((g * 16, "0x%04x" % bitmap))
+            header.append((g * 16, "%d" % offset))
+        return header, slots
+
+    def getTableEncoding(self, table):
+        header, slots = self.getSparseSlots(table)
+        if len(header) + len(slots) <= table.size() * self.SparseThreshold:
+            return "UD_TAB_ENC_SPARSE"
+        return "UD_TAB_ENC_DENSE"
+
+    def getTableSlots(self, table):
+        """Returns the number of slots taken by a table in its encoding"""
+        if self.getTableEncoding(table) == "UD_TAB_ENC_SPARSE":
+            header, slots = self.getSparseSlots(table)
+            return len(header) + len(slots)
+        return table.size()
+
     def genOpcodeTable(self, table, isGlobal=False):
         """Emit Opcode Table in C.
         """
@@ -225,6 +298,16 @@ class UdItabGenerator:
         if not isGlobal:
             self.ItabC.write('static ')
         self.ItabC.write( "const uint16_t %s[] = {\n" % self.getTableName(table))
+        if self.getTableEncoding(table) == "UD_TAB_ENC_SPARSE":
+            header, slots = self.getSparseSlots(table)
+            self.ItabC.write( "  /* (bitmap, offset) */\n" )
+            for i in range(0, len(header), 2):
+                self.ItabC.write( "  /* %2x */%12s,%12s,\n" %
+                                  (header[i][0], header[i][1], header[i + 1][1]))
+            for i, slot in slots:
+                self.ItabC.write( "  /* %2x */%12s,\n" % (i, slot))
+            self.ItabC.write( "};\n" )
+            return
         for i in range(table.size()):
             if i > 0 and i % 4 == 0: 
                 self.ItabC.write( "\n" )
@@ -243,8 +326,17 @@ class UdItabGenerator:
 
     def genOpcodeTables(self):
         tables = self.tables.getTableList()
+        roots  = self.tables.getRootList()
         for table in tables:
-            self.genOpcodeTable(table, table is self.tables.root)
+            self.genOpcodeTable(table, table in roots)
+
+        numSparse  = len([t for t in tables
+                            if self.getTableEncoding(t) == "UD_TAB_ENC_SPARSE"])
+        denseSize  = sum([t.size() for t in tables]) * 2
+        actualSize = sum([self.getTableSlots(t) for t in tables]) * 2
+        self.tables.log("itab: sparse tables = %d / %d" % (numSparse, len(tables)))
+        self.tables.log("itab: table bytes   = %d (%d if dense)" %
+                        (actualSize, denseSize))
 
 
     def genOpcodeTablesLookupIndex(self):
@@ -253,15 +345,28 @@ class UdItabGenerator:
         for table in self.tables.getTableList():
             f0 = self.getTableName(table) + ","
             f1 = table.label() + ","
-            f2 = "\"%s\"" % table.meta()
-            self.ItabC.write("    /* %03d */ { %s %s %s },\n" % 
-                             (self.getTableIndex(table), f0, f1, f2))
+            f2 = self.getTableEncoding(table) + ","
+            f3 = "\"%s\"" % table.meta()
+            self.ItabC.write("    /* %03d */ { %s %s %s %s },\n" % 
+                             (self.getTableIndex(table), f0, f1, f2, f3))
+        self.ItabC.write( "};" )
+
+        self.ItabC.write( "\n\n/* root tables, by disassembly mode and vendor */\n" )
+        self.ItabC.write( "const uint16_t ud_lookup_table_roots[%d][%d] = {\n" %
+                          (len(UdOpcodeTables.RootModes),
+                           len(UdOpcodeTables.RootVendors)) )
+        self.ItabC.write( "  /*     %s */\n" %
+                          " ".join([ "%5s" % v for v in UdOpcodeTables.RootVendors ]) )
+        for mode in UdOpcodeTables.RootModes:
+            roots = [ "%4d," % self.getTableIndex(self.tables.getRootTable(mode, v))
+                        for v in UdOpcodeTables.RootVendors ]
+            self.ItabC.write( "  /* %d */ { %s },\n" % (mode, " ".join(roots)) )
         self.ItabC.write( "};" )
 
 
     def genInsnTable( self ):
         self.ItabC.write( "struct ud_itab_entry ud_itab[] = {\n" );
-        for insn in self.tables.getInsnList():
+        for insn in self._insnList:
             opr_c = [ "O_NONE", "O_NONE", "O_NONE", "O_NONE" ]
             pfx_c = []
             opr   = insn.operands
@@ -280,11 +385,130 @@ class UdItabGenerator:
                 pfx_c.append( "P_none" )
             pfx = "|".join( pfx_c )
 
-            self.ItabC.write( "  /* %04d */ { UD_I%s %s, %s },\n" \
-                        % ( self.getInsnIndex(insn), insn.mnemonic + ',', opr, pfx ) )
+            self.ItabC.write( "  /* %04d */ { UD_I%s %s, %s, %d },\n" \
+                        % ( self.getInsnIndex(insn), insn.mnemonic + ',', opr, pfx,
+                            self.getOperandDecoderIndex(insn) ) )
         self.ItabC.write( "};\n" )
 
    
+    # Operand types using the modrm byte, and immediate size classes
+    # of operands, for ud_itab_len (see ud_decode_length in decode.c)
+    LengthModrm = {
+        'OP_E'  : "L_modrm_rm",  'OP_M'  : "L_modrm_rm",
+        'OP_F'  : "L_modrm_rm",  'OP_MR' : "L_modrm_rm",
+        'OP_MU' : "L_modrm_rm",  'OP_R'  : "L_modrm_rm",
+        'OP_N'  : "L_modrm_rm",  'OP_Q'  : "L_modrm_rm",
+        'OP_U'  : "L_modrm_rm",  'OP_W'  : "L_modrm_rm",
+        'OP_G'  : "L_modrm_reg", 'OP_V'  : "L_modrm_reg",
+        'OP_P'  : "L_modrm_reg", 'OP_C'  : "L_modrm_reg",
+        'OP_D'  : "L_modrm_reg", 'OP_S'  : "L_modrm_reg",
+    }
+    LengthImmSizes = { 'SZ_B' : "L_B", 'SZ_W' : "L_W",
+                       'SZ_Z' : "L_Z", 'SZ_V' : "L_V" }
+
+    def getLength(self, insn):
+        """Returns the C initializer of the ud_itab_len entry of an insn:
+           how its operands use the modrm byte, and the size classes
+           of its immediates.
+        """
+        modrm, imms = None, []
+        for i, (typ, size) in enumerate(self.getOperands(insn)):
+            if typ in self.LengthModrm:
+                if modrm in (None, "L_modrm_reg"):
+                    modrm = self.LengthModrm[typ]
+            elif typ in ('OP_I', 'OP_sI', 'OP_J'):
+                imms.append(self.LengthImmSizes[size])
+            elif typ == 'OP_L':
+                imms.append("L_B")
+            elif typ == 'OP_A':
+                imms.append("L_A")
+            elif typ == 'OP_O':
+                imms.append("L_O")
+            if typ == 'OP_S' and i < len(insn.operands) - 1:
+                # an invalid segment register ends the operands, which
+                # is only supported for a modrm rm operand following
+                assert i == 0 and len(insn.operands) == 2 and not imms
+                modrm = "L_modrm_sreg"
+        assert len(imms) <= 2
+        c = [ modrm ] if modrm else []
+        c += [ "L_imm%d(%s)" % (i + 1, imm) for i, imm in enumerate(imms) ]
+        return "|".join(c) or "L_none"
+
+    def genLengthTable(self):
+        self.ItabC.write("\n\n/* operand bytes of itab entries, for ud_decode_length */\n")
+        self.ItabC.write("const uint8_t ud_itab_len[] = {\n")
+        for insn in self._insnList:
+            self.ItabC.write("  /* %04d */ %s,\n" %
+                             (self.getInsnIndex(insn), self.getLength(insn)))
+        self.ItabC.write("};\n")
+
+    # Far transfers, other than jmp and call through a far pointer
+    BranchFar = ( 'retf', 'iretw', 'iretd', 'iretq', 'sysexit', 'sysret' )
+
+    def getBranchClass(self, insn):
+        """Returns the ud_itab_branch entry of an insn: the kind of
+           control transfer it makes (enum ud_branch_class, types.h).
+        """
+        oprs = [ typ for typ, size in self.getOperands(insn) ]
+        if insn.mnemonic in ('jmp', 'call'):
+            if 'OP_J' in oprs:
+                return "UD_BRANCH_%s" % insn.mnemonic.upper()
+            if oprs[0] in ('OP_A', 'OP_F'):
+                return "UD_BRANCH_FAR"
+            return "UD_BRANCH_INDIRECT"
+        if 'OP_J' in oprs:
+            # jcc, jcxz and loop
+            return "UD_BRANCH_JCC"
+        if insn.mnemonic == 'ret':
+            return "UD_BRANCH_RET"
+        if insn.mnemonic in self.BranchFar:
+            return "UD_BRANCH_FAR"
+        return "UD_BRANCH_NONE"
+
+    def genBranchTable(self):
+        self.ItabC.write("\n\n/* branch classes of itab entries, for ud_scan_branches */\n")
+        self.ItabC.write("const uint8_t ud_itab_branch[] = {\n")
+        for insn in self._insnList:
+            self.ItabC.write("  /* %04d */ %s,\n" %
+                             (self.getInsnIndex(insn), self.getBranchClass(insn)))
+        self.ItabC.write("};\n")
+
+    # Legacy prefix bytes, and their classes (see decode.h)
+    BytePrefixes = {
+        0x26 : "BC_seg(0)",     # es
+        0x2e : "BC_seg(1)",     # cs
+        0x36 : "BC_seg(2)",     # ss
+        0x3e : "BC_seg(3)",     # ds
+        0x64 : "BC_seg(4)",     # fs
+        0x65 : "BC_seg(5)",     # gs
+        0x66 : "BC_opr",
+        0x67 : "BC_adr",
+        0xf0 : "BC_lock",
+        0xf2 : "BC_str",
+        0xf3 : "BC_str",
+    }
+
+    def getByteClass(self, byte, mode):
+        if byte in self.BytePrefixes:
+            return self.BytePrefixes[byte]
+        if mode == 64 and (byte & 0xf0) == 0x40:
+            return "BC_rex"
+        if byte in (0xc4, 0xc5):
+            # les/lds, unless modrm.mod is 3, outside of 64-bit mode
+            return "BC_vex" if mode == 64 else "BC_vex_mod3"
+        return "BC_none"
+
+    def genByteClassTables(self):
+        self.ItabC.write("\n\n/* byte classes, by disassembly mode, for decode_prefixes */\n")
+        self.ItabC.write("const uint8_t ud_byte_class[3][256] = {\n")
+        for mode in (16, 32, 64):
+            self.ItabC.write("  /* %d */ {\n" % mode)
+            for row in range(0, 256, 8):
+                self.ItabC.write("    /* %02x */ %s,\n" % (row, ", ".join(
+                    [ self.getByteClass(b, mode) for b in range(row, row + 8) ])))
+            self.ItabC.write("  },\n")
+        self.ItabC.write("};\n")
+
     def getMnemonicsList(self):
         mnemonics = self.tables.getMnemonicsList()
         mnemonics.extend(self.MnemonicAliases)
@@ -354,26 +578,371 @@ class UdItabGenerator:
         self.ItabC.write("\n");
 
         self.genInsnTable()
+        self.genLengthTable()
+        self.genBranchTable()
+        self.genByteClassTables()
         self.genMnemonicsList()
 
         self.ItabC.close()
 
-    def genItab( self, location ):
+    # C expressions computing the index into a table of a given type
+    # in the generated decoder, as in decode_ext (see decode.c).
+    DecodeIndexExpr = {
+        '/mod'    : "(MODRM_MOD(modrm(u)) + 1) / 4",
+        '/m'      : "u->dis_mode != 64 ? 0 : 1",
+        '/o'      : "eff_opr_mode(u->dis_mode, REX_W(u->pfx_rex), u->pfx_opr) / 32",
+        '/a'      : "eff_adr_mode(u->dis_mode, u->pfx_adr) / 32",
+        '/x87'    : "modrm(u) - 0xC0",
+        '/rm'     : "MODRM_RM(modrm(u))",
+        '/reg'    : "MODRM_REG(modrm(u))",
+        '/modreg' : "(((MODRM_MOD(modrm(u)) + 1) / 4) << 3) | MODRM_REG(modrm(u))",
+        '/regrm'  : "modrm(u) & 0x3f",
+        '/vexw'   : "vex_w(u)",
+        '/vexl'   : "vex_l(u)",
+        '/vexwl'  : "(vex_w(u) << 1) | vex_l(u)",
+    }
+
+    def genDecodeFunction(self, table, isRoot):
+        """Emit the generated decoder function for a table: compute the
+           index, as decode_ext would, and switch on it to the function
+           of the selected table, or decode the selected instruction.
+        """
+        n, typ = self.getTableIndex(table), table.typ()
+        out = self.DecodeC
+        out.write("\nstatic int\ndecode_tab_%d(struct ud *u)\n{\n" % n)
+        if typ != '/3dnow':
+            out.write("  unsigned int idx;\n")
+        if typ == '/3dnow':
+            out.write("  u->le = &ud_lookup_table_list[%d];\n" % n)
+            out.write("  return decode_3dnow(u);\n}\n")
+            return
+        if typ == 'opctbl' and isRoot:
+            out.write("  UD_RETURN_ON_ERROR(u);\n")
+            out.write("  idx = inp_curr(u);\n")
+        elif typ == 'opctbl':
+            out.write("  idx = inp_next(u);\n")
+            out.write("  UD_RETURN_ON_ERROR(u);\n")
+        elif typ == '/sse':
+            mask = 0
+            for i in range(table.size()):
+                if self.getSlot(table.entryAt(i)) is not None:
+                    mask |= 1 << i
+            out.write("  idx = decode_ssepfx_mask(u, 0x%x);\n" % mask)
+        elif typ == '/vex':
+            out.write("  uint8_t vex;\n")
+            out.write("  if (decode_vex(u, &vex) != 0) {\n    return -1;\n  }\n")
+            out.write("  idx = vex;\n")
+        elif typ == '/vendor':
+            # for UD_VENDOR_ANY, choose a valid entry
+            anyIdx = 0 if self.getSlot(table.entryAt(0)) is not None else 1
+            out.write("  idx = u->vendor == UD_VENDOR_ANY ? %d :\n" % anyIdx)
+            out.write("        u->vendor == UD_VENDOR_AMD ? 0 : 1;\n")
+        else:
+            out.write("  idx = %s;\n" % self.DecodeIndexExpr[typ])
+
+        # group the cases by their target
+        targets, cases = [], {}
+        for i in range(table.size()):
+            e = table.entryAt(i)
+            if isinstance(e, UdOpcodeTable):
+                target = "decode_tab_%d(u)" % self.getTableIndex(e)
+            elif self.getSlot(e) is not None:
+                target = "decode_insn(u, %d)" % self.getInsnIndex(e)
+            else:
+                continue
+            if target not in cases:
+                targets.append(target)
+                cases[target] = []
+            cases[target].append(i)
+        out.write("  switch (idx) {\n")
+        for target in targets:
+            labels = [ "case 0x%02x:" % i for i in cases[target] ]
+            for i in range(0, len(labels), 6):
+                out.write("  %s\n" % " ".join(labels[i:i + 6]))
+            out.write("    return %s;\n" % target)
+        out.write("  default:\n")
+        out.write("    return decode_insn(u, INVALID);\n")
+        out.write("  }\n}\n")
+
+    def genDecodeC(self, filePath, code):
+        """Emit the generated decoder, included by decode.c: a function
+           for every opcode table, which decodes the extensions of the
+           table inline. Empty unless code is True, in which case
+           decode.c uses it in place of decode_ext.
+        """
+        self.DecodeC = open(filePath, "w")
+        self.DecodeC.write("/* itab-decode.h -- generated by udis86:scripts/ud_itab.py, do no edit */\n")
+        if code:
+            tables = self.tables.getTableList()
+            roots  = self.tables.getRootList()
+            self.DecodeC.write("\n#define UD_ITAB_DECODE_CODE 1\n")
+            self.DecodeC.write("#define INVALID %d\n\n" %
+                               self.getInsnIndex(self.tables.invalidInsn))
+            for table in tables:
+                self.DecodeC.write("static int decode_tab_%d(struct ud *u);\n" %
+                                   self.getTableIndex(table))
+            for table in tables:
+                self.genDecodeFunction(table, table in roots)
+
+            self.DecodeC.write("\n/* decode_code() -- decode from the root table of u */\n")
+            self.DecodeC.write("static int\ndecode_code(struct ud *u)\n{\n")
+            self.DecodeC.write("  switch (u->le_root - ud_lookup_table_list) {\n")
+            for root in roots:
+                self.DecodeC.write("  case %d:\n    return decode_tab_%d(u);\n" %
+                                   ((self.getTableIndex(root),) * 2))
+            self.DecodeC.write("  default:\n")
+            self.DecodeC.write("    UD_ASSERT(!\"not reached\");\n")
+            self.DecodeC.write("    return -1;\n  }\n}\n\n")
+            self.DecodeC.write("#undef INVALID\n")
+        self.DecodeC.close()
+
+    # C expressions for operand sizes which depend only on the operand
+    # and disassembly modes, as in resolve_operand_size (see decode.c).
+    OperandSizeExpr = {
+        'SZ_V'   : "u->opr_mode",
+        'SZ_Z'   : "(u->opr_mode == 16 ? 16 : 32)",
+        'SZ_Y'   : "(u->opr_mode == 16 ? 32 : u->opr_mode)",
+        'SZ_RDQ' : "(u->dis_mode == 64 ? 64 : 32)",
+    }
+
+    # Lists of operands which get a case of their own in decode_operands(),
+    # with decode_operand() inlined into it: the most frequent in compiled
+    # code, which make up about 96% of the instructions of a few 64-bit
+    # executables. All others are decoded by decode_operands_generic(), so
+    # that the decoder grows by one inlined decode_operand() per operand
+    # of the lists here, rather than of every list in the itab.
+    HotOperands = (
+        "Ev Gv", "Jz", "Gv Ev", "Ev sIb", "Eb Ib", "Jb", "Gv M", "Gv Eb",
+        "M", "Ev sIz", "Eb Gb", "", "Eb", "Ev Ib", "Gv Ev sIb", "Gv Ev sIz",
+        "Gb Eb", "Ev", "Ev Gv Ib", "Gv Ew", "Vx Wx", "Wx Vx",
+        "R0v", "R1v", "R2v", "R3v", "R4v", "R5v", "R6v", "R7v",
+        "R0v Iv", "R1v Iv", "R2v Iv", "R3v Iv",
+        "R4v Iv", "R5v Iv", "R6v Iv", "R7v Iv",
+    )
+
+    def genOperandsC(self, filePath):
+        """Emit decode_operands(), included by decode.c: a case for every
+           hot list of operands, selected by the operand_decoder of an
+           itab entry, which decodes the operands with their types, and
+           where possible sizes, known in advance. Other entries fall back
+           to decode_operands_generic().
+        """
+        out = open(filePath, "w")
+        out.write("/* itab-operands.h -- generated by udis86:scripts/ud_itab.py, do no edit */\n\n")
+        out.write("/* decode_operands() -- decode the operands of the current insn */\n")
+        out.write("static int\ndecode_operands(struct ud *u)\n{\n")
+        out.write("  switch (u->itab_entry->operand_decoder) {\n")
+        for n, (opr, names) in enumerate(self._oprDecoderList):
+            out.write("  case %d: /* %s */\n" % (n, " ".join(names) or "none"))
+            # decoding stops at the first operand of type UD_NONE
+            opr = list(opr[:4]) + [ ("OP_NONE", "SZ_NA") ] * (4 - len(opr))
+            for i, (typ, size) in enumerate(opr):
+                call = "decode_operand(u, &u->operand[%d], %s, %s)" % \
+                            (i, typ, self.OperandSizeExpr.get(size, size))
+                if typ == "OP_NONE" or i == 3:
+                    out.write("    %s;\n" % call)
+                    break
+                out.write("    if (%s == UD_NONE) {\n" % call)
+                out.write("      return 0;\n    }\n")
+            out.write("    return 0;\n")
+        out.write("  default:\n")
+        out.write("    return decode_operands_generic(u);\n  }\n}\n")
+        out.close()
+
+    def genItab( self, location, code=False ):
         self.genItabC(os.path.join(location, "itab.c"))
         self.genItabH(os.path.join(location, "itab.h"))
+        self.genOperandsC(os.path.join(location, "itab-operands.h"))
+        self.genDecodeC(os.path.join(location, "itab-decode.h"), code)
+
+    def getSizes(self):
+        """Returns the number of opcode tables and their size in bytes
+           (slots and lookup list entries), and the number of itab entries
+           and their size in bytes.
+        """
+        tables = self.tables.getTableList()
+        slots  = sum([ self.getTableSlots(t) for t in tables ])
+        return (len(tables),
+                slots * UdOpcodeTables.TableSlotBytes +
+                    len(tables) * UdOpcodeTables.LookupEntryBytes,
+                len(self._insnList),
+                len(self._insnList) * UdOpcodeTables.ItabEntryBytes)
+
+    def getPathBytes(self, path, encodings):
+        """Returns the number of bytes of table data read to decode along
+           a path: a lookup list entry and a slot for every table (plus a
+           (bitmap, offset) pair if it is sparse), and the itab entry.
+        """
+        size = UdOpcodeTables.ItabEntryBytes
+        for table, idx in path:
+            size += UdOpcodeTables.LookupEntryBytes
+            if encodings[table] == "UD_TAB_ENC_SPARSE":
+                size += 3 * UdOpcodeTables.TableSlotBytes
+            else:
+                size += UdOpcodeTables.TableSlotBytes
+        return size
+
+    def genReport(self, filePath):
+        """Write a json report of the layout of the tables: the lookups
+           and bytes of table data needed to decode every instruction,
+           and the size and fill of the tables, by type.
+        """
+        import json
+        tables    = self.tables.getTableList()
+        encodings = dict([ (t, self.getTableEncoding(t)) for t in tables ])
+
+        tableTypes = {}
+        for t in tables:
+            stats = tableTypes.setdefault(t.typ(), {
+                'label' : t.label(), 'count' : 0, 'sparse' : 0,
+                'slots' : 0, 'emittedSlots' : 0, 'entries' : 0 })
+            stats['count']        += 1
+            stats['sparse']       += encodings[t] == "UD_TAB_ENC_SPARSE"
+            stats['slots']        += t.size()
+            stats['emittedSlots'] += self.getTableSlots(t)
+            stats['entries']      += len([ e for k, e in t.entries()
+                                             if e is not None ])
+        for stats in tableTypes.values():
+            stats['fill']  = round(float(stats['entries']) / stats['slots'], 3)
+            stats['bytes'] = (stats['emittedSlots'] * UdOpcodeTables.TableSlotBytes +
+                              stats['count'] * UdOpcodeTables.LookupEntryBytes)
+
+        leaves = []
+        for root in self.tables.getRootList():
+            names = ",".join([ "%d/%s" % (m, v)
+                                 for m in UdOpcodeTables.RootModes
+                                 for v in UdOpcodeTables.RootVendors
+                                 if self.tables.getRootTable(m, v) is root ])
+            leaves.extend([ (names, path, insn) for path, insn
+                                in self.tables.iterLeafPaths(root) ])
+
+        paths, depthHist, bytesHist = [], {}, {}
+        for names, path, insn in leaves:
+            opcodes = []
+            for table, idx in path:
+                if table.typ() == 'opctbl':
+                    opcodes.append("%02x" % idx)
+                else:
+                    opcodes.append("%s=%x" % (table.typ(), idx))
+            depth, size = len(path), self.getPathBytes(path, encodings)
+            paths.append({ 'root'     : names,
+                           'opcodes'  : " ".join(opcodes),
+                           'mnemonic' : insn.mnemonic,
+                           'depth'    : depth,
+                           'bytes'    : size })
+            depthHist[depth] = depthHist.get(depth, 0) + 1
+            bytesHist[size]  = bytesHist.get(size, 0) + 1
+
+        depths = [ p['depth'] for p in paths ]
+        sizes  = [ p['bytes'] for p in paths ]
+        report = {
+            'summary' : {
+                'tables'      : len(tables),
+                'insnDefs'    : len(self.tables.getInsnList()),
+                'itabEntries' : len(self._insnList),
+                'tableBytes'  : sum([ s['bytes'] for s in tableTypes.values() ]),
+                'itabBytes'   : len(self._insnList) * UdOpcodeTables.ItabEntryBytes,
+                'paths'       : len(paths),
+                'avgDepth'    : round(float(sum(depths)) / len(depths), 3),
+                'maxDepth'    : max(depths),
+                'avgBytes'    : round(float(sum(sizes)) / len(sizes), 3),
+                'maxBytes'    : max(sizes),
+            },
+            'tableTypes'     : tableTypes,
+            'depthHistogram' : dict([ (str(k), v) for k, v in depthHist.items() ]),
+            'bytesHistogram' : dict([ (str(k), v) for k, v in bytesHist.items() ]),
+            'paths'          : paths,
+        }
+        with open(filePath, "w") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+            f.write("\n")
 
 def usage():
-    print("usage: ud_itab.py <optable.xml> <output-path>")
+    print("usage: ud_itab.py [options] <optable.xml> <output-path>")
+    print("options:")
+    print("    --flatten   merge chained opcode extension tables, trading")
+    print("                table size for fewer lookups per instruction")
+    print("    --ext-order=<ext,...>")
+    print("                order of opcode extensions in the tables, outermost")
+    print("                first (see ud_extorder.py)")
+    print("    --no-specialize")
+    print("                do not create tables specialized by disassembly")
+    print("                mode and vendor, but resolve those at decode time")
+    print("    --exclude=<isa,...>")
+    print("                leave out definitions of the given ISA families,")
+    print("                which then decode as invalid: cpuid flags (e.g. x87,")
+    print("                mmx, avx, undoc), 3dnow, or vendors (amd, intel)")
+    print("    --modes=<mode,...>")
+    print("                only decode the given disassembly modes (16, 32,")
+    print("                64); all bytes decode as invalid in the others")
+    print("    --decoder=<tables|code>")
+    print("                decode by interpreting the opcode tables (default),")
+    print("                or with C code generated from them (itab-decode.h)")
+    print("    --report=<file>")
+    print("                write a json report of the table layout, with the")
+    print("                lookups and bytes needed to decode each instruction")
 
 def main():
 
-    if len(sys.argv) != 3:
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "", [ "flatten", "ext-order=",
+                                                        "no-specialize",
+                                                        "exclude=", "modes=",
+                                                        "decoder=",
+                                                        "report=" ])
+    except getopt.GetoptError as e:
+        print("error: %s" % e)
+        usage()
+        sys.exit(1)
+
+    if len(args) != 2:
         usage()
         sys.exit(1)
     
-    tables = UdOpcodeTables(xml=sys.argv[1])
+    extOrder, exclude, modes, decoder = None, [], None, "tables"
+    optNames = [ opt for opt, val in opts ]
+    for opt, val in opts:
+        if opt == "--ext-order":
+            extOrder = val.split(",")
+        elif opt == "--exclude":
+            exclude.extend(val.lower().split(","))
+        elif opt == "--decoder":
+            if val not in ("tables", "code"):
+                print("error: invalid decoder: %s" % val)
+                sys.exit(1)
+            decoder = val
+        elif opt == "--modes":
+            modes = [ int(m) for m in val.split(",") if m.isdigit() ]
+            if not modes or set(modes) - set(UdOpcodeTables.RootModes):
+                print("error: invalid modes: %s" % val)
+                sys.exit(1)
+    if modes is not None and "--no-specialize" in optNames:
+        print("error: --modes requires specialized tables")
+        sys.exit(1)
+    try:
+        tables = UdOpcodeTables(xml=args[0], extOrder=extOrder,
+                                exclude=exclude)
+    except ValueError as e:
+        print("error: %s" % e)
+        sys.exit(1)
+    unknown = set(exclude) - set(tables.getIsaList())
+    if unknown:
+        print("error: unknown isa: %s (one of: %s)" %
+              (",".join(sorted(unknown)), ",".join(tables.getIsaList())))
+        sys.exit(1)
+    if "--no-specialize" not in optNames:
+        tables.specializeTables(modes)
+    for opt, val in opts:
+        if opt == "--flatten":
+            tables.flattenTables()
     itab   = UdItabGenerator(tables)
-    itab.genItab(sys.argv[2])
+    itab.genItab(args[1], code=(decoder == "code"))
+    if exclude or modes is not None:
+        print("itab: %d tables (%d bytes), %d ud_itab entries (%d bytes)" %
+              itab.getSizes())
+    for opt, val in opts:
+        if opt == "--report":
+            itab.genReport(val)
 
 if __name__ == '__main__':
     main()
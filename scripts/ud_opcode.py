@@ -24,6 +24,7 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import os
+import sys
 
 # Some compatibility stuff for supporting python 2.x as well as python 3.x
 def itemslist(dict):
@@ -68,6 +69,26 @@ class UdInsnDef:
     def isDef64(self):
         return 'def64' in self.prefixes
 
+    @property
+    def isa(self):
+        """The set of ISA families the definition belongs to: its
+           cpuid flags, 3dnow for 3DNow! opcodes, and its vendor, if
+           the definition is vendor specific.
+        """
+        isa = set([ flag.lower() for flag in self._cpuid ])
+        if '/3dnow' in self._opcexts:
+            isa.add('3dnow')
+        if self.vendor:
+            isa.add(self.vendor)
+        return isa
+
+    def signature(self):
+        """The fields of the definition that make up its decoder
+           (itab) entry. Definitions with equal signatures decode
+           identically, regardless of opcode or cpuid.
+        """
+        return (self.mnemonic, tuple(self.operands), tuple(sorted(self.prefixes)))
+
     def __str__(self):
         return self.mnemonic + " " + ', '.join(self.operands) + \
                " " + ' '.join(self.opcodes)
@@ -128,8 +149,8 @@ class UdOpcodeTable:
         '/mod'   : lambda v: 0 if v == '!11' else 1,
         # Mode extensions:
         # (16, 32, 64) => (00, 01, 02)
-        '/o'     : lambda v: (int(v) / 32),
-        '/a'     : lambda v: (int(v) / 32),
+        '/o'     : lambda v: (int(v) // 32),
+        '/a'     : lambda v: (int(v) // 32),
         # Disassembly mode 
         # (!64, 64)    => (00b, 01b)
         '/m'     : lambda v: 1 if v == '64' else 0,
@@ -139,7 +160,7 @@ class UdOpcodeTable:
         # f3   => 2
         # 66   => 3
         '/sse'   : lambda v: (0 if v == 'none'
-                                else (((int(v, 16) & 0xf) + 1) / 2)),
+                                else (((int(v, 16) & 0xf) + 1) // 2)),
         # AVX
         '/vex'   : lambda v: UdOpcodeTable.vex2idx(v),
         '/vexw'  : lambda v: 0 if v == '0' else 1,
@@ -164,6 +185,10 @@ class UdOpcodeTable:
         '/vex'      : { 'label' : 'UD_TAB__OPC_VEX',     'size' : 16 },
         '/vexw'     : { 'label' : 'UD_TAB__OPC_VEX_W',   'size' : 2 },
         '/vexl'     : { 'label' : 'UD_TAB__OPC_VEX_L',   'size' : 2 },
+        # merged extension tables (see UdOpcodeTables.flattenTables)
+        '/modreg'   : { 'label' : 'UD_TAB__OPC_MODREG',  'size' : 16 },
+        '/regrm'    : { 'label' : 'UD_TAB__OPC_REGRM',   'size' : 64 },
+        '/vexwl'    : { 'label' : 'UD_TAB__OPC_VEX_WL',  'size' : 4 },
     }
 
 
@@ -255,6 +280,13 @@ class UdOpcodeTables(object):
     """Collection of opcode tables
     """
 
+    # Sizes of the generated C structures (see decode.h), on LP64
+    # targets: a uint16_t table slot, a ud_lookup_table_list entry
+    # and a ud_itab entry.
+    TableSlotBytes   = 2
+    LookupEntryBytes = 24
+    ItabEntryBytes   = 28
+
     class CollisionError(Exception):
         def __init__(self, obj1, obj2):
             self.obj1, self.obj2 = obj1, obj2
@@ -303,18 +335,73 @@ class UdOpcodeTables(object):
                 raise self.CollisionError(e, obj)
             self.map(e, opcodes[1:], obj)
 
-    def __init__(self, xml):
+    # The default order in which opcode extensions are added to the trie,
+    # outermost first. The order determines how well the opcode table is
+    # packed, and the number of lookups needed to decode an instruction.
+    # This is the best order found by scripts/ud_extorder.py.
+    ExtOrder = ('/mod', '/x87', '/reg', '/rm', '/sse', '/a', '/vexl', '/m',
+                '/o', '/vexw', '/3dnow', '/vendor')
+
+    # Pairs of extensions (a, b) where a must come before b in any order:
+    # /sse may consume the operand size prefix and so affect the outcome
+    # of /o, and /x87 indexes modrm - 0xc0, which is only valid below
+    # /mod=11.
+    ExtOrderConstraints = (
+        ('/sse', '/o'),
+        ('/mod', '/x87'),
+    )
+
+    # Extensions which the decoder expects to index tables of instructions
+    # only, and so must come after all others.
+    ExtOrderLast = ('/3dnow', '/vendor')
+
+    @classmethod
+    def isLegalExtOrder(cls, order):
+        """Returns True if the given order of opcode extensions includes
+           all extensions, and satisfies the ordering constraints.
+        """
+        if sorted(order) != sorted(cls.ExtOrder):
+            return False
+        for a, b in cls.ExtOrderConstraints:
+            if order.index(a) > order.index(b):
+                return False
+        last = order[len(order) - len(cls.ExtOrderLast):]
+        return sorted(last) == sorted(cls.ExtOrderLast)
+
+    def __init__(self, xml, snapshot=None, extOrder=None, exclude=None):
+        if os.getenv("UD_OPCODE_DEBUG"):
+            self._logFh     = open("opcodeTables.log", "w")
+
+        if extOrder is None:
+            extOrder = self.ExtOrder
+        if not self.isLegalExtOrder(extOrder):
+            raise ValueError("invalid opcode extension order: %s" %
+                             ",".join(extOrder))
+        self._extOrder  = tuple(extOrder)
+
+        # ISA families (see UdInsnDef.isa) left out of the tables
+        self._exclude   = tuple(sorted(set(exclude or ())))
+
+        # A snapshot of the built tables may be kept on disk, keyed
+        # by the contents of optable.xml and the generator sources.
+        if snapshot is None:
+            snapshot = os.getenv("UD_OPCODE_SNAPSHOT")
+        key = self.snapshotKey(xml) if snapshot else None
+        if key and self.loadSnapshot(snapshot, key):
+            self.printStats()
+            return
+
         self._tables    = []
         self._insns     = []
         self._mnemonics = {}
+        self._extCombos = set()
+        self._roots     = {}
+        self._isa       = set()
 
         # The root table is always a 256 entry opctbl, indexed
         # by a plain opcode byte
         self.root       = self.newTable('opctbl')
 
-        if os.getenv("UD_OPCODE_DEBUG"):
-            self._logFh     = open("opcodeTables.log", "w")
-
         # add an invalid instruction entry without any mapping
         # in the opcode tables.
         self.invalidInsn = UdInsnDef(mnemonic="invalid", opcodes=[], cpuid=[],
@@ -322,13 +409,19 @@ class UdOpcodeTables(object):
         self._insns.append(self.invalidInsn)
 
         # Construct UdOpcodeTables object from the given
-        # udis86 optable.xml
-        for insn in self.__class__.parseOptableXML(xml):
+        # udis86 optable.xml, or an already parsed list of definitions
+        if not isinstance(xml, list):
+            xml = self.__class__.iterOptableXML(xml)
+        for insn in xml:
             self.addInsnDef(insn)
         self.patchAvx2byte()
         self.mergeSSENONE()
+        self.shareTables()
         self.printStats()
 
+        if key:
+            self.saveSnapshot(snapshot, key)
+
     def log(self, s):
         if os.getenv("UD_OPCODE_DEBUG"):
             self._logFh.write(s + "\n")
@@ -344,17 +437,216 @@ class UdOpcodeTables(object):
                         sse = e.lookup("/sse=none")
                         if sse:
                             table.setEntryAt(k, sse)
+        self.genTableList()
+
+
+    def genTableList(self):
+        """Rebuild the list of tables reachable from the root, in walk
+           order, after the trie has been modified.
+        """
         uniqTables = {}
-        def genTableList(tbl):
-            if tbl not in uniqTables:
-                self._tables.append(tbl)
+        def walk(tbl):
+            self._tables.append(tbl)
             uniqTables[tbl] = 1
             for k, e in tbl.entries():
-                if isinstance(e, UdOpcodeTable):
-                    genTableList(e)
+                if isinstance(e, UdOpcodeTable) and e not in uniqTables:
+                    walk(e)
         self._tables = []
-        genTableList(self.root)
-                
+        for root in self.getRootList():
+            if root not in uniqTables:
+                walk(root)
+
+
+    def shareTables(self):
+        """Hash-cons the opcode trie, so that structurally identical
+           tables are replaced by a single shared copy. Two tables are
+           identical if they are of the same type, and map the same
+           indices to identical tables, or to instruction definitions
+           with the same signature.
+        """
+        canonical = {}
+        visited   = {}
+        def share(tbl):
+            if tbl in visited:
+                return visited[tbl]
+            entries = []
+            for k, e in sorted(tbl.entries(), key=lambda ke: ke[0]):
+                if isinstance(e, UdOpcodeTable):
+                    e = share(e)
+                    tbl.setEntryAt(k, e)
+                    entries.append((k, id(e)))
+                elif e is not None:
+                    entries.append((k, e.signature()))
+            sig = (tbl.typ(), tuple(entries))
+            visited[tbl] = canonical.setdefault(sig, tbl)
+            return visited[tbl]
+
+        numTables  = len(self._tables)
+        numSlots   = sum([t.size() for t in self._tables])
+        self.root  = share(self.root)
+        for key, root in itemslist(self._roots):
+            self._roots[key] = share(root)
+
+        self.genTableList()
+
+        self._sharedTables = numTables - len(self._tables)
+        self._sharedSlots  = numSlots - sum([t.size() for t in self._tables])
+
+
+    # Pairs of opcode extensions that are merged into a single table
+    # by flattenTables, and the type of the merged table. The merged
+    # table is indexed by (outer index * inner table size + inner index).
+    FlattenMap = {
+        ('/mod',  '/reg')  : '/modreg',
+        ('/reg',  '/rm')   : '/regrm',
+        ('/vexw', '/vexl') : '/vexwl',
+    }
+
+    def flattenTables(self):
+        """Merge tables whose entries are all tables of a single type,
+           for the pairs listed in FlattenMap, into one table indexed by
+           both extensions. This removes a level of indirection from the
+           decode path, at the cost of replicating entries that do not
+           depend on the inner extension.
+        """
+        flattened = {}
+        def flatten(tbl):
+            if tbl in flattened:
+                return flattened[tbl]
+            inner = set()
+            for k, e in tbl.entries():
+                if isinstance(e, UdOpcodeTable):
+                    e = flatten(e)
+                    tbl.setEntryAt(k, e)
+                    inner.add(e.typ())
+            typ = None
+            if len(inner) == 1:
+                typ = self.FlattenMap.get((tbl.typ(), inner.pop()))
+            if typ is None:
+                flattened[tbl] = tbl
+                return tbl
+            flat = UdOpcodeTable(typ)
+            n = flat.size() // tbl.size()
+            for i in range(tbl.size()):
+                e = tbl.entryAt(i)
+                for j in range(n):
+                    if isinstance(e, UdOpcodeTable):
+                        flat.setEntryAt(i * n + j, e.entryAt(j))
+                    elif e is not None:
+                        flat.setEntryAt(i * n + j, e)
+            flattened[tbl] = flat
+            return flat
+
+        numTables = len(self._tables)
+        self.root = flatten(self.root)
+        for key, root in itemslist(self._roots):
+            self._roots[key] = flatten(root)
+        self.genTableList()
+        self.log("flatten: %d tables merged" % (numTables - len(self._tables)))
+
+
+    # Disassembly modes and vendors (in the order of UD_VENDOR_*) for
+    # which specializeTables creates a root table.
+    RootModes   = (16, 32, 64)
+    RootVendors = ('amd', 'intel', 'any')
+
+    def specializeTables(self, modes=None):
+        """Create a copy of the trie for every disassembly mode and vendor,
+           with the lookups that only depend on them resolved: /m and
+           /vendor tables are replaced by the selected entry, and /o and
+           /a tables lose the entries that cannot be selected in the mode,
+           and are replaced by their entry if the rest are the same. The
+           decoder picks the root table of its mode and vendor, and so
+           skips these lookups. Unchanged tables are shared by the copies.
+           If a list of modes is given, the other modes get an empty root
+           table, and decode all bytes as invalid.
+        """
+        # indices of /o and /a tables selectable in each mode
+        osizes = { 16 : (0, 1), 32 : (0, 1), 64 : (0, 1, 2) }
+        asizes = { 16 : (0, 1), 32 : (0, 1), 64 : (1, 2) }
+
+        def same(e1, e2):
+            if isinstance(e1, UdInsnDef) and isinstance(e2, UdInsnDef):
+                return e1.signature() == e2.signature()
+            return e1 is e2
+
+        def select(tbl, mode, vendor):
+            # the entry selected by a table that is resolved entirely by
+            # the mode or vendor, tbl itself otherwise.
+            if tbl.typ() == '/m':
+                return tbl.entryAt(1 if mode == 64 else 0)
+            elif tbl.typ() == '/vendor':
+                if vendor != 'any':
+                    return tbl.entryAt(UdOpcodeTable.vendor2idx(vendor))
+                # choose a valid entry, as the decoder would
+                e = tbl.entryAt(0)
+                if e is None or e is self.invalidInsn:
+                    e = tbl.entryAt(1)
+                return e
+            elif tbl.typ() in ('/o', '/a'):
+                valid = (osizes if tbl.typ() == '/o' else asizes)[mode]
+                e = tbl.entryAt(valid[0])
+                if len([ i for i in valid if not same(tbl.entryAt(i), e) ]) == 0:
+                    return e
+            return tbl
+
+        def specialize(tbl, mode, vendor, memo):
+            if tbl in memo:
+                return memo[tbl]
+            e = select(tbl, mode, vendor)
+            if e is not tbl:
+                if isinstance(e, UdOpcodeTable):
+                    e = specialize(e, mode, vendor, memo)
+                memo[tbl] = e
+                return e
+            valid = range(tbl.size())
+            if tbl.typ() == '/o':
+                valid = osizes[mode]
+            elif tbl.typ() == '/a':
+                valid = asizes[mode]
+            entries, changed = {}, len(valid) < tbl.size()
+            for k, e in tbl.entries():
+                if k not in valid:
+                    continue
+                if isinstance(e, UdOpcodeTable):
+                    s = specialize(e, mode, vendor, memo)
+                    changed = changed or s is not e
+                    e = s
+                entries[k] = e
+            spec = tbl
+            if changed:
+                spec = UdOpcodeTable(tbl.typ())
+                for k, e in itemslist(entries):
+                    spec.setEntryAt(k, e)
+            memo[tbl] = spec
+            return spec
+
+        empty = UdOpcodeTable('opctbl')
+        for mode in self.RootModes:
+            for vendor in self.RootVendors:
+                if modes is not None and mode not in modes:
+                    self._roots[(mode, vendor)] = empty
+                    continue
+                self._roots[(mode, vendor)] = specialize(self.root, mode,
+                                                         vendor, {})
+        self.genTableList()
+        self.shareTables()
+        self.log("specialize: %d roots, %d tables" %
+                 (len(self.getRootList()), len(self._tables)))
+
+    def getRootTable(self, mode, vendor):
+        """Returns the root table for a given disassembly mode and vendor"""
+        return self._roots.get((mode, vendor), self.root)
+
+    def getRootList(self):
+        """Returns the distinct root tables, in mode and vendor order"""
+        roots = []
+        for mode in self.RootModes:
+            for vendor in self.RootVendors:
+                root = self.getRootTable(mode, vendor)
+                if root not in roots:
+                    roots.append(root)
+        return roots
 
     def patchAvx2byte(self):
         # create avx tables
@@ -383,20 +675,27 @@ class UdOpcodeTables(object):
             assert opcodes[0] == 'c4' or opcodes[0] == 'c5'
             opcodes.insert(1, '/vex=' + opcexts['/vex'])
 
-        # Add extensions. The order is important, and determines how
-        # well the opcode table is packed. Also note, /sse must be
-        # before /o, because /sse may consume operand size prefix
-        # affect the outcome of /o.
-        for ext in ('/mod', '/x87', '/reg', '/rm', '/sse', '/o', '/a', '/m',
-                    '/vexw', '/vexl', '/3dnow', '/vendor'):
+        # Add extensions, in the order given by self._extOrder (see
+        # ExtOrder and ExtOrderConstraints)
+        for ext in self._extOrder:
             if ext in opcexts:
                 opcodes.append(ext + '=' + opcexts[ext])
+        self._extCombos.add(tuple([ext for ext in self._extOrder
+                                       if ext in opcexts]))
 
         insn = UdInsnDef(mnemonic = insnDef['mnemonic'],
                          prefixes = insnDef['prefixes'],
                          operands = insnDef['operands'],
                          opcodes  = opcodes,
                          cpuid    = insnDef['cpuid'])
+
+        # Excluded definitions are not mapped, and so decode as invalid,
+        # but keep their mnemonic, so that ud_mnemonic_code is unchanged.
+        self._isa.update(insn.isa)
+        if insn.isa & set(self._exclude):
+            if insn.mnemonic not in self._mnemonics:
+                self._mnemonics[insn.mnemonic] = []
+            return
         try:
             self.map(self.root, opcodes, insn)
         except self.CollisionError as e:
@@ -531,6 +830,56 @@ class UdOpcodeTables(object):
                      operands = vexoperands,
                      cpuid    = vexcpuid)
 
+    # Attributes making up the state of a built collection of tables
+    SnapshotAttrs = ('root', 'invalidInsn', '_tables', '_insns', '_mnemonics',
+                     '_sharedTables', '_sharedSlots', '_extCombos', '_roots',
+                     '_isa')
+
+    def snapshotKey(self, xml):
+        """Returns a key identifying the inputs to the table construction:
+           the optable xml and the generator sources. Returns None if
+           the xml is not a file path, in which case no snapshot is used.
+        """
+        import hashlib
+        if not isinstance(xml, str):
+            return None
+        h = hashlib.sha1()
+        h.update(("%d.%d" % sys.version_info[:2]).encode())
+        h.update(",".join(self._extOrder).encode())
+        h.update(",".join(self._exclude).encode())
+        for path in (xml, __file__.replace('.pyc', '.py')):
+            with open(path, 'rb') as f:
+                h.update(f.read())
+        return h.hexdigest()
+
+    def loadSnapshot(self, path, key):
+        """Restore the tables from a snapshot file, if it exists and
+           matches the given key. Returns True on success.
+        """
+        import pickle
+        try:
+            with open(path, 'rb') as f:
+                if f.readline().decode().strip() != key:
+                    return False
+                state = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return False
+        for attr, value in zip(self.SnapshotAttrs, state):
+            setattr(self, attr, value)
+        self.log("snapshot: loaded %s" % path)
+        return True
+
+    def saveSnapshot(self, path, key):
+        """Write the tables to a snapshot file, under the given key."""
+        import pickle
+        state = tuple(getattr(self, attr) for attr in self.SnapshotAttrs)
+        tmp = "%s.%d" % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write((key + "\n").encode())
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, path)
+        self.log("snapshot: saved %s" % path)
+
     def getInsnList(self):
         """Returns a list of all instructions in the collection"""
         return self._insns
@@ -544,6 +893,33 @@ class UdOpcodeTables(object):
         """Returns a sorted list of mnemonics"""
         return sorted(self._mnemonics.keys())
 
+    def getIsaList(self):
+        """Returns a sorted list of the ISA families of all definitions,
+           including the excluded ones.
+        """
+        return sorted(self._isa)
+
+    def getExtCombos(self):
+        """Returns the combinations of opcode extensions used by the
+           instruction definitions, as a set of tuples in trie order.
+        """
+        return self._extCombos
+
+    def iterLeafPaths(self, root=None):
+        """Generate a (path, insn) tuple for every path from a root table
+           (by default, the unspecialized root) to a valid instruction,
+           where path is the list of (table, index) lookups made along the
+           way, root first.
+        """
+        def walk(tbl, path):
+            for k, e in sorted(tbl.entries(), key=lambda ke: ke[0]):
+                if isinstance(e, UdOpcodeTable):
+                    for leaf in walk(e, path + [ (tbl, k) ]):
+                        yield leaf
+                elif e is not None and e is not self.invalidInsn:
+                    yield path + [ (tbl, k) ], e
+        return walk(root or self.root, [])
+
 
     def pprint(self):
         def printWalk(tbl, indent=""):
@@ -570,6 +946,16 @@ class UdOpcodeTables(object):
             totalSize += table.size()
             totalEntries += table.numEntries()
         self.log("  Packing Ratio = %d%%" % ((totalEntries * 100) / totalSize))
+
+        # bytes saved by sharing identical tables and itab entries
+        insnSigs = set([insn.signature() for insn in self.getInsnList()])
+        sharedInsns = len(self.getInsnList()) - len(insnSigs)
+        self.log("  Shared tables = %d (%d bytes)" %
+                 (self._sharedTables,
+                  self._sharedSlots * self.TableSlotBytes +
+                  self._sharedTables * self.LookupEntryBytes))
+        self.log("  Shared insns  = %d (%d bytes)" %
+                 (sharedInsns, sharedInsns * self.ItabEntryBytes))
         self.log("--------------------")
 
         self.pprint()
@@ -580,43 +966,56 @@ class UdOpcodeTables(object):
         """Parse udis86 optable.xml file and return list of
            instruction definitions.
         """
-        from xml.dom import minidom
+        return list(UdOpcodeTables.iterOptableXML(xml))
+
 
-        xmlDoc = minidom.parse(xml)
-        tlNode = xmlDoc.firstChild
-        insns  = []
+    @staticmethod
+    def iterOptableXML(xml):
+        """Incrementally parse udis86 optable.xml, yielding instruction
+           definitions as they are read. Each <instruction> element is
+           discarded once its definitions are yielded, so memory use is
+           bounded by the size of a single instruction.
+        """
+        from xml.etree.ElementTree import iterparse
 
-        while tlNode and tlNode.localName != "x86optable": 
-            tlNode = tlNode.nextSibling
+        def text(node):
+            return node.text.split()
 
-        for insnNode in tlNode.childNodes:
-            if not insnNode.localName:
+        depth, root = 0, None
+        for event, node in iterparse(xml, events=('start', 'end')):
+            if event == 'start':
+                if depth == 0:
+                    root = node
+                depth += 1
+                continue
+            depth -= 1
+            if depth != 1:
                 continue
-            if insnNode.localName != "instruction":
-                raise Exception("warning: invalid insn node - %s" % insnNode.localName)
-            mnemonic = insnNode.getElementsByTagName('mnemonic')[0].firstChild.data
+            if node.tag != "instruction":
+                raise Exception("warning: invalid insn node - %s" % node.tag)
+
+            mnemonic = node.find('.//mnemonic').text
             vendor, cpuid = '', []
 
-            for node in insnNode.childNodes:
-                if node.localName == 'vendor':
-                    vendor = node.firstChild.data.split()
-                elif node.localName == 'cpuid':
-                    cpuid = node.firstChild.data.split()
+            for child in node:
+                if child.tag == 'vendor':
+                    vendor = text(child)
+                elif child.tag == 'cpuid':
+                    cpuid = text(child)
 
-            for node in insnNode.childNodes:
-                if node.localName == 'def':
+            for child in node:
+                if child.tag == 'def':
                     insnDef = { 'pfx' : [] }
-                    for node in node.childNodes:
-                        if not node.localName:
-                            continue
-                        if node.localName in ('pfx', 'opc', 'opr', 'vendor', 'cpuid'):
-                            insnDef[node.localName] = node.firstChild.data.split()
-                        elif node.localName == 'mode':
-                            insnDef['pfx'].extend(node.firstChild.data.split())
-                    insns.append({'prefixes' : insnDef.get('pfx', []),
-                                  'mnemonic' : mnemonic,
-                                  'opcodes'  : insnDef.get('opc', []),
-                                  'operands' : insnDef.get('opr', []),
-                                  'vendor'   : insnDef.get('vendor', vendor),
-                                  'cpuid'    : insnDef.get('cpuid', cpuid)})
-        return insns
+                    for n in child:
+                        if n.tag in ('pfx', 'opc', 'opr', 'vendor', 'cpuid'):
+                            insnDef[n.tag] = text(n)
+                        elif n.tag == 'mode':
+                            insnDef['pfx'].extend(text(n))
+                    yield {'prefixes' : insnDef.get('pfx', []),
+                           'mnemonic' : mnemonic,
+                           'opcodes'  : insnDef.get('opc', []),
+                           'operands' : insnDef.get('opr', []),
+                           'vendor'   : insnDef.get('vendor', vendor),
+                           'cpuid'    : insnDef.get('cpuid', cpuid)}
+            # drop the processed instruction from the (partial) tree
+            root.clear()
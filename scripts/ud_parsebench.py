@@ -0,0 +1,145 @@
+# udis86 - scripts/ud_parsebench.py
+#
+# Copyright (c) 2013 Vivek Thampi
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without modification,
+# are permitted provided that the following conditions are met:
+#
+#     * Redistributions of source code must retain the above copyright notice,
+#       this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above copyright notice,
+#       this list of conditions and the following disclaimer in the documentation
+#       and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+# ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+#
+# Benchmark the optable.xml parsers: the reference minidom parser against
+# the streaming parser used by ud_opcode.py. Each parser is run in its own
+# process, so that peak RSS figures do not interfere with each other.
+#
+#   usage: ud_parsebench.py <optable.xml> [iterations]
+#
+
+import os
+import sys
+import subprocess
+import time
+
+from ud_opcode import UdOpcodeTables
+
+def parseMinidom(xml):
+    """Reference optable.xml parser, building a complete dom tree
+       before walking it.
+    """
+    from xml.dom import minidom
+
+    xmlDoc = minidom.parse(xml)
+    tlNode = xmlDoc.firstChild
+    insns  = []
+
+    while tlNode and tlNode.localName != "x86optable":
+        tlNode = tlNode.nextSibling
+
+    for insnNode in tlNode.childNodes:
+        if not insnNode.localName:
+            continue
+        if insnNode.localName != "instruction":
+            raise Exception("warning: invalid insn node - %s" % insnNode.localName)
+        mnemonic = insnNode.getElementsByTagName('mnemonic')[0].firstChild.data
+        vendor, cpuid = '', []
+
+        for node in insnNode.childNodes:
+            if node.localName == 'vendor':
+                vendor = node.firstChild.data.split()
+            elif node.localName == 'cpuid':
+                cpuid = node.firstChild.data.split()
+
+        for node in insnNode.childNodes:
+            if node.localName == 'def':
+                insnDef = { 'pfx' : [] }
+                for node in node.childNodes:
+                    if not node.localName:
+                        continue
+                    if node.localName in ('pfx', 'opc', 'opr', 'vendor', 'cpuid'):
+                        insnDef[node.localName] = node.firstChild.data.split()
+                    elif node.localName == 'mode':
+                        insnDef['pfx'].extend(node.firstChild.data.split())
+                insns.append({'prefixes' : insnDef.get('pfx', []),
+                              'mnemonic' : mnemonic,
+                              'opcodes'  : insnDef.get('opc', []),
+                              'operands' : insnDef.get('opr', []),
+                              'vendor'   : insnDef.get('vendor', vendor),
+                              'cpuid'    : insnDef.get('cpuid', cpuid)})
+    return insns
+
+
+def parseStream(xml):
+    """Streaming parser; consumes definitions one at a time, the
+       way UdOpcodeTables does.
+    """
+    n = 0
+    for insn in UdOpcodeTables.iterOptableXML(xml):
+        n += 1
+    return n
+
+
+Parsers = { 'minidom' : parseMinidom, 'stream' : parseStream }
+
+
+def maxRss():
+    """Peak resident set size of this process, in KB"""
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def runOne(name, xml, iterations):
+    """Time a single parser, and print '<seconds/iteration> <rss-kb>'"""
+    fn = Parsers[name]
+    start = time.time()
+    for i in range(iterations):
+        fn(xml)
+    print("%f %d" % ((time.time() - start) / iterations, maxRss()))
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == '--run':
+        runOne(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return
+    if len(sys.argv) not in (2, 3):
+        print("usage: ud_parsebench.py <optable.xml> [iterations]")
+        sys.exit(1)
+
+    xml = sys.argv[1]
+    iterations = int(sys.argv[2]) if len(sys.argv) == 3 else 5
+
+    if parseMinidom(xml) != UdOpcodeTables.parseOptableXML(xml):
+        print("error: parser outputs differ")
+        sys.exit(1)
+
+    results = {}
+    for name in sorted(Parsers.keys()):
+        out = subprocess.check_output([sys.executable, __file__, '--run',
+                                       name, xml, str(iterations)])
+        t, rss = out.decode().split()
+        results[name] = (float(t), int(rss))
+
+    print("%-8s %12s %12s" % ("parser", "time (ms)", "max rss (kb)"))
+    for name in sorted(results.keys()):
+        t, rss = results[name]
+        print("%-8s %12.1f %12d" % (name, t * 1000, rss))
+    print("speedup  %11.2fx" % (results['minidom'][0] / results['stream'][0]))
+
+if __name__ == '__main__':
+    main()
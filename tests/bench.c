@@ -0,0 +1,179 @@
+/* udis86 - tests/bench.c
+ *
+ * Copyright (c) 2013 Vivek Thampi
+ * All rights reserved.
+ *
+ * Redistribution and use in source and binary forms, with or without modification,
+ * are permitted provided that the following conditions are met:
+ *
+ *     * Redistributions of source code must retain the above copyright notice,
+ *       this list of conditions and the following disclaimer.
+ *     * Redistributions in binary form must reproduce the above copyright notice,
+ *       this list of conditions and the following disclaimer in the documentation
+ *       and/or other materials provided with the distribution.
+ *
+ * THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ * ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+ * WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+ * DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+ * ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+ * (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+ * LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ * ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ * (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ * SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+ */
+
+/*
+ * Decoder throughput benchmark. Repeatedly disassembles a file held in
+ * memory, and reports the number of instructions decoded per second.
+ */
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <udis86.h>
+
+static void
+usage(const char *prog)
+{
+  fprintf(stderr, "usage: %s [-16|-32|-64] "
+                  "[-intel|-att|-decode|-batch|-length|-branch] "
+                  "[-stream <chunk size>] [-n <iterations>] <file>\n", prog);
+  exit(1);
+}
+
+int
+main(int argc, char **argv)
+{
+  ud_t ud_obj;
+  FILE *fp;
+  uint8_t *buf;
+  long size;
+  unsigned int mode = 64;
+  unsigned int iterations = 10;
+  unsigned int i;
+  unsigned long long count = 0;
+  size_t chunk = 0;
+  void (*syntax)(struct ud*) = UD_SYN_INTEL;
+  int batch = 0, length = 0, branch = 0;
+  ud_insn_record_t rec[256];
+  ud_branch_t br[256];
+  const char *file = NULL;
+  const char *label = "intel";
+  clock_t start;
+  double secs;
+
+  for (i = 1; i < (unsigned int) argc; ++i) {
+    if (strcmp(argv[i], "-16") == 0) {
+      mode = 16;
+    } else if (strcmp(argv[i], "-32") == 0) {
+      mode = 32;
+    } else if (strcmp(argv[i], "-64") == 0) {
+      mode = 64;
+    } else if (strcmp(argv[i], "-intel") == 0) {
+      syntax = UD_SYN_INTEL;
+      label = "intel";
+    } else if (strcmp(argv[i], "-att") == 0) {
+      syntax = UD_SYN_ATT;
+      label = "att";
+    } else if (strcmp(argv[i], "-decode") == 0) {
+      syntax = NULL;
+      label = "decode";
+    } else if (strcmp(argv[i], "-batch") == 0) {
+      syntax = NULL;
+      batch = 1;
+      label = "batch";
+    } else if (strcmp(argv[i], "-length") == 0) {
+      syntax = NULL;
+      length = 1;
+      label = "length";
+    } else if (strcmp(argv[i], "-branch") == 0) {
+      syntax = NULL;
+      branch = 1;
+      label = "branch";
+    } else if (strcmp(argv[i], "-stream") == 0 && i + 1 < (unsigned int) argc) {
+      chunk = atoi(argv[++i]);
+    } else if (strcmp(argv[i], "-n") == 0 && i + 1 < (unsigned int) argc) {
+      iterations = atoi(argv[++i]);
+    } else if (argv[i][0] != '-' && file == NULL) {
+      file = argv[i];
+    } else {
+      usage(argv[0]);
+    }
+  }
+  if (file == NULL || (chunk > 0 && (batch || length || branch))) {
+    usage(argv[0]);
+  }
+
+  if ((fp = fopen(file, "rb")) == NULL) {
+    fprintf(stderr, "error: failed to open %s\n", file);
+    return 1;
+  }
+  fseek(fp, 0, SEEK_END);
+  size = ftell(fp);
+  fseek(fp, 0, SEEK_SET);
+  buf = (uint8_t *) malloc(size > 0 ? size : 1);
+  if (buf == NULL || fread(buf, 1, size, fp) != (size_t) size) {
+    fprintf(stderr, "error: failed to read %s\n", file);
+    return 1;
+  }
+  fclose(fp);
+
+  ud_init(&ud_obj);
+  ud_set_mode(&ud_obj, mode);
+  ud_set_syntax(&ud_obj, syntax);
+
+  start = clock();
+  for (i = 0; i < iterations; ++i) {
+    if (chunk > 0) {
+      ud_set_input_stream(&ud_obj);
+    } else {
+      ud_set_input_buffer(&ud_obj, buf, size);
+    }
+    ud_set_pc(&ud_obj, 0);
+    if (chunk > 0) {
+      /* fed in chunks, as from a pipe or a capture */
+      size_t off = 0, n;
+      while (off < (size_t) size) {
+        n = size - off < chunk ? size - off : chunk;
+        ud_input_feed(&ud_obj, buf + off, n);
+        off += n;
+        while (ud_disassemble(&ud_obj)) {
+          ++count;
+        }
+      }
+      ud_input_feed(&ud_obj, NULL, 0);
+      while (ud_disassemble(&ud_obj)) {
+        ++count;
+      }
+    } else if (batch) {
+      unsigned int n;
+      while ((n = ud_decode_batch(&ud_obj, rec, 256)) > 0) {
+        count += n;
+      }
+    } else if (branch) {
+      /* counts branches, not instructions */
+      unsigned int n;
+      while ((n = ud_scan_branches(&ud_obj, br, 256)) > 0) {
+        count += n;
+      }
+    } else if (length) {
+      while (ud_decode_length(&ud_obj)) {
+        ++count;
+      }
+    } else {
+      while (ud_disassemble(&ud_obj)) {
+        ++count;
+      }
+    }
+  }
+  secs = (double) (clock() - start) / CLOCKS_PER_SEC;
+
+  printf("%s: %d-bit %s: %llu insns, %.3f s, %.0f insns/s\n",
+         file, mode, label, count, secs, secs > 0 ? count / secs : 0.0);
+  free(buf);
+  return 0;
+}
+
+/* vim: set ts=2 sw=2 expandtab: */
@@ -0,0 +1,140 @@
+/* udis86 - tests/lencheck.c
+ *
+ * Copyright (c) 2013 Vivek Thampi
+ * All rights reserved.
+ *
+ * Redistribution and use in source and binary forms, with or without modification,
+ * are permitted provided that the following conditions are met:
+ *
+ *     * Redistributions of source code must retain the above copyright notice,
+ *       this list of conditions and the following disclaimer.
+ *     * Redistributions in binary form must reproduce the above copyright notice,
+ *       this list of conditions and the following disclaimer in the documentation
+ *       and/or other materials provided with the distribution.
+ *
+ * THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ * ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+ * WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+ * DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+ * ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+ * (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+ * LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON
+ * ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ * (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ * SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+ */
+
+/*
+ * Cross-checks ud_decode_length() against ud_decode() over a binary file:
+ * along the instructions of the file, and starting at every byte offset.
+ */
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <udis86.h>
+
+static int fails = 0;
+
+static void
+check(ud_t *ud, ud_t *ud_len, const uint8_t *buf, size_t size, size_t off,
+      int sweep)
+{
+  unsigned int len, len2;
+  len = ud_decode(ud);
+  len2 = ud_decode_length(ud_len);
+  if (len != len2 || ud_insn_off(ud) != ud_insn_off(ud_len)) {
+    size_t i;
+    fprintf(stderr, "%s %08lx: ud_decode %u, ud_decode_length %u:",
+            sweep ? "sweep" : "offset", (unsigned long) off, len, len2);
+    for (i = off; i < size && i < off + 16; ++i) {
+      fprintf(stderr, " %02x", buf[i]);
+    }
+    fprintf(stderr, "\n");
+    ++fails;
+  }
+}
+
+int
+main(int argc, char **argv)
+{
+  ud_t ud, ud_len;
+  FILE *fp;
+  uint8_t *buf;
+  long size;
+  size_t off;
+  unsigned int mode = 32, vendor = UD_VENDOR_AMD;
+  const char *file = NULL;
+  int i;
+
+  for (i = 1; i < argc; ++i) {
+    if (strcmp(argv[i], "-16") == 0) {
+      mode = 16;
+    } else if (strcmp(argv[i], "-32") == 0) {
+      mode = 32;
+    } else if (strcmp(argv[i], "-64") == 0) {
+      mode = 64;
+    } else if (strcmp(argv[i], "-v") == 0 && i + 1 < argc) {
+      ++i;
+      vendor = argv[i][0] == 'i' ? UD_VENDOR_INTEL :
+               argv[i][0] == 'a' && argv[i][1] == 'n' ? UD_VENDOR_ANY :
+               UD_VENDOR_AMD;
+    } else if (argv[i][0] != '-' && file == NULL) {
+      file = argv[i];
+    } else {
+      file = NULL;
+      break;
+    }
+  }
+  if (file == NULL) {
+    fprintf(stderr, "usage: %s [-16|-32|-64] [-v amd|intel|any] <file>\n",
+            argv[0]);
+    return 1;
+  }
+
+  if ((fp = fopen(file, "rb")) == NULL) {
+    fprintf(stderr, "error: failed to open %s\n", file);
+    return 1;
+  }
+  fseek(fp, 0, SEEK_END);
+  size = ftell(fp);
+  fseek(fp, 0, SEEK_SET);
+  buf = (uint8_t *) malloc(size > 0 ? size : 1);
+  if (buf == NULL || fread(buf, 1, size, fp) != (size_t) size) {
+    fprintf(stderr, "error: failed to read %s\n", file);
+    return 1;
+  }
+  fclose(fp);
+
+  ud_init(&ud);
+  ud_init(&ud_len);
+  ud_set_mode(&ud, mode);
+  ud_set_mode(&ud_len, mode);
+  ud_set_vendor(&ud, vendor);
+  ud_set_vendor(&ud_len, vendor);
+
+  /* along the instructions */
+  ud_set_input_buffer(&ud, buf, size);
+  ud_set_input_buffer(&ud_len, buf, size);
+  for (off = 0; !ud_input_end(&ud) && fails < 10; off = ud_insn_off(&ud) +
+                                                         ud_insn_len(&ud)) {
+    check(&ud, &ud_len, buf, size, off, 1);
+  }
+
+  /* from every offset */
+  for (off = 0; off < (size_t) size && fails < 10; ++off) {
+    ud_set_input_buffer(&ud, buf + off, size - off);
+    ud_set_input_buffer(&ud_len, buf + off, size - off);
+    ud_set_pc(&ud, off);
+    ud_set_pc(&ud_len, off);
+    check(&ud, &ud_len, buf, size, off, 0);
+  }
+
+  free(buf);
+  if (fails > 0) {
+    printf("lencheck %s: ***FAIL*** (%d mismatches)\n", file, fails);
+    return 1;
+  }
+  return 0;
+}
+
+/* vim: set ts=2 sw=2 expandtab: */
@@ -24,6 +24,7 @@
  * SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
  */
 #include <stdio.h>
+#include <stdlib.h>
 #include <udis86.h>
 #include <string.h>
 
@@ -164,6 +165,23 @@ check_input(ud_t *ud_obj)
     TEST_CHECK(ud_input_end(ud_obj));
   }
 
+  /* input skip on a file, seeking */
+  {
+    const uint8_t code[] = { 0x90, 0x90, 0xc3, 0x90 };
+    FILE *f = tmpfile();
+    if (f != NULL) {
+      fwrite(code, 1, sizeof code, f);
+      rewind(f);
+      ud_set_input_file(ud_obj, f);
+      ud_input_skip(ud_obj, 2);
+      TEST_CHECK(ud_disassemble(ud_obj) == 1);
+      TEST_CHECK(ud_obj->mnemonic == UD_Iret);
+      ud_input_skip(ud_obj, 2);
+      TEST_CHECK(ud_input_end(ud_obj));
+      fclose(f);
+    }
+  }
+
   /* a known buffer overrun test case (used to be bufoverrun.c) */
   {
     const uint8_t code[] = { 0xf0, 0x66, 0x36, 0x67, 0x65, 0x66,
@@ -210,6 +228,452 @@ check_disasm(ud_t *ud_obj)
   TEST_CHECK(strcmp(ud_lookup_mnemonic(UD_Inop), "nop") == 0);
 }
 
+static void
+check_lazy_translation(ud_t *ud_obj)
+{
+  TEST_DECL("check_lazy_translation");
+  const uint8_t code[] = { 0x89, 0xc8,  /* mov eax, ecx */
+                           0x90 };      /* nop */
+  char buf[64];
+  ud_set_input_buffer(ud_obj, code, sizeof code); 
+  ud_set_mode(ud_obj, 32);
+  ud_set_asm_buffer(ud_obj, buf, sizeof buf);
+  ud_set_lazy_translation(ud_obj, 1);
+
+  TEST_CHECK(ud_disassemble(ud_obj) == 2);
+  TEST_CHECK(buf[0] == '\0');
+  TEST_CHECK(strcmp(ud_insn_asm(ud_obj), "mov eax, ecx") == 0);
+  TEST_CHECK(strcmp(ud_insn_asm(ud_obj), "mov eax, ecx") == 0);
+  TEST_CHECK(ud_disassemble(ud_obj) == 1);
+  TEST_CHECK(buf[0] == '\0');
+  TEST_CHECK(ud_insn_mnemonic(ud_obj) == UD_Inop);
+  TEST_CHECK(strcmp(ud_insn_asm(ud_obj), "nop") == 0);
+
+  ud_set_lazy_translation(ud_obj, 0);
+  ud_set_asm_buffer(ud_obj, NULL, 0);
+}
+
+static void
+check_asm_buffer(ud_t *ud_obj)
+{
+  TEST_DECL("check_asm_buffer");
+  const uint8_t code[] = { 0x8b, 0x43, 0xf8 }; /* mov eax, [ebx-0x8] */
+  char buf[32];
+  ud_set_mode(ud_obj, 32);
+
+  ud_set_input_buffer(ud_obj, code, sizeof code); 
+  ud_set_asm_buffer(ud_obj, buf, sizeof buf);
+  TEST_CHECK(ud_disassemble(ud_obj) == 3);
+  TEST_CHECK(strcmp(buf, "mov eax, [ebx-0x8]") == 0);
+
+  /* truncated, to at most size - 2 chars */
+  memset(buf, 'x', sizeof buf);
+  ud_set_input_buffer(ud_obj, code, sizeof code); 
+  ud_set_asm_buffer(ud_obj, buf, 10);
+  TEST_CHECK(ud_disassemble(ud_obj) == 3);
+  TEST_CHECK(strcmp(buf, "mov eax,") == 0);
+  TEST_CHECK(buf[9] == 'x');
+
+  ud_set_input_buffer(ud_obj, code, sizeof code); 
+  ud_set_asm_buffer(ud_obj, buf, 1);
+  TEST_CHECK(ud_disassemble(ud_obj) == 3);
+  TEST_CHECK(buf[0] == '\0');
+
+  ud_set_syntax(ud_obj, UD_SYN_ATT);
+  ud_set_input_buffer(ud_obj, code, sizeof code); 
+  ud_set_asm_buffer(ud_obj, buf, sizeof buf);
+  TEST_CHECK(ud_disassemble(ud_obj) == 3);
+  TEST_CHECK(strcmp(buf, "mov -0x8(%ebx), %eax") == 0);
+
+  ud_set_syntax(ud_obj, UD_SYN_INTEL);
+  ud_set_asm_buffer(ud_obj, NULL, 0);
+}
+
+static void
+check_symtab(ud_t *ud_obj)
+{
+  TEST_DECL("check_symtab");
+  const uint8_t code[] = { 0xe8, 0x0b, 0x00, 0x00, 0x00,  /* call 0x1010 */
+                           0xeb, 0xfe,                    /* jmp 0x1005 */
+                           0xe8, 0xf4, 0xff, 0xff, 0xff,  /* call 0x1000 */
+                           0xeb, 0x20 };                  /* jmp 0x102e */
+  ud_symbol_t sym[] = { { 0x1010, 0x10, "f2" },
+                        { 0x1000, 0x08, "f1" },
+                        { 0x1040, 0,    "f4" },
+                        { 0x1020, 0x08, "f3" } };
+  ud_symtab_t tab;
+  char buf[64];
+  int cache;
+
+  for (cache = 0; cache < 2; ++cache) {
+    ud_symtab_init(&tab, sym, sizeof sym / sizeof sym[0], cache);
+    TEST_CHECK(sym[0].addr == 0x1000 && sym[3].addr == 0x1040);
+    TEST_CHECK(ud_symtab_lookup(&tab, 0xfff) == NULL);
+    TEST_CHECK(ud_symtab_lookup(&tab, 0x1000) == &sym[0]);
+    TEST_CHECK(ud_symtab_lookup(&tab, 0x1007) == &sym[0]);
+    TEST_CHECK(ud_symtab_lookup(&tab, 0x1008) == NULL);
+    TEST_CHECK(ud_symtab_lookup(&tab, 0x101f) == &sym[1]);
+    TEST_CHECK(ud_symtab_lookup(&tab, 0x1024) == &sym[2]);
+    TEST_CHECK(ud_symtab_lookup(&tab, 0x1004) == &sym[0]);
+    TEST_CHECK(ud_symtab_lookup(&tab, 0x1028) == NULL);
+    TEST_CHECK(ud_symtab_lookup(&tab, 0x1040) == &sym[3]);
+    TEST_CHECK(ud_symtab_lookup(&tab, 0xffffffff) == &sym[3]);
+  }
+
+  ud_set_mode(ud_obj, 32);
+  ud_set_pc(ud_obj, 0x1000);
+  ud_set_input_buffer(ud_obj, code, sizeof code);
+  ud_set_asm_buffer(ud_obj, buf, sizeof buf);
+  ud_set_sym_table(ud_obj, &tab);
+  TEST_CHECK(ud_disassemble(ud_obj) && strcmp(buf, "call f2") == 0);
+  TEST_CHECK(ud_disassemble(ud_obj) && strcmp(buf, "jmp f1+5") == 0);
+  TEST_CHECK(ud_disassemble(ud_obj) && strcmp(buf, "call f1") == 0);
+  TEST_CHECK(ud_disassemble(ud_obj) && strcmp(buf, "jmp 0x102e") == 0);
+
+  ud_set_sym_table(ud_obj, NULL);
+  ud_set_asm_buffer(ud_obj, NULL, 0);
+}
+
+static void
+check_decode_batch(ud_t *ud_obj)
+{
+  TEST_DECL("check_decode_batch");
+  const uint8_t code[] = { 0x89, 0xc8,             /* mov eax, ecx */
+                           0xeb, 0xfc,             /* jmp 0x100 */
+                           0x8b, 0x43, 0x08,       /* mov eax, [ebx+0x8] */
+                           0x90 };                 /* nop */
+  const uint8_t code2[] = { 0x90, 0xc3, 0x55 };    /* nop; ret; push ebp */
+  ud_insn_record_t rec[4];
+  ud_set_input_buffer(ud_obj, code, sizeof code); 
+  ud_set_mode(ud_obj, 32);
+  ud_set_pc(ud_obj, 0x100);
+
+  TEST_CHECK(ud_decode_batch(ud_obj, rec, 3) == 3);
+  TEST_CHECK(rec[0].offset == 0x100 && rec[0].len == 2);
+  TEST_CHECK(rec[0].mnemonic == UD_Imov && rec[0].flags == 0);
+  TEST_CHECK(rec[0].opr_type[0] == UD_OP_REG && rec[0].opr_base[0] == UD_R_EAX);
+  TEST_CHECK(rec[0].opr_type[1] == UD_OP_REG && rec[0].opr_base[1] == UD_R_ECX);
+  TEST_CHECK(rec[0].opr_type[2] == UD_NONE);
+  TEST_CHECK(rec[1].offset == 0x102 && rec[1].mnemonic == UD_Ijmp);
+  TEST_CHECK(rec[1].flags == UD_RECORD_TARGET && rec[1].target == 0x100);
+  TEST_CHECK(rec[2].len == 3 && rec[2].opr_type[1] == UD_OP_MEM);
+  TEST_CHECK(rec[2].opr_base[1] == UD_R_EBX);
+  TEST_CHECK(ud_insn_mnemonic(ud_obj) == UD_Imov);
+
+  TEST_CHECK(ud_decode_batch(ud_obj, rec, 4) == 1);
+  TEST_CHECK(rec[0].offset == 0x107 && rec[0].mnemonic == UD_Inop);
+  TEST_CHECK(ud_decode_batch(ud_obj, rec, 4) == 0);
+
+  /* a batch stopping at the end of input keeps its last instruction,
+     and none of the text of the one translated before it */
+  ud_set_input_buffer(ud_obj, code2, sizeof code2);
+  ud_set_syntax(ud_obj, UD_SYN_INTEL);
+  TEST_CHECK(ud_disassemble(ud_obj) == 1);
+  TEST_CHECK(strcmp(ud_insn_asm(ud_obj), "nop") == 0);
+  TEST_CHECK(ud_decode_batch(ud_obj, rec, 4) == 2);
+  TEST_CHECK(ud_insn_mnemonic(ud_obj) == UD_Ipush);
+  TEST_CHECK(strcmp(ud_insn_asm(ud_obj), "") == 0);
+  TEST_CHECK(ud_input_end(ud_obj));
+}
+
+static void
+check_scan_branches(ud_t *ud_obj)
+{
+  TEST_DECL("check_scan_branches");
+  const uint8_t code[] = { 0x89, 0xc8,             /* mov eax, ecx */
+                           0x74, 0xfc,             /* jz 0x100 */
+                           0xe8, 0xf7, 0xff, 0xff, 0xff, /* call 0x100 */
+                           0xff, 0xd0,             /* call eax */
+                           0xff, 0xe8,             /* invalid (jmp far) */
+                           0x66, 0xe9, 0xf0, 0xff, /* jmp 0x101 */
+                           0xc3 };                 /* ret */
+  ud_branch_t br[4];
+  ud_set_input_buffer(ud_obj, code, sizeof code); 
+  ud_set_mode(ud_obj, 32);
+  ud_set_pc(ud_obj, 0x100);
+
+  TEST_CHECK(ud_scan_branches(ud_obj, br, 4) == 4);
+  TEST_CHECK(br[0].offset == 0x102 && br[0].len == 2);
+  TEST_CHECK(br[0].type == UD_BRANCH_JCC && br[0].mnemonic == UD_Ijz);
+  TEST_CHECK(br[0].target == 0x100);
+  TEST_CHECK(br[1].offset == 0x104 && br[1].len == 5);
+  TEST_CHECK(br[1].type == UD_BRANCH_CALL && br[1].target == 0x100);
+  TEST_CHECK(br[2].offset == 0x109 && br[2].type == UD_BRANCH_INDIRECT);
+  TEST_CHECK(br[2].mnemonic == UD_Icall && br[2].target == 0);
+  TEST_CHECK(br[3].offset == 0x10d && br[3].len == 4);
+  TEST_CHECK(br[3].type == UD_BRANCH_JMP && br[3].target == 0x101);
+
+  TEST_CHECK(ud_scan_branches(ud_obj, br, 4) == 1);
+  TEST_CHECK(br[0].offset == 0x111 && br[0].type == UD_BRANCH_RET);
+  TEST_CHECK(ud_scan_branches(ud_obj, br, 4) == 0);
+}
+
+struct sweep_state {
+  uint64_t next;                /* offset the next chunk should start at */
+  uint64_t count;
+  uint64_t chunk_start[UD_MAX_THREADS];
+  uint64_t chunk_end[UD_MAX_THREADS];
+  uint64_t chunk_count[UD_MAX_THREADS];
+  unsigned int gaps;
+};
+
+static void
+sweep_insn_callback(ud_t *u, unsigned int chunk, void *arg)
+{
+  struct sweep_state *st = (struct sweep_state *) arg;
+  if (st->chunk_count[chunk] == 0) {
+    st->chunk_start[chunk] = ud_insn_off(u);
+  } else if (st->chunk_end[chunk] != ud_insn_off(u)) {
+    st->gaps++;
+  }
+  st->chunk_end[chunk] = ud_insn_off(u) + ud_insn_len(u);
+  st->chunk_count[chunk]++;
+}
+
+static void
+sweep_done_callback(unsigned int chunk, void *arg)
+{
+  struct sweep_state *st = (struct sweep_state *) arg;
+  if (st->chunk_count[chunk] > 0) {
+    if (st->chunk_start[chunk] != st->next) {
+      st->gaps++;
+    }
+    st->next = st->chunk_end[chunk];
+  }
+  st->count += st->chunk_count[chunk];
+  st->chunk_count[chunk] = 0;
+}
+
+static void
+check_sweep_parallel(ud_t *ud_obj)
+{
+  TEST_DECL("check_sweep_parallel");
+  const size_t size = 1000003;
+  uint8_t *code = (uint8_t *) malloc(size);
+  struct sweep_state st;
+  uint64_t count = 0;
+  uint32_t seed = 1;
+  size_t i;
+
+  for (i = 0; i < size; ++i) {
+    seed = seed * 1103515245 + 12345;
+    code[i] = (uint8_t) (seed >> 16);
+  }
+  ud_set_mode(ud_obj, 32);
+  ud_set_pc(ud_obj, 0);
+  ud_set_input_buffer(ud_obj, code, size);
+  while (ud_decode(ud_obj)) {
+    ++count;
+  }
+
+  /* the sweep is contiguous, and decodes the same instructions */
+  memset(&st, 0, sizeof(st));
+  ud_set_pc(ud_obj, 0);
+  TEST_CHECK(ud_sweep_parallel(ud_obj, code, size, 3, sweep_insn_callback,
+                               sweep_done_callback, &st) == 0);
+  TEST_CHECK(st.gaps == 0);
+  TEST_CHECK(st.next == size);
+  TEST_CHECK(st.count == count);
+
+  memset(&st, 0, sizeof(st));
+  TEST_CHECK(ud_sweep_parallel(ud_obj, code, 0, 3, sweep_insn_callback,
+                               sweep_done_callback, &st) == 0);
+  TEST_CHECK(st.count == 0);
+  free(code);
+}
+
+struct region_state {
+  uint64_t next[400];            /* offset the next insn should be at */
+  uint64_t count[400];
+  unsigned int gaps;
+  size_t done;                  /* regions done, in order */
+};
+
+static void
+region_insn_callback(ud_t *u, size_t region, void *arg)
+{
+  struct region_state *st = (struct region_state *) arg;
+  if (st->next[region] != ud_insn_off(u)) {
+    st->gaps++;
+  }
+  st->next[region] = ud_insn_off(u) + ud_insn_len(u);
+  st->count[region]++;
+}
+
+static void
+region_done_callback(size_t region, void *arg)
+{
+  struct region_state *st = (struct region_state *) arg;
+  if (region != st->done) {
+    st->gaps++;
+  }
+  st->done++;
+}
+
+static void
+check_decode_regions(ud_t *ud_obj)
+{
+  TEST_DECL("check_decode_regions");
+  static const uint8_t modes[] = { 16, 32, 64, 0 };
+  uint8_t code[400 * 37];
+  ud_region_t region[400];
+  struct region_state st;
+  uint32_t seed = 7;
+  size_t i;
+
+  for (i = 0; i < sizeof(code); ++i) {
+    seed = seed * 1103515245 + 12345;
+    code[i] = (uint8_t) (seed >> 16);
+  }
+  memset(&st, 0, sizeof(st));
+  for (i = 0; i < 400; ++i) {
+    region[i].buf  = code + i * 37;
+    region[i].size = 37 - i % 5;
+    region[i].pc   = 0x1000 * i;
+    region[i].mode = modes[i % 4];
+    st.next[i]     = region[i].pc;
+  }
+  /* several rounds of regions */
+  ud_set_mode(ud_obj, 32);
+  TEST_CHECK(ud_decode_regions(ud_obj, region, 400, 3, region_insn_callback,
+                               region_done_callback, &st) == 0);
+  TEST_CHECK(st.gaps == 0);
+  TEST_CHECK(st.done == 400);
+
+  /* each region decodes as it would on its own */
+  for (i = 0; i < 400; ++i) {
+    uint64_t count = 0;
+    ud_set_mode(ud_obj, region[i].mode != 0 ? region[i].mode : 32);
+    ud_set_input_buffer(ud_obj, region[i].buf, region[i].size);
+    ud_set_pc(ud_obj, region[i].pc);
+    while (ud_decode(ud_obj)) {
+      ++count;
+    }
+    TEST_CHECK(st.count[i] == count);
+    TEST_CHECK(st.next[i] == region[i].pc + region[i].size);
+  }
+  ud_set_mode(ud_obj, 32);
+}
+
+struct refill_source {
+  const uint8_t *ptr;
+  size_t left;
+  unsigned int calls;
+};
+
+static size_t
+refill_callback(ud_t *u, uint8_t *buf, size_t size)
+{
+  struct refill_source *src = 
+    (struct refill_source *) ud_get_user_opaque_data(u);
+  if (buf != NULL && size > 5) {
+    size = 5; /* short blocks, to split instructions */
+  }
+  if (size > src->left) {
+    size = src->left;
+  }
+  if (buf != NULL) {
+    memcpy(buf, src->ptr, size);
+  }
+  src->ptr  += size;
+  src->left -= size;
+  src->calls++;
+  return size;
+}
+
+static void
+check_input_refill(ud_t *ud_obj)
+{
+  TEST_DECL("check_input_refill");
+  uint8_t code[120], window[32];
+  struct refill_source src;
+  unsigned int i;
+
+  for (i = 0; i < sizeof code; i += 3) {
+    code[i] = 0x8b; code[i + 1] = 0x43; code[i + 2] = 0x08; /* mov eax, [ebx+0x8] */
+  }
+  ud_set_mode(ud_obj, 32);
+  ud_set_user_opaque_data(ud_obj, &src);
+
+  src.ptr = code; src.left = sizeof code; src.calls = 0;
+  ud_set_input_refill(ud_obj, refill_callback, window, sizeof window);
+  ud_set_pc(ud_obj, 0);
+  for (i = 0; i < sizeof code / 3; ++i) {
+    TEST_CHECK_INT(ud_disassemble(ud_obj), 3);
+    TEST_CHECK_INT(ud_obj->mnemonic, UD_Imov);
+    TEST_CHECK(ud_insn_off(ud_obj) == i * 3);
+    TEST_CHECK(memcmp(ud_insn_ptr(ud_obj), code, 3) == 0);
+  }
+  TEST_CHECK_INT(ud_disassemble(ud_obj), 0);
+  TEST_CHECK(ud_input_end(ud_obj));
+  TEST_CHECK(src.calls <= sizeof code / 5 + 1);
+
+  /* skip, partly from the window, partly through the callback */
+  src.ptr = code; src.left = sizeof code;
+  ud_set_input_refill(ud_obj, refill_callback, NULL, 0);
+  TEST_CHECK_INT(ud_disassemble(ud_obj), 3);
+  ud_input_skip(ud_obj, 1 + 3 * 30);
+  TEST_CHECK_INT(ud_disassemble(ud_obj), 1);
+  TEST_CHECK_INT(ud_obj->mnemonic, UD_Iinc); /* 43 */
+  ud_input_skip(ud_obj, 1);
+  TEST_CHECK_INT(ud_disassemble(ud_obj), 3);
+  TEST_CHECK(memcmp(ud_insn_ptr(ud_obj), code, 3) == 0);
+  ud_input_skip(ud_obj, sizeof code);
+  TEST_CHECK(ud_input_end(ud_obj));
+  TEST_CHECK_INT(ud_disassemble(ud_obj), 0);
+}
+
+static void
+check_input_stream(ud_t *ud_obj)
+{
+  TEST_DECL("check_input_stream");
+  static const uint8_t insn[] = {
+    0x8b, 0x43, 0x08,                   /* mov eax, [ebx+0x8] */
+    0xc7, 0x83, 0x78, 0x56, 0x34, 0x12, /* mov dword [ebx+0x12345678], */
+    0x44, 0x33, 0x22, 0x11              /*     0x11223344 */
+  };
+  uint8_t code[12 * sizeof insn + 3];
+  unsigned int i, off, n = 0;
+
+  for (i = 0; i < 12 * sizeof insn; ++i) {
+    code[i] = insn[i % sizeof insn];
+  }
+  memcpy(code + 12 * sizeof insn, insn + 3, 3);
+  ud_set_mode(ud_obj, 32);
+  ud_set_input_stream(ud_obj);
+  ud_set_pc(ud_obj, 0x1000);
+  TEST_CHECK(ud_input_need_more(ud_obj));
+  TEST_CHECK_INT(ud_disassemble(ud_obj), 0);
+
+  /* chunks of 5 bytes, splitting most instructions */
+  for (off = 0; off < sizeof code; off += 5) {
+    TEST_CHECK(ud_input_need_more(ud_obj));
+    TEST_CHECK_INT(ud_input_feed(ud_obj, code + off,
+                                 sizeof code - off < 5 ? sizeof code - off : 5), 0);
+    TEST_CHECK(!ud_input_need_more(ud_obj));
+    while (ud_disassemble(ud_obj)) {
+      unsigned int len = n % 2 ? 10 : 3;
+      TEST_CHECK_INT(ud_insn_len(ud_obj), len);
+      TEST_CHECK(ud_insn_off(ud_obj) == 0x1000 + n / 2 * sizeof insn + n % 2 * 3);
+      TEST_CHECK(memcmp(ud_insn_ptr(ud_obj), insn + n % 2 * 3, len) == 0);
+      ++n;
+    }
+    TEST_CHECK(ud_input_end(ud_obj));
+  }
+  TEST_CHECK_INT(n, 24);
+  TEST_CHECK_INT(ud_input_feed(ud_obj, code, 0), 0);
+
+  /* the end of the stream, with an instruction cut short */
+  TEST_CHECK_INT(ud_input_feed(ud_obj, NULL, 0), 0);
+  TEST_CHECK(!ud_input_need_more(ud_obj));
+  TEST_CHECK_INT(ud_disassemble(ud_obj), 3);
+  TEST_CHECK_INT(ud_obj->mnemonic, UD_Iinvalid);
+  TEST_CHECK(ud_insn_off(ud_obj) == 0x1000 + 12 * sizeof insn);
+  TEST_CHECK_INT(ud_disassemble(ud_obj), 0);
+  TEST_CHECK(ud_input_end(ud_obj));
+  TEST_CHECK_INT(ud_input_feed(ud_obj, code, 1), -1);
+}
+
 int
 main(void)
 {
@@ -218,8 +682,17 @@ main(void)
   ud_set_syntax(&ud_obj, UD_SYN_INTEL);
 
   check_input(&ud_obj);
+  check_input_refill(&ud_obj);
+  check_input_stream(&ud_obj);
   check_mode(&ud_obj);
   check_disasm(&ud_obj);
+  check_lazy_translation(&ud_obj);
+  check_asm_buffer(&ud_obj);
+  check_symtab(&ud_obj);
+  check_decode_batch(&ud_obj);
+  check_scan_branches(&ud_obj);
+  check_sweep_parallel(&ud_obj);
+  check_decode_regions(&ud_obj);
 
   if (testcase_check_fails > 0) {
     printf("libcheck result: %d checks, %d failures\n",
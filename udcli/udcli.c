@@ -48,6 +48,12 @@
 # include <fcntl.h>
 #endif 
 
+#if defined(HAVE_MMAP) && defined(HAVE_SYS_MMAN_H)
+# include <sys/mman.h>
+# include <sys/stat.h>
+# define UDCLI_MMAP
+#endif
+
 #ifdef __DJGPP__
 # include <unistd.h>  /* for isatty() */
 # define _setmode setmode
@@ -69,10 +75,21 @@ static char help[] =
   "    -o <pc>  : Set the value of program counter to <pc>. (default = 0)\n"
   "    -s <n>   : Set the number of bytes to skip before disassembly to <n>.\n"
   "    -c <n>   : Set the number of bytes to disassemble to <n>.\n"
+  "    -r       : Disassemble by recursive traversal from the entry points,\n"
+  "               following direct branches and calls, in place of a linear\n"
+  "               sweep. Reachable instructions are displayed in address order,\n"
+  "               those starting inside the one before marked \"; overlaps\".\n"
+  "    -e <pc>  : Add an entry point at <pc>, or a comma separated list of\n"
+  "               them, for traversal; implies -r. (default = the value of -o)\n"
+  "    -j <n>   : Disassemble in parallel, with <n> threads (0 = one per\n"
+  "               processor). The output is that of the serial sweep.\n"
+  "               Traversal is serial: -j cannot be used with -r or -e.\n"
   "    -x       : Set the input mode to whitespace separated 8-bit numbers in\n"
   "               hexadecimal representation. Example: 0f 01 ae 00\n"
   "    -noff    : Do not display the offset of instructions.\n"
   "    -nohex   : Do not display the hexadecimal code of instructions.\n"
+  "    -noasm   : Decode only, and display the mnemonic of instructions in\n"
+  "               place of their assembly (faster).\n"
   "    -h       : Display this help message.\n"
   "    --version: Show version.\n"
   "\n"
@@ -86,17 +103,63 @@ uint64_t o_count = 0;
 unsigned char o_do_count= 0;
 unsigned char o_do_off = 1;
 unsigned char o_do_hex = 1;
+unsigned char o_do_asm = 1;
 unsigned char o_do_x = 0;
+unsigned char o_do_traverse = 0;
+int o_threads = -1;
+uint64_t o_pc = 0;
 unsigned o_vendor = UD_VENDOR_AMD;
 
-int input_hook_x(ud_t* u);
-int input_hook_file(ud_t* u);
+/* input is read in blocks of up to this size */
+#define INPUT_BLOCK_SIZE (1 << 16)
+uint8_t inp_window[INPUT_BLOCK_SIZE];
+
+/* output is rendered into a buffer, and written in blocks; a line, 
+ * less the instruction text, is at most this long */
+#define OUTPUT_LINE_MAX 128
+struct output {
+  char* buf;
+  size_t len;
+  size_t size;
+  int grow;	/* grow the buffer when full, instead of writing it out */
+};
+char out_block[1 << 16];
+struct output out = { out_block, 0, sizeof(out_block), 0 };
+
+/* output of the chunks of a parallel sweep, written out in order */
+struct output out_chunk[UD_MAX_THREADS];
+
+/* entry points for traversal */
+uint64_t* entry = NULL;
+size_t entry_count = 0;
+
+void out_flush(struct output* o);
+void out_pad(struct output* o, const char* s, size_t len, size_t width);
+void out_hex(struct output* o, uint64_t n, unsigned int digits);
+void out_byte(struct output* o, uint8_t n);
+void out_insn(struct output* o, ud_t* u);
+void out_line(struct output* o, uint64_t pc, const uint8_t* code, size_t len,
+              const char* text, size_t text_len, const char* note);
+void sweep_insn(ud_t* u, unsigned int chunk, void* arg);
+void sweep_done(unsigned int chunk, void* arg);
+
+void* xrealloc(void* ptr, size_t size);
+void add_entries(const char* s);
+void traverse(ud_t* u, const uint8_t* code, size_t size);
+
+const uint8_t* map_file(size_t* size);
+uint8_t* read_input(ud_t* u, size_t (*refill)(ud_t*, uint8_t*, size_t),
+                    size_t* size);
+size_t input_refill_x(ud_t* u, uint8_t* buf, size_t size);
+size_t input_refill_file(ud_t* u, uint8_t* buf, size_t size);
 
 int main(int argc, char **argv)
 {
   char *prog_path = *argv;
   char *s;
   ud_t ud_obj;
+  const uint8_t* code;
+  size_t code_size;
 
   /* initialize */
   ud_init(&ud_obj);
@@ -133,8 +196,33 @@ int main(int argc, char **argv)
 		o_do_off = 0;
 	else if (strcmp(*argv,"-nohex") == 0)
 		o_do_hex = 0;
+	else if (strcmp(*argv,"-noasm") == 0)
+		o_do_asm = 0;
 	else if (strcmp(*argv,"-x") == 0)
 		o_do_x = 1;
+	else if (strcmp(*argv,"-j") == 0)
+		if (--argc) {
+			s = *(++argv);
+			if (sscanf(s, "%d", &o_threads) == 0 || o_threads < 0) {
+				fprintf(stderr, "Invalid value given for -j.\n");
+				o_threads = -1;
+			}
+		} else { 
+			fprintf(stderr, "No value given for -j.\n");
+			printf(help, prog_path);
+			exit(EXIT_FAILURE);
+		}
+	else if (strcmp(*argv,"-r") == 0)
+		o_do_traverse = 1;
+	else if (strcmp(*argv,"-e") == 0)
+		if (--argc) {
+			o_do_traverse = 1;
+			add_entries(*(++argv));
+		} else { 
+			fprintf(stderr, "No value given for -e.\n");
+			printf(help, prog_path);
+			exit(EXIT_FAILURE);
+		}
 	else if (strcmp(*argv,"-s") == 0)
 		if (--argc) {
 			s = *(++argv);
@@ -168,11 +256,10 @@ int main(int argc, char **argv)
 		}
 	else if (strcmp(*argv,"-o") == 0) {
 		if (--argc) {
-			uint64_t pc = 0;
 			s = *(++argv);
-			if (sscanf(s, "%" FMT64 "x", &pc) == 0)
+			if (sscanf(s, "%" FMT64 "x", &o_pc) == 0)
 				fprintf(stderr, "Invalid value given for -o.\n");
-			ud_set_pc(&ud_obj, pc);
+			ud_set_pc(&ud_obj, o_pc);
 		} else { 
 			fprintf(stderr, "No value given for -o.\n");
 			printf(help, prog_path);
@@ -200,74 +287,521 @@ int main(int argc, char **argv)
 	argv++;
   }
 
-  if (o_do_x)
-	ud_set_input_hook(&ud_obj, input_hook_x);
-  else	ud_set_input_hook(&ud_obj, input_hook_file);	
-
-  if (o_skip) {
-	o_count += o_skip;
-	ud_input_skip(&ud_obj, o_skip);
+  if (o_do_traverse && o_threads >= 0) {
+	fprintf(stderr, "Option -j cannot be used with -r or -e.\n");
+	printf(help, prog_path);
+	exit(EXIT_FAILURE);
   }
 
-  /* disassembly loop */
-  while (ud_disassemble(&ud_obj)) {
-	if (o_do_off)
-		printf("%016" FMT64 "x ", ud_insn_off(&ud_obj));
-	if (o_do_hex) {
-		const char* hex1, *hex2;
-		hex1 = ud_insn_hex(&ud_obj);
-		hex2 = hex1 + 16;
-		printf("%-16.16s %-24s", hex1, ud_insn_asm(&ud_obj));
-		if (strlen(hex1) > 16) {
-			printf("\n");
-			if (o_do_off)
-				printf("%15s -", "");
-			printf("%-16s", hex2);
-		}
-	} 
-	else printf(" %-24s", ud_insn_asm(&ud_obj));
+  if (!o_do_asm)
+	ud_set_syntax(&ud_obj, NULL);
+
+  if (!o_do_x && (code = map_file(&code_size)) != NULL) {
+	/* skip and count applied to the mapping */
+	o_skip = 0;
+	ud_set_input_buffer(&ud_obj, code, code_size);
+  } else if (o_do_traverse || o_threads >= 0) {
+	/* traversal and parallel sweeps need all of the input at hand */
+	code = read_input(&ud_obj, o_do_x ? input_refill_x : input_refill_file,
+			  &code_size);
+	o_skip = 0;
+  } else if (o_do_x)
+	ud_set_input_refill(&ud_obj, input_refill_x, inp_window, sizeof(inp_window));
+  else	ud_set_input_refill(&ud_obj, input_refill_file, inp_window, sizeof(inp_window));
+
+  if (o_skip)
+	ud_input_skip(&ud_obj, o_skip);
 
-	printf("\n");
+  if (o_do_traverse)
+	traverse(&ud_obj, code, code_size);
+  else if (o_threads >= 0) {
+	if (ud_sweep_parallel(&ud_obj, code, code_size, o_threads,
+			      sweep_insn, sweep_done, NULL) != 0) {
+		fprintf(stderr, "Out of memory.\n");
+		exit(EXIT_FAILURE);
+	}
+  } else {
+	/* disassembly loop */
+	while (ud_disassemble(&ud_obj))
+		out_insn(&out, &ud_obj);
   }
+  out_flush(&out);
   
   exit(EXIT_SUCCESS);
   return 0;
 }
 
-int input_hook_x(ud_t* u)
+/* 
+ * out_flush
+ *    Writes out an output buffer.
+ */
+void out_flush(struct output* o)
+{
+  if (o->len > 0)
+	fwrite(o->buf, 1, o->len, stdout);
+  o->len = 0;
+}
+
+/* 
+ * out_insn
+ *    Appends the line of the instruction just disassembled to the output.
+ */
+void out_insn(struct output* o, ud_t* u)
+{
+  const char* text = o_do_asm ? ud_insn_asm(u) :
+		ud_lookup_mnemonic(ud_insn_mnemonic(u));
+  /* as ud_insn_hex(), no hex code on error */
+  out_line(o, ud_insn_off(u), u->error ? NULL : ud_insn_ptr(u),
+	   ud_insn_len(u), text, strlen(text), NULL);
+}
+
+/* 
+ * out_line
+ *    Appends the line of an instruction, at pc, with the given bytes of
+ *    code (or none, if NULL) and text, to the output, and a note after
+ *    the text, if not NULL.
+ */
+void out_line(struct output* o, uint64_t pc, const uint8_t* code, size_t len,
+              const char* text, size_t text_len, const char* note)
 {
-  unsigned int c, i;
+  size_t note_len = note ? strlen(note) : 0;
+  if (o->len + text_len + note_len + OUTPUT_LINE_MAX > o->size) {
+	if (o->grow) {
+		o->size = 2 * o->size + text_len + note_len + OUTPUT_LINE_MAX;
+		o->buf = xrealloc(o->buf, o->size);
+	} else	out_flush(o);
+  }
+  if (o_do_off) {
+	out_hex(o, pc, 16);
+	o->buf[o->len++] = ' ';
+  }
+  if (o_do_hex) {
+	/* eight bytes a line */
+	size_t n = code ? len : 0, i;
+	for (i = 0; i < n && i < 8; ++i)
+		out_byte(o, code[i]);
+	out_pad(o, "", 0, 16 - 2 * i);
+	o->buf[o->len++] = ' ';
+	out_pad(o, text, text_len, 24);
+	if (note)
+		out_pad(o, note, note_len, 0);
+	if (n > 8) {
+		o->buf[o->len++] = '\n';
+		if (o_do_off)
+			out_pad(o, "                -", 17, 0);
+		for (; i < n; ++i)
+			out_byte(o, code[i]);
+		if (n < 16)
+			out_pad(o, "", 0, 2 * (16 - n));
+	}
+  } else {
+	o->buf[o->len++] = ' ';
+	out_pad(o, text, text_len, 24);
+	if (note)
+		out_pad(o, note, note_len, 0);
+  }
+  o->buf[o->len++] = '\n';
+}
 
-  if (o_do_count) {
-	if (! o_count)
-		return UD_EOI;
-	else --o_count;
+/* 
+ * out_pad
+ *    Appends len chars of s to the output, padded with spaces to width,
+ *    as printf("%-*.*s") would.
+ */
+void out_pad(struct output* o, const char* s, size_t len, size_t width)
+{
+  memcpy(o->buf + o->len, s, len);
+  o->len += len;
+  for (; len < width; ++len)
+	o->buf[o->len++] = ' ';
+}
+
+/* 
+ * out_hex, out_byte
+ *    Append n to the output, in the given number of hex digits, or a
+ *    byte, in two.
+ */
+static const char hex_digit[] = "0123456789abcdef";
+
+void out_byte(struct output* o, uint8_t n)
+{
+  o->buf[o->len++] = hex_digit[n >> 4];
+  o->buf[o->len++] = hex_digit[n & 0xf];
+}
+
+void out_hex(struct output* o, uint64_t n, unsigned int digits)
+{
+  char* p = o->buf + o->len + digits;
+  o->len += digits;
+  while (digits--) {
+	*--p = hex_digit[n & 0xf];
+	n >>= 4;
   }
+}
+
+/* 
+ * sweep_insn, sweep_done
+ *    Render the instructions of a chunk of a parallel sweep into a buffer
+ *    of its own, on the worker thread decoding it, and write the buffer
+ *    out, once the chunk is done, in order.
+ */
+void sweep_insn(ud_t* u, unsigned int chunk, void* arg)
+{
+  out_chunk[chunk].grow = 1;
+  out_insn(&out_chunk[chunk], u);
+}
+
+void sweep_done(unsigned int chunk, void* arg)
+{
+  out_flush(&out_chunk[chunk]);
+}
 
-  i = fscanf(fptr, "%x", &c);
+/* 
+ * map_file
+ *    Memory maps fptr, if it is a regular file. Returns the mapping, less
+ *    the bytes to skip, and limited to the count, or NULL if the file
+ *    cannot be mapped.
+ */
+const uint8_t* map_file(size_t* size)
+{
+#ifdef UDCLI_MMAP
+  struct stat st;
+  long start = ftell(fptr);
+  uint64_t len;
+  const uint8_t* base;
 
-  if (i == EOF)
-	return UD_EOI;
-  if (i == 0) {
+  if (start < 0 || fstat(fileno(fptr), &st) != 0 || !S_ISREG(st.st_mode) ||
+      (uint64_t) st.st_size > (size_t) -1)
+	return NULL;
+  if ((uint64_t) st.st_size <= start + o_skip) {
+	*size = 0;
+	return inp_window;
+  }
+  base = mmap(NULL, (size_t) st.st_size, PROT_READ, MAP_PRIVATE, fileno(fptr), 0);
+  if (base == MAP_FAILED)
+	return NULL;
+#ifdef MADV_SEQUENTIAL
+  /* traversal jumps around the mapping */
+  if (!o_do_traverse)
+	madvise((void*) base, (size_t) st.st_size, MADV_SEQUENTIAL);
+#endif
+  len = st.st_size - start - o_skip;
+  if (o_do_count && o_count < len)
+	len = o_count;
+  *size = (size_t) len;
+  return base + start + o_skip;
+#else
+  return NULL;
+#endif
+}
+
+/* 
+ * read_input
+ *    Reads all of the input into memory, less the bytes to skip, with
+ *    the given refill function.
+ */
+uint8_t* read_input(ud_t* u, size_t (*refill)(ud_t*, uint8_t*, size_t),
+                    size_t* size)
+{
+  uint8_t* buf = NULL;
+  size_t cap = 0, n;
+
+  while (o_skip > 0 && (n = refill(u, NULL, (size_t) o_skip)) > 0)
+	o_skip -= n;
+  *size = 0;
+  do {
+	if (cap - *size < INPUT_BLOCK_SIZE) {
+		cap = cap ? 2 * cap : 4 * INPUT_BLOCK_SIZE;
+		buf = xrealloc(buf, cap);
+	}
+	n = refill(u, buf + *size, INPUT_BLOCK_SIZE);
+	*size += n;
+  } while (n > 0);
+  return buf;
+}
+
+/* 
+ * xrealloc
+ *    realloc(), exiting when out of memory.
+ */
+void* xrealloc(void* ptr, size_t size)
+{
+  if ((ptr = realloc(ptr, size)) == NULL) {
+	fprintf(stderr, "Out of memory.\n");
+	exit(EXIT_FAILURE);
+  }
+  return ptr;
+}
+
+/* 
+ * add_entries
+ *    Adds a comma separated list of entry points to traverse from.
+ */
+void add_entries(const char* s)
+{
+  do {
+	entry = xrealloc(entry, (entry_count + 1) * sizeof(*entry));
+	if (sscanf(s, "%" FMT64 "x", &entry[entry_count]) == 1)
+		++entry_count;
+	else	fprintf(stderr, "Invalid value given for -e.\n");
+	s = strchr(s, ',');
+  } while (s++ != NULL);
+}
+
+/* 
+ * traverse
+ *    Disassembles code by recursive traversal. The instructions reachable
+ *    from the entry points, by falling through and through direct branches
+ *    and calls, are disassembled with a worklist. A bitmap, with a bit per
+ *    byte, marks the start of each instruction found, and ends each path
+ *    at the first one already found, so that each instruction is decoded
+ *    and translated once, and data is never decoded. Their text is kept
+ *    until they are written out, in address order. A path into the middle
+ *    of an instruction already found decodes the instruction starting
+ *    there, which is marked in the output as overlapping the one before.
+ */
+#define BIT_TEST(map, i) ((map)[(i) >> 3] & (1 << ((i) & 7)))
+#define BIT_SET(map, i)  ((map)[(i) >> 3] |= (1 << ((i) & 7)))
+
+struct trav_insn {
+  size_t off;
+  size_t len;
+  size_t text;		/* offset of its text in the texts kept */
+  size_t text_len;
+  int hex;		/* as ud_insn_hex(), no hex code on error */
+};
+
+static size_t* work = NULL;
+static size_t work_count = 0, work_cap = 0;
+
+static void work_push(size_t off)
+{
+  if (work_count == work_cap) {
+	work_cap = work_cap ? 2 * work_cap : 1024;
+	work = xrealloc(work, work_cap * sizeof(*work));
+  }
+  work[work_count++] = off;
+}
+
+/* number of bits set in each byte */
+static uint8_t bit_count[256];
+
+void traverse(ud_t* u, const uint8_t* code, size_t size)
+{
+  uint8_t* start = xrealloc(NULL, size / 8 + 1);
+  struct output texts = { NULL, 0, 0, 1 };
+  struct trav_insn* insn = NULL;
+  size_t insn_count = 0, insn_cap = 0;
+  size_t off, end, i, j, rank;
+  size_t* below;
+  size_t* order;
+
+  memset(start, 0, size / 8 + 1);
+
+  /* the first entry point is taken first */
+  if (entry_count == 0)
+	work_push(0);
+  for (i = entry_count; i-- > 0; ) {
+	if (entry[i] - o_pc < size)
+		work_push((size_t) (entry[i] - o_pc));
+	else	fprintf(stderr, "Entry point %" FMT64 "x is out of range.\n", entry[i]);
+  }
+
+  /* disassemble along each path */
+  while (work_count > 0) {
+	off = work[--work_count];
+	ud_set_input_buffer(u, code + off, size - off);
+	ud_set_pc(u, o_pc + off);
+	while (!BIT_TEST(start, off) && ud_disassemble(u)) {
+		const ud_operand_t* op = ud_insn_opr(u, 0);
+		enum ud_mnemonic_code mnemonic = ud_insn_mnemonic(u);
+		size_t len = ud_insn_len(u);
+		const char* text = o_do_asm ? ud_insn_asm(u) :
+				ud_lookup_mnemonic(mnemonic);
+		size_t text_len = strlen(text);
+
+		if (insn_count == insn_cap) {
+			insn_cap = insn_cap ? 2 * insn_cap : 1024;
+			insn = xrealloc(insn, insn_cap * sizeof(*insn));
+		}
+		if (texts.len + text_len > texts.size) {
+			texts.size = 2 * texts.size + text_len + OUTPUT_LINE_MAX;
+			texts.buf = xrealloc(texts.buf, texts.size);
+		}
+		insn[insn_count].off = off;
+		insn[insn_count].len = len;
+		insn[insn_count].text = texts.len;
+		insn[insn_count].text_len = text_len;
+		insn[insn_count].hex = !u->error;
+		out_pad(&texts, text, text_len, 0);
+		++insn_count;
+
+		BIT_SET(start, off);
+		off += len;
+		if (op != NULL && op->type == UD_OP_JIMM) {
+			/* as ud_syn_rel_target() */
+			uint64_t target = o_pc + off + (op->size == 8 ? op->lval.sbyte :
+					  op->size == 16 ? op->lval.sword : op->lval.sdword);
+			target = (target & (0xffffffffffffffffull >> (64 - u->opr_mode))) - o_pc;
+			if (target < size && !BIT_TEST(start, target))
+				work_push((size_t) target);
+		}
+		/* paths end at unconditional transfers, and invalid code */
+		if (mnemonic == UD_Ijmp || mnemonic == UD_Iret ||
+		    mnemonic == UD_Iretf || mnemonic == UD_Iiretw ||
+		    mnemonic == UD_Iiretd || mnemonic == UD_Iiretq ||
+		    mnemonic == UD_Isysexit || mnemonic == UD_Isysret ||
+		    mnemonic == UD_Ihlt || mnemonic == UD_Iud2 ||
+		    mnemonic == UD_Iinvalid || off == size)
+			break;
+	}
+  }
+
+  /* order the instructions by address: the rank of each is the number
+   * of starts below it, counted per 64 bytes, then byte by byte */
+  for (i = 1; i < 256; ++i)
+	bit_count[i] = (i & 1) + bit_count[i >> 1];
+  below = xrealloc(NULL, (size / 64 + 1) * sizeof(*below));
+  order = xrealloc(NULL, (insn_count + 1) * sizeof(*order));
+  for (rank = 0, i = 0; i <= size / 64; ++i) {
+	below[i] = rank;
+	for (j = 8 * i; j < 8 * i + 8 && j <= size / 8; ++j)
+		rank += bit_count[start[j]];
+  }
+  for (i = 0; i < insn_count; ++i) {
+	off = insn[i].off;
+	rank = below[off >> 6];
+	for (j = off >> 6 << 3; j < off >> 3; ++j)
+		rank += bit_count[start[j]];
+	order[rank + bit_count[start[j] & ((1 << (off & 7)) - 1)]] = i;
+  }
+  free(below);
+
+  /* write out the lines in address order, marking each instruction that
+   * starts inside the one before it */
+  end = 0;
+  for (j = 0; j < insn_count; ++j) {
+	const struct trav_insn* t = &insn[order[j]];
+	out_line(&out, o_pc + t->off, t->hex ? code + t->off : NULL, t->len,
+		 texts.buf + t->text, t->text_len,
+		 t->off < end ? " ; overlaps" : NULL);
+	if (t->off + t->len > end)
+		end = t->off + t->len;
+  }
+  free(texts.buf);
+  free(order);
+  free(insn);
+  free(start);
+}
+
+/* 
+ * input_refill_x
+ *    Parses whitespace separated hexadecimal numbers from fptr into 
+ *    bytes, reading it in blocks.
+ */
+static char x_text[INPUT_BLOCK_SIZE];
+static size_t x_len = 0, x_pos = 0;
+static int x_end = 0;
+static signed char x_digit[256];
+
+static int x_getc(void)
+{
+  if (x_pos == x_len) {
+	x_pos = 0;
+	x_len = fread(x_text, 1, sizeof(x_text), fptr);
+	if (x_len == 0)
+		return EOF;
+  }
+  return (unsigned char) x_text[x_pos++];
+}
+
+/* reads the next number, as fscanf("%x") would; returns 0 at the end */
+static int x_number(unsigned int* n)
+{
+  int c, neg = 0, digits = 0;
+
+  while ((c = x_getc()) != EOF && isspace(c))
+	;
+  if (c == EOF)
+	return 0;
+  if (c == '+' || c == '-') {
+	neg = c == '-';
+	c = x_getc();
+  }
+  *n = 0;
+  if (c == '0') {
+	digits = 1;
+	c = x_getc();
+	if (c == 'x' || c == 'X')
+		c = x_getc();
+  }
+  for (; c != EOF && x_digit[c] >= 0; c = x_getc(), ++digits)
+	*n = (*n << 4) | x_digit[c];
+  if (c != EOF)
+	--x_pos; /* unget */
+  if (neg)
+	*n = -*n;
+  if (digits == 0) {
 	fprintf(stderr, "Error: Invalid input, should be in hexadecimal form (8-bit).\n");
-	return UD_EOI;
+	return 0;
   }
-  if (c > 0xFF)
-	fprintf(stderr, "Warning: Casting non-8-bit input (%x), to %x.\n", c, c & 0xFF);
-  return (int) (c & 0xFF);
-}	
+  return 1;
+}
 
-int input_hook_file(ud_t* u)
+size_t input_refill_x(ud_t* u, uint8_t* buf, size_t size)
 {
-  int c;
+  size_t i;
+  unsigned int c;
 
-  if (o_do_count) {
-	  if (! o_count) {
-		return -1;
-	  } else o_count -- ;
+  if (x_digit['a'] != 10) {
+	memset(x_digit, -1, sizeof(x_digit));
+	for (c = 0; c < 10; ++c)
+		x_digit['0' + c] = c;
+	for (c = 0; c < 6; ++c)
+		x_digit['a' + c] = x_digit['A' + c] = 10 + c;
   }
+  if (buf != NULL && o_do_count && o_count < size)
+	size = (size_t) o_count;
+  for (i = 0; i < size && !x_end; ++i) {
+	if (!x_number(&c)) {
+		x_end = 1;
+		break;
+	}
+	if (c > 0xFF)
+		fprintf(stderr, "Warning: Casting non-8-bit input (%x), to %x.\n", c, c & 0xFF);
+	if (buf != NULL)
+		buf[i] = (uint8_t) c;
+  }
+  if (buf != NULL && o_do_count)
+	o_count -= i;
+  return i;
+}
+
+/* 
+ * input_refill_file
+ *    Reads fptr in blocks.
+ */
+size_t input_refill_file(ud_t* u, uint8_t* buf, size_t size)
+{
+  uint8_t skip[4096];
+  size_t n = 0, r;
 
-  if ((c = fgetc(fptr)) == EOF)
-	return UD_EOI;
-  return c;
+  if (buf != NULL) {
+	if (o_do_count && o_count < size)
+		size = (size_t) o_count;
+	n = fread(buf, 1, size, fptr);
+	if (o_do_count)
+		o_count -= n;
+	return n;
+  }
+  /* skip, reading if fptr is not seekable */
+  if (size <= 0x7fffffff && fseek(fptr, (long) size, SEEK_CUR) == 0)
+	return size;
+  while (n < size) {
+	r = size - n < sizeof(skip) ? size - n : sizeof(skip);
+	if ((r = fread(skip, 1, r, fptr)) == 0)
+		break;
+	n += r;
+  }
+  return n;
 }